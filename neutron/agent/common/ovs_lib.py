@@ -24,6 +24,7 @@ from neutron_lib import constants as p_const
 from neutron_lib import exceptions
 from oslo_config import cfg
 from oslo_log import log as logging
+from ovsdbapp.backend.ovs_idl import idlutils
 import six
 import tenacity
 
@@ -39,6 +40,13 @@ from neutron.plugins.ml2.drivers.openvswitch.agent.common \
 
 UINT64_BITMASK = (1 << 64) - 1
 
+# The highest bits of a cookie are the generation of the cookie. The cookies
+# requested by an agent share the generation of its default cookie, so that
+# the flows of other generations can be matched with cookie masks.
+COOKIE_GENERATION_BITS = 16
+COOKIE_GENERATION_SHIFT = 64 - COOKIE_GENERATION_BITS
+COOKIE_GENERATION_MASK = UINT64_BITMASK ^ ((1 << COOKIE_GENERATION_SHIFT) - 1)
+
 # Special return value for an invalid OVS ofport
 INVALID_OFPORT = -1
 UNASSIGNED_OFPORT = []
@@ -50,6 +58,9 @@ FAILMODE_STANDALONE = 'standalone'
 # special values for cookies
 COOKIE_ANY = object()
 
+# Interface columns read to find the VIF ports of a bridge
+VIF_INTERFACE_COLUMNS = ('name', 'external_ids', 'ofport')
+
 ovs_conf.register_ovs_agent_opts()
 
 LOG = logging.getLogger(__name__)
@@ -532,12 +543,18 @@ class OVSBridge(BaseOVS):
                                    if_exists=if_exists).
                 execute(check_error=check_error, log_errors=log_errors))
 
+    def get_ports_snapshot(self):
+        """Get a BridgePortsSnapshot of the ports of this bridge."""
+        return BridgePortsSnapshot(self)
+
+    def _get_vif_interfaces(self):
+        return self.get_ports_attributes(
+            'Interface', columns=list(VIF_INTERFACE_COLUMNS), if_exists=True)
+
     # returns a VIF object for each VIF port
     def get_vif_ports(self, ofport_filter=None):
         edge_ports = []
-        port_info = self.get_ports_attributes(
-            'Interface', columns=['name', 'external_ids', 'ofport'],
-            if_exists=True)
+        port_info = self._get_vif_interfaces()
         for port in port_info:
             name = port['name']
             external_ids = port['external_ids']
@@ -552,9 +569,9 @@ class OVSBridge(BaseOVS):
         return edge_ports
 
     def get_vif_port_to_ofport_map(self):
-        results = self.get_ports_attributes(
-            'Interface', columns=['name', 'external_ids', 'ofport'],
-            if_exists=True)
+        return self._get_vif_port_to_ofport_map(self._get_vif_interfaces())
+
+    def _get_vif_port_to_ofport_map(self, results):
         port_map = {}
         for r in results:
             # fall back to basic interface name
@@ -567,10 +584,10 @@ class OVSBridge(BaseOVS):
         return port_map
 
     def get_vif_port_set(self):
+        return self._get_vif_port_set(self._get_vif_interfaces())
+
+    def _get_vif_port_set(self, results):
         edge_ports = set()
-        results = self.get_ports_attributes(
-            'Interface', columns=['name', 'external_ids', 'ofport'],
-            if_exists=True)
         for result in results:
             if result['ofport'] == UNASSIGNED_OFPORT:
                 LOG.warning("Found not yet ready openvswitch port: %s",
@@ -608,9 +625,9 @@ class OVSBridge(BaseOVS):
         return {p['name']: p['tag'] for p in results}
 
     def get_vifs_by_ids(self, port_ids):
-        interface_info = self.get_ports_attributes(
-            "Interface", columns=["name", "external_ids", "ofport"],
-            if_exists=True)
+        return self._get_vifs_by_ids(self._get_vif_interfaces(), port_ids)
+
+    def _get_vifs_by_ids(self, interface_info, port_ids):
         by_id = {x['external_ids'].get('iface-id'): x for x in interface_info}
         result = {}
         for port_id in port_ids:
@@ -934,6 +951,65 @@ class OVSBridge(BaseOVS):
         self.destroy()
 
 
+class BridgePortsSnapshot(object):
+    """Port and Interface attributes of a bridge at one point in time.
+
+    The rows are read from the local replica of the OVSDB kept by the IDL,
+    without any transaction, when the snapshot is first used. The snapshot
+    then answers the queries below the same way as the bridge until it is
+    discarded, without reading the OVSDB again.
+    """
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+        self._interfaces = None
+        self._port_tags = None
+
+    def _load(self):
+        if self._interfaces is not None:
+            return
+        interfaces = {}
+        port_tags = {}
+        br = idlutils.row_by_value(self.bridge.ovsdb.idl, 'Bridge', 'name',
+                                   self.bridge.br_name, None)
+        for port in (br.ports if br is not None else []):
+            if port.name == self.bridge.br_name:
+                continue
+            port_tags[port.name] = idlutils.get_column_value(port, 'tag')
+            for iface in port.interfaces:
+                interfaces[iface.name] = {
+                    column: idlutils.get_column_value(iface, column)
+                    for column in VIF_INTERFACE_COLUMNS}
+        self._interfaces = interfaces
+        self._port_tags = port_tags
+
+    @property
+    def interfaces(self):
+        """Dict of interface name -> name, external_ids and ofport."""
+        self._load()
+        return self._interfaces
+
+    @property
+    def port_tags(self):
+        """Dict of port name -> vlan tag."""
+        self._load()
+        return self._port_tags
+
+    def get_vif_port_set(self):
+        return self.bridge._get_vif_port_set(self.interfaces.values())
+
+    def get_vif_port_to_ofport_map(self):
+        return self.bridge._get_vif_port_to_ofport_map(
+            self.interfaces.values())
+
+    def get_port_tag_dict(self):
+        return dict(self.port_tags)
+
+    def get_vifs_by_ids(self, port_ids):
+        return self.bridge._get_vifs_by_ids(self.interfaces.values(),
+                                            port_ids)
+
+
 class DeferredOVSBridge(object):
     '''Deferred OVSBridge.
 
@@ -1044,9 +1120,38 @@ def _build_flow_expr_str(flow_dict, cmd, strict):
     return ','.join(flow_expr_arr)
 
 
-def generate_random_cookie():
-    # The OpenFlow spec forbids use of -1
-    return random.randrange(UINT64_BITMASK)
+def generate_random_cookie(generation_of=None):
+    if generation_of is None:
+        # The OpenFlow spec forbids use of -1
+        return random.randrange(UINT64_BITMASK)
+    generation = generation_of & COOKIE_GENERATION_MASK
+    cookie = UINT64_BITMASK
+    while cookie == UINT64_BITMASK:
+        cookie = generation | random.randrange(1 << COOKIE_GENERATION_SHIFT)
+    return cookie
+
+
+def get_stale_cookie_masks(cookies):
+    """Get the (cookie, cookie_mask) pairs matching the stale cookies.
+
+    A cookie is stale if its generation is not the generation of any of the
+    given cookies. At most COOKIE_GENERATION_BITS pairs are returned per
+    generation.
+    """
+    generations = set(c >> COOKIE_GENERATION_SHIFT for c in cookies)
+    masks = []
+
+    def _split(prefix, length):
+        shift = COOKIE_GENERATION_BITS - length
+        if not any(g >> shift == prefix for g in generations):
+            masks.append((prefix << (64 - length),
+                          UINT64_BITMASK ^ ((1 << (64 - length)) - 1)))
+        elif length < COOKIE_GENERATION_BITS:
+            _split(prefix << 1, length + 1)
+            _split(prefix << 1 | 1, length + 1)
+
+    _split(0, 0)
+    return masks
 
 
 def check_cookie_mask(cookie):
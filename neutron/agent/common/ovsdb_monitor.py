@@ -12,9 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from ovsdbapp.backend.ovs_idl import event as idl_event
 
+from neutron._i18n import _
 from neutron.agent.common import async_process
 from neutron.agent.ovsdb import api as ovsdb
 from neutron.agent.ovsdb.native import helpers
@@ -29,6 +33,10 @@ OVSDB_ACTION_DELETE = 'delete'
 OVSDB_ACTION_NEW = 'new'
 
 
+class InterfaceTableNotMonitored(Exception):
+    pass
+
+
 class OvsdbMonitor(async_process.AsyncProcess):
     """Manages an invocation of 'ovsdb-client monitor'."""
 
@@ -123,3 +131,106 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         # update any events with ofports received from 'new' action
         for event in self.new_events['added']:
             event['ofport'] = dev_to_ofport.get(event['name'], event['ofport'])
+
+
+class InterfaceEvent(idl_event.RowEvent):
+    """Interface table event forwarded to a SimpleInterfaceIdlMonitor.
+
+    Updates are only forwarded when the ofport of the interface changed.
+    """
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        super(InterfaceEvent, self).__init__(
+            (self.ROW_CREATE, self.ROW_UPDATE, self.ROW_DELETE),
+            'Interface', None)
+        self.event_name = 'InterfaceEvent'
+
+    def matches(self, event, row, old=None):
+        if event == self.ROW_UPDATE and not hasattr(old, 'ofport'):
+            return False
+        return super(InterfaceEvent, self).matches(event, row, old)
+
+    def run(self, event, row, old):
+        self.monitor.process_event(event, row)
+
+
+class SimpleInterfaceIdlMonitor(object):
+    """Monitors the Interface table through the agent ovsdb connection.
+
+    This provides the events of SimpleInterfaceMonitor from the rows
+    received by the IDL of the agent, instead of parsing the output of an
+    'ovsdb-client monitor' process.
+
+    :param idl_monitor: the OvsIdlMonitor of the agent ovsdb connection.
+    """
+
+    table_name = 'Interface'
+    columns = ('name', 'ofport', 'external_ids')
+
+    def __init__(self, idl_monitor):
+        self._idl_monitor = idl_monitor
+        self._event = InterfaceEvent(self)
+        self._lock = threading.Lock()
+        self._active = False
+        self.new_events = {'added': [], 'removed': []}
+
+    @staticmethod
+    def _get_device(row):
+        return {'name': row.name,
+                'ofport': row.ofport[0] if row.ofport else [],
+                'external_ids': row.external_ids}
+
+    def _check_table(self):
+        table = self._idl_monitor.tables.get(self.table_name)
+        missing = [column for column in self.columns
+                   if table is None or column not in table.columns]
+        if missing:
+            raise InterfaceTableNotMonitored(
+                _('The ovsdb connection of the agent does not monitor the '
+                  'columns %(columns)s of the %(table)s table') %
+                {'columns': ', '.join(missing), 'table': self.table_name})
+
+    def start(self, block=False, timeout=5):
+        self._check_table()
+        self._idl_monitor.notify_handler.watch_event(self._event)
+        # Like 'ovsdb-client monitor', report the existing interfaces as added
+        rows = list(self._idl_monitor.tables[self.table_name].rows.values())
+        with self._lock:
+            self.new_events = {'added': [self._get_device(row)
+                                         for row in rows],
+                               'removed': []}
+        self._active = True
+
+    def stop(self):
+        self._active = False
+        self._idl_monitor.notify_handler.unwatch_event(self._event)
+
+    def is_active(self):
+        return self._active
+
+    def process_event(self, event, row):
+        device = self._get_device(row)
+        with self._lock:
+            if event == InterfaceEvent.ROW_CREATE:
+                self.new_events['added'].append(device)
+            elif event == InterfaceEvent.ROW_DELETE:
+                self.new_events['removed'].append(device)
+            else:
+                # update any events with the new ofport
+                for added in self.new_events['added']:
+                    if added['name'] == device['name']:
+                        added['ofport'] = device['ofport']
+
+    @property
+    def has_updates(self):
+        """Indicate whether the ovsdb Interface table has been updated."""
+        with self._lock:
+            return bool(self.new_events['added'] or
+                        self.new_events['removed'])
+
+    def get_events(self):
+        with self._lock:
+            events = self.new_events
+            self.new_events = {'added': [], 'removed': []}
+        return events
@@ -30,10 +30,12 @@ LOG = logging.getLogger(__name__)
 @contextlib.contextmanager
 def get_polling_manager(minimize_polling=False,
                         ovsdb_monitor_respawn_interval=(
-                            constants.DEFAULT_OVSDBMON_RESPAWN)):
+                            constants.DEFAULT_OVSDBMON_RESPAWN),
+                        idl_monitor=None):
     if minimize_polling:
         pm = InterfacePollingMinimizer(
-            ovsdb_monitor_respawn_interval=ovsdb_monitor_respawn_interval)
+            ovsdb_monitor_respawn_interval=ovsdb_monitor_respawn_interval,
+            idl_monitor=idl_monitor)
         pm.start()
     else:
         pm = base_polling.AlwaysPoll()
@@ -45,19 +47,40 @@ def get_polling_manager(minimize_polling=False,
 
 
 class InterfacePollingMinimizer(base_polling.BasePollingManager):
-    """Monitors ovsdb to determine when polling is required."""
+    """Monitors ovsdb to determine when polling is required.
+
+    Interface changes are received through idl_monitor, an OvsIdlMonitor,
+    if given, or from an 'ovsdb-client monitor' process otherwise. The
+    process is also used when idl_monitor does not monitor the Interface
+    table.
+    """
 
     def __init__(
             self,
-            ovsdb_monitor_respawn_interval=constants.DEFAULT_OVSDBMON_RESPAWN):
+            ovsdb_monitor_respawn_interval=constants.DEFAULT_OVSDBMON_RESPAWN,
+            idl_monitor=None):
 
         super(InterfacePollingMinimizer, self).__init__()
-        self._monitor = ovsdb_monitor.SimpleInterfaceMonitor(
-            respawn_interval=ovsdb_monitor_respawn_interval,
+        self._respawn_interval = ovsdb_monitor_respawn_interval
+        if idl_monitor:
+            self._monitor = ovsdb_monitor.SimpleInterfaceIdlMonitor(
+                idl_monitor)
+        else:
+            self._monitor = self._create_client_monitor()
+
+    def _create_client_monitor(self):
+        return ovsdb_monitor.SimpleInterfaceMonitor(
+            respawn_interval=self._respawn_interval,
             ovsdb_connection=cfg.CONF.OVS.ovsdb_connection)
 
     def start(self):
-        self._monitor.start(block=True)
+        try:
+            self._monitor.start(block=True)
+        except ovsdb_monitor.InterfaceTableNotMonitored as e:
+            LOG.warning("%s, falling back to 'ovsdb-client' to monitor "
+                        "interfaces", e)
+            self._monitor = self._create_client_monitor()
+            self._monitor.start(block=True)
 
     def stop(self):
         try:
@@ -147,6 +147,10 @@ class ResourceProcessingQueue(object):
         update.tries -= 1
         self._queue.put(update)
 
+    def pending_updates(self):
+        """Returns a snapshot of the updates waiting in the queue"""
+        return list(self._queue.queue)
+
     def each_update_to_next_resource(self):
         """Grabs the next resource from the queue and processes
 
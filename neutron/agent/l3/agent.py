@@ -256,6 +256,9 @@ class L3NATAgent(ha.AgentMixin,
             self.metadata_driver)
 
         self._queue = queue.ResourceProcessingQueue()
+        # router ID -> (fetch timestamp, routers) of the routers fetched
+        # along with the routers of other updates, see _fetch_routers
+        self._prefetched_routers = {}
         super(L3NATAgent, self).__init__(host=self.conf.host)
 
         self.target_ex_net_id = None
@@ -541,6 +544,63 @@ class L3NATAgent(ha.AgentMixin,
         router_update.resource = None  # Force the agent to resync the router
         self._queue.add(router_update)
 
+    @staticmethod
+    def _update_needs_fetch(update):
+        related_action = update.action in (DELETE_RELATED_ROUTER,
+                                           ADD_UPDATE_RELATED_ROUTER)
+        return related_action or (update.action not in (PD_UPDATE,
+                                                        DELETE_ROUTER) and
+                                  not update.resource)
+
+    def _fetch_routers(self, update):
+        """Fetches the routers of an update.
+
+        The routers of the other updates waiting in the queue which need to
+        be fetched too are fetched in the same RPC, up to
+        sync_routers_chunk_size routers. They are kept until the worker
+        processing each of these updates picks them up, which only happens
+        if they were fetched after the update was queued.
+
+        The timestamp of the update is set to the time the routers were
+        fetched.
+        """
+        timestamp, routers = self._prefetched_routers.pop(update.id,
+                                                          (None, None))
+        if timestamp and timestamp >= update.timestamp:
+            update.timestamp = timestamp
+            return routers
+
+        pending_ids = set()
+        router_ids = [update.id]
+        for pending in self._queue.pending_updates():
+            pending_ids.add(pending.id)
+            if (len(router_ids) < self.sync_routers_chunk_size and
+                    pending.id not in router_ids and
+                    self._update_needs_fetch(pending)):
+                router_ids.append(pending.id)
+        # drop the prefetched routers nobody is going to pick up
+        for router_id in set(self._prefetched_routers) - pending_ids:
+            del self._prefetched_routers[router_id]
+
+        update.timestamp = timeutils.utcnow()
+        routers = self.plugin_rpc.get_routers(self.context, router_ids)
+        if len(router_ids) == 1:
+            return routers
+
+        LOG.debug("Fetched routers %s along with router %s",
+                  router_ids[1:], update.id)
+        prefetched_routers = {router_id: (update.timestamp, [])
+                              for router_id in router_ids[1:]}
+        update_routers = []
+        for router in routers:
+            if router['id'] in prefetched_routers:
+                prefetched_routers[router['id']][1].append(router)
+            else:
+                # the router of the update and the related routers
+                update_routers.append(router)
+        self._prefetched_routers.update(prefetched_routers)
+        return update_routers
+
     def _process_router_update(self):
         for rp, update in self._queue.each_update_to_next_resource():
             LOG.info("Starting router update for %s, action %s, priority %s",
@@ -558,9 +618,7 @@ class L3NATAgent(ha.AgentMixin,
                                                ADD_UPDATE_RELATED_ROUTER)
             if not_delete_no_routers or related_action:
                 try:
-                    update.timestamp = timeutils.utcnow()
-                    routers = self.plugin_rpc.get_routers(self.context,
-                                                          [update.id])
+                    routers = self._fetch_routers(update)
                 except Exception:
                     msg = "Failed to fetch router information for '%s'"
                     LOG.exception(msg, update.id)
@@ -79,9 +79,11 @@ class AgentMixin(object):
         self._init_ha_conf_path()
         super(AgentMixin, self).__init__(host)
         # BatchNotifier queue is needed to ensure that the HA router
-        # state change sequence is under the proper order.
+        # state change sequence is under the proper order. Only the last
+        # pending state of each router needs to be sent.
         self.state_change_notifier = batch_notifier.BatchNotifier(
-            self._calculate_batch_duration(), self.notify_server)
+            self._calculate_batch_duration(), self.notify_server,
+            key_func=lambda event: event[0])
         eventlet.spawn(self._start_keepalived_notifications_server)
 
     def _get_router_info(self, router_id):
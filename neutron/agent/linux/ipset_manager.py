@@ -29,12 +29,17 @@ class IpsetManager(object):
 
        Keeps track of ip addresses per set, using bulk
        or single ip add/remove for smaller changes.
+       If aggregate_members is True, the members of a set are merged into
+       the smallest list of CIDRs covering them.
     """
 
-    def __init__(self, execute=None, namespace=None):
+    def __init__(self, execute=None, namespace=None, aggregate_members=False):
         self.execute = execute or linux_utils.execute
         self.namespace = namespace
+        self.aggregate_members = aggregate_members
         self.ipset_sets = {}
+        # Members of the sets before aggregation, by set name
+        self.ipset_members = {}
 
     def _sanitize_addresses(self, addresses):
         """This method converts any address to ipset format.
@@ -77,12 +82,26 @@ class IpsetManager(object):
         """
         member_ips = self._sanitize_addresses(member_ips)
         set_name = self.get_name(id, ethertype)
+        if self.aggregate_members:
+            return self._set_aggregated_members(set_name, ethertype,
+                                                member_ips)
         add_ips = self._get_new_set_ips(set_name, member_ips)
         del_ips = self._get_deleted_set_ips(set_name, member_ips)
         if add_ips or del_ips or not self.set_name_exists(set_name):
             self.set_members_mutate(set_name, ethertype, member_ips)
         return add_ips, del_ips
 
+    def _set_aggregated_members(self, set_name, ethertype, member_ips):
+        cidrs = self._sanitize_addresses(netaddr.cidr_merge(member_ips))
+        if (self._get_new_set_ips(set_name, cidrs) or
+                self._get_deleted_set_ips(set_name, cidrs) or
+                not self.set_name_exists(set_name)):
+            self.set_members_mutate(set_name, ethertype, cidrs)
+        old_member_ips = set(self.ipset_members.get(set_name, []))
+        self.ipset_members[set_name] = member_ips
+        return (list(set(member_ips) - old_member_ips),
+                list(old_member_ips - set(member_ips)))
+
     @runtime.synchronized('ipset', external=True)
     def set_members_mutate(self, set_name, ethertype, member_ips):
         if not self.set_name_exists(set_name):
@@ -184,3 +203,4 @@ class IpsetManager(object):
             cmd = ['ipset', 'destroy', set_name]
             self._apply(cmd, fail_on_errors=False)
             self.ipset_sets.pop(set_name, None)
+            self.ipset_members.pop(set_name, None)
@@ -68,7 +68,10 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             namespace=namespace)
         # TODO(majopela, shihanzhang): refactor out ipset to a separate
         # driver composed over this one
-        self.ipset = ipset_manager.IpsetManager(namespace=namespace)
+        self.ipset = ipset_manager.IpsetManager(
+            namespace=namespace,
+            aggregate_members=(
+                cfg.CONF.SECURITYGROUP.aggregate_remote_group_members))
         # list of port which has security group
         self.filtered_ports = {}
         self.unfiltered_ports = {}
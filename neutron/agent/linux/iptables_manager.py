@@ -24,7 +24,10 @@ import difflib
 import os
 import re
 import sys
+import time
 
+from eventlet import event
+from neutron_lib import constants as lib_constants
 from neutron_lib import exceptions
 from neutron_lib.exceptions import l3 as l3_exc
 from neutron_lib.utils import runtime
@@ -39,6 +42,8 @@ from neutron.agent.linux import iptables_comments as ic
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import constants
 from neutron.conf.agent import common as config
+from neutron.notifiers import batch_notifier
+from neutron.privileged.agent.linux import iptables as priv_iptables
 
 LOG = logging.getLogger(__name__)
 
@@ -64,7 +69,7 @@ IPTABLES_ERROR_LINES_OF_CONTEXT = 5
 XTABLES_RESOURCE_PROBLEM_CODE = 4
 
 # xlock wait interval, in microseconds
-XLOCK_WAIT_INTERVAL = 200000
+XLOCK_WAIT_INTERVAL = priv_iptables.XLOCK_WAIT_INTERVAL
 
 
 def comment_rule(rule, comment):
@@ -275,6 +280,79 @@ class IptablesTable(object):
             self.rules.remove(rule)
 
 
+class IptablesRestoreBatcher(object):
+    """Runs the iptables-restore commands of many namespaces together.
+
+    The commands requested while a batch is running or during the
+    batch_interval seconds following it are sent to the privsep daemon in a
+    single call, which switches to the namespace of each command itself
+    instead of forking 'ip netns exec'. The caller of restore() waits for
+    the result of its own command.
+    """
+
+    def __init__(self, batch_interval):
+        self.batch_interval = batch_interval
+        self._notifier = batch_notifier.BatchNotifier(
+            batch_interval, self._run_restores)
+
+    def restore(self, namespace, ip_version, commands, noflush=False,
+                wait_seconds=None):
+        """Run iptables-restore and return the error it failed with, if any.
+
+        The arguments of the command are built by the privsep daemon, see
+        priv_iptables.get_restore_args().
+        """
+        process_input = '\n'.join(commands)
+        result = event.Event()
+        self._notifier.queue_event((namespace, ip_version, noflush,
+                                    wait_seconds, process_input, result))
+        return result.wait()
+
+    @staticmethod
+    def _run_restores(restores):
+        try:
+            outputs = priv_iptables.restore_iptables(
+                [restore[:-1] for restore in restores])
+        except Exception as e:
+            LOG.exception("Failed to run %d iptables-restore commands",
+                          len(restores))
+            outputs = [e] * len(restores)
+
+        for restore, output in zip(restores, outputs):
+            process_input, result = restore[-2:]
+            if isinstance(output, Exception):
+                result.send(output)
+                continue
+            returncode, stdout, stderr = output
+            if not returncode:
+                result.send(None)
+                continue
+            msg = _("Exit code: %(returncode)d; "
+                    "Stdin: %(stdin)s; "
+                    "Stdout: %(stdout)s; "
+                    "Stderr: %(stderr)s") % {
+                        'returncode': returncode,
+                        'stdin': process_input,
+                        'stdout': stdout,
+                        'stderr': stderr}
+            result.send(exceptions.ProcessExecutionError(
+                msg, returncode=returncode))
+
+
+_restore_batcher = None
+
+
+def _get_restore_batcher():
+    global _restore_batcher
+    batch_interval = cfg.CONF.AGENT.iptables_restore_batch_interval
+    if not batch_interval:
+        return
+    if (_restore_batcher is None or
+            _restore_batcher.batch_interval != batch_interval):
+        _restore_batcher = IptablesRestoreBatcher(batch_interval)
+    return _restore_batcher
+
+
 class IptablesManager(object):
     """Wrapper for iptables.
 
@@ -314,6 +392,11 @@ class IptablesManager(object):
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
 
+        # rules applied last per command, see _get_applied_rules
+        self._applied_rules = {}
+        self.saves = 0
+        self.saves_avoided = 0
+
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
 
@@ -478,10 +561,17 @@ class IptablesManager(object):
         # give agent some time to report back to server
         return str(max(int(cfg.CONF.AGENT.report_interval / 3.0), 1))
 
-    def _do_run_restore(self, args, commands, lock=False):
-        args = args[:]
+    def _do_run_restore(self, ip_version, commands, lock=False):
+        batcher = _get_restore_batcher()
+        if batcher:
+            return batcher.restore(
+                self.namespace, ip_version, commands, noflush=True,
+                wait_seconds=self.xlock_wait_time if lock else None)
+        args = [priv_iptables.RESTORE_COMMANDS[ip_version], '-n']
         if lock:
             args += ['-w', self.xlock_wait_time, '-W', XLOCK_WAIT_INTERVAL]
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
         try:
             kwargs = {} if lock else {'log_fail_as_error': False}
             self.execute(args, process_input='\n'.join(commands),
@@ -489,13 +579,13 @@ class IptablesManager(object):
         except RuntimeError as error:
             return error
 
-    def _run_restore(self, args, commands):
+    def _run_restore(self, ip_version, commands):
         # If we've already tried and used -w successfully, don't
         # run iptables-restore without it.
         if self.use_table_lock:
-            return self._do_run_restore(args, commands, lock=True)
+            return self._do_run_restore(ip_version, commands, lock=True)
 
-        err = self._do_run_restore(args, commands)
+        err = self._do_run_restore(ip_version, commands)
         if (isinstance(err, exceptions.ProcessExecutionError) and
                 err.returncode == XTABLES_RESOURCE_PROBLEM_CODE):
             # maybe we run on a platform that includes iptables commit
@@ -503,7 +593,7 @@ class IptablesManager(object):
             # RHEL) and failed because of xlock acquired by another
             # iptables process running in parallel. Try to use -w to
             # acquire xlock.
-            err = self._do_run_restore(args, commands, lock=True)
+            err = self._do_run_restore(ip_version, commands, lock=True)
             if not err:
                 self.__class__.use_table_lock = True
         return err
@@ -541,64 +631,137 @@ class IptablesManager(object):
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
+        ip_versions = {'iptables': lib_constants.IP_VERSION_4,
+                       'ip6tables': lib_constants.IP_VERSION_6}
         all_commands = []  # variable to keep track all commands for return val
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,)]
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            try:
-                save_output = self.execute(args, run_as_root=True)
-            except RuntimeError:
-                # We could be racing with a cron job deleting namespaces.
-                # It is useless to try to apply iptables rules over and
-                # over again in a endless loop if the namespace does not
-                # exist.
-                with excutils.save_and_reraise_exception() as ctx:
-                    if (self.namespace and not
-                            ip_lib.network_namespace_exists(self.namespace)):
-                        ctx.reraise = False
-                        LOG.error("Namespace %s was deleted during IPTables "
-                                  "operations.", self.namespace)
-                        return []
-            all_lines = save_output.split('\n')
-            commands = []
-            # Traverse tables in sorted order for predictable dump output
-            for table_name in sorted(tables):
-                table = tables[table_name]
-                # isolate the lines of the table we are modifying
-                start, end = self._find_table(all_lines, table_name)
-                old_rules = all_lines[start:end]
-                # generate the new table state we want
-                new_rules = self._modify_rules(old_rules, table, table_name)
-                # generate the iptables commands to get between the old state
-                # and the new state
-                changes = _generate_path_between_rules(old_rules, new_rules)
-                if changes:
-                    # if there are changes to the table, we put on the header
-                    # and footer that iptables-save needs
-                    commands += (['# Generated by iptables_manager'] +
-                                 ['*%s' % table_name] + changes +
-                                 ['COMMIT', '# Completed by iptables_manager'])
+            commands = None
+            applied = self._get_applied_rules(cmd)
+            if applied:
+                saved_at, old_rules_by_table = applied
+                # NOTE: _modify_rules consumes the pending removals, keep
+                # them in case the rules have to be read again
+                removals = {name: (set(table.remove_chains),
+                                   list(table.remove_rules))
+                            for name, table in tables.items()}
+                commands, new_rules_by_table = self._generate_commands(
+                    tables, old_rules_by_table)
+                if self._changes_owned_chains_only(commands):
+                    self.saves_avoided += 1
+                else:
+                    for name, (chains, rules) in removals.items():
+                        tables[name].remove_chains = chains
+                        tables[name].remove_rules = rules
+                    commands = None
+            if commands is None:
+                self._applied_rules.pop(cmd, None)
+                args = ['%s-save' % (cmd,)]
+                if self.namespace:
+                    args = ['ip', 'netns', 'exec', self.namespace] + args
+                try:
+                    saved_at = time.time()
+                    save_output = self.execute(args, run_as_root=True)
+                except RuntimeError:
+                    # We could be racing with a cron job deleting namespaces.
+                    # It is useless to try to apply iptables rules over and
+                    # over again in a endless loop if the namespace does not
+                    # exist.
+                    with excutils.save_and_reraise_exception() as ctx:
+                        if (self.namespace and not
+                                ip_lib.network_namespace_exists(
+                                    self.namespace)):
+                            ctx.reraise = False
+                            LOG.error("Namespace %s was deleted during "
+                                      "IPTables operations.", self.namespace)
+                            return []
+                self.saves += 1
+                all_lines = save_output.split('\n')
+                old_rules_by_table = {}
+                for table_name in tables:
+                    # isolate the lines of the table we are modifying
+                    start, end = self._find_table(all_lines, table_name)
+                    old_rules_by_table[table_name] = all_lines[start:end]
+                commands, new_rules_by_table = self._generate_commands(
+                    tables, old_rules_by_table)
             if not commands:
+                self._save_applied_rules(cmd, saved_at, new_rules_by_table)
                 continue
             all_commands += commands
 
             # always end with a new line
             commands.append('')
 
-            args = ['%s-restore' % (cmd,), '-n']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-
-            err = self._run_restore(args, commands)
+            err = self._run_restore(ip_versions[cmd], commands)
             if err:
+                self._applied_rules.pop(cmd, None)
                 self._log_restore_err(err, commands)
                 raise err
+            self._save_applied_rules(cmd, saved_at, new_rules_by_table)
 
-        LOG.debug("IPTablesManager.apply completed with success. %d iptables "
-                  "commands were issued", len(all_commands))
+        LOG.debug("IPTablesManager.apply completed with success. %(count)d "
+                  "iptables commands were issued (iptables-save runs: "
+                  "%(saves)d, avoided: %(avoided)d)",
+                  {'count': len(all_commands), 'saves': self.saves,
+                   'avoided': self.saves_avoided})
         return all_commands
 
+    def _generate_commands(self, tables, old_rules_by_table):
+        """Generate the iptables-restore input to apply the tables.
+
+        Returns the list of commands and the new rules of each table.
+        """
+        commands = []
+        new_rules_by_table = {}
+        # Traverse tables in sorted order for predictable dump output
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            old_rules = old_rules_by_table.get(table_name, [])
+            # generate the new table state we want
+            new_rules = self._modify_rules(old_rules, table, table_name)
+            new_rules_by_table[table_name] = new_rules
+            # generate the iptables commands to get between the old state
+            # and the new state
+            changes = _generate_path_between_rules(old_rules, new_rules)
+            if changes:
+                # if there are changes to the table, we put on the header
+                # and footer that iptables-save needs
+                commands += (['# Generated by iptables_manager'] +
+                             ['*%s' % table_name] + changes +
+                             ['COMMIT', '# Completed by iptables_manager'])
+        return commands, new_rules_by_table
+
+    def _get_applied_rules(self, cmd):
+        """Return the time of the last iptables-save and the rules applied
+        since then, if they can be used instead of running iptables-save.
+        """
+        interval = cfg.CONF.AGENT.iptables_save_interval
+        if not interval or cfg.CONF.AGENT.debug_iptables_rules:
+            return
+        applied = self._applied_rules.get(cmd)
+        if applied and time.time() - applied[0] < interval:
+            return applied
+
+    def _save_applied_rules(self, cmd, saved_at, rules_by_table):
+        if cfg.CONF.AGENT.iptables_save_interval:
+            self._applied_rules[cmd] = (saved_at, rules_by_table)
+
+    def _changes_owned_chains_only(self, commands):
+        # only the chains wrapped with our name are never modified by other
+        # iptables users, so only their changes can be computed from the
+        # rules applied last
+        prefix = '%s-' % self.wrap_name
+        for command in commands:
+            if command.startswith(':'):
+                chain = command[1:].split(' ', 1)[0]
+            elif command.startswith(('-D ', '-I ', '-X ')):
+                chain = command.split(' ', 2)[1]
+            else:
+                # table header and footer
+                continue
+            if not chain.startswith(prefix):
+                return False
+        return True
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
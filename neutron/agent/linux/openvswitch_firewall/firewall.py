@@ -22,6 +22,7 @@ from neutron_lib.callbacks import events as callbacks_events
 from neutron_lib.callbacks import registry as callbacks_registry
 from neutron_lib.callbacks import resources as callbacks_resources
 from neutron_lib import constants as lib_const
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import netutils
 
@@ -264,6 +265,56 @@ class ConjIdMap(object):
         return result
 
 
+class AddressAggregator(object):
+    """Merge the addresses sharing the same conj_ids into CIDRs.
+
+    The CIDRs of different conj_ids never overlap, as long as the addresses
+    do not overlap.
+    """
+
+    def __init__(self):
+        # addr -> conj_ids tuple
+        self.addr_conj_ids = {}
+        # conj_ids tuple -> set of addrs
+        self.conj_id_addrs = collections.defaultdict(set)
+        # conj_ids tuple -> set of CIDRs covering its addrs
+        self.conj_id_cidrs = {}
+
+    def update(self, addrs, addr_to_conj):
+        """Update the conj_ids of addrs, as given by addr_to_conj.
+
+        Return the CIDRs whose flows may need to be updated, and a map of
+        CIDR -> list of conj_ids for those which are still needed.
+        """
+        changed_conj_ids = set()
+        for addr in addrs:
+            old_conj_ids = self.addr_conj_ids.pop(addr, None)
+            if old_conj_ids is not None:
+                self.conj_id_addrs[old_conj_ids].discard(addr)
+                changed_conj_ids.add(old_conj_ids)
+            if addr in addr_to_conj:
+                conj_ids = tuple(addr_to_conj[addr])
+                self.addr_conj_ids[addr] = conj_ids
+                self.conj_id_addrs[conj_ids].add(addr)
+                changed_conj_ids.add(conj_ids)
+
+        cidrs = set()
+        cidr_to_conj = {}
+        for conj_ids in changed_conj_ids:
+            cidrs |= self.conj_id_cidrs.pop(conj_ids, set())
+            conj_id_addrs = self.conj_id_addrs[conj_ids]
+            if not conj_id_addrs:
+                del self.conj_id_addrs[conj_ids]
+                continue
+            conj_id_cidrs = set(
+                str(cidr) for cidr in netaddr.cidr_merge(conj_id_addrs))
+            self.conj_id_cidrs[conj_ids] = conj_id_cidrs
+            cidrs |= conj_id_cidrs
+            for cidr in conj_id_cidrs:
+                cidr_to_conj[cidr] = list(conj_ids)
+        return cidrs, cidr_to_conj
+
+
 class ConjIPFlowManager(object):
     """Manage conj_id allocation and remote securitygroups derived
     conjunction flows.
@@ -286,50 +337,102 @@ class ConjIPFlowManager(object):
         self.conj_ids = collections.defaultdict(dict)
         self.flow_state = collections.defaultdict(
             lambda: collections.defaultdict(dict))
-
-    def _build_addr_conj_id_map(self, ethertype, sg_conj_id_map):
-        """Build a map of addr -> list of conj_ids."""
-        addr_to_conj = collections.defaultdict(list)
+        # The conj_ids and addresses of each remote group the flows were
+        # last updated with, indexed like:
+        #     self.remote_group_state[vlan_tag][(direction, ethertype)][
+        #         remote_sg_id]
+        self.remote_group_state = collections.defaultdict(
+            lambda: collections.defaultdict(dict))
+        # If the addresses are aggregated, flow_state is indexed by CIDR
+        # instead of address and the aggregators are indexed like
+        # flow_state.
+        self.aggregate_addresses = (
+            cfg.CONF.SECURITYGROUP.aggregate_remote_group_members)
+        self.aggregators = collections.defaultdict(
+            lambda: collections.defaultdict(AddressAggregator))
+
+    def _update_remote_group_state(self, ethertype, sg_conj_id_map,
+                                   remote_state):
+        """Update remote_state and return the addresses whose conj_ids
+        may have changed since the last update.
+        """
+        changed_addrs = set()
+        for remote_id in set(remote_state) - set(sg_conj_id_map):
+            changed_addrs |= remote_state.pop(remote_id)[1]
         for remote_id, conj_id_set in sg_conj_id_map.items():
             remote_group = self.driver.sg_port_map.get_sg(remote_id)
-            if not remote_group:
+            if remote_group:
+                addrs = frozenset(
+                    remote_group.get_ethertype_filtered_addresses(ethertype))
+            else:
                 LOG.debug('No member for SG %s', remote_id)
-                continue
-            for addr in remote_group.get_ethertype_filtered_addresses(
-                    ethertype):
-                addr_to_conj[addr].extend(conj_id_set)
+                addrs = frozenset()
+            conj_ids = frozenset(conj_id_set)
+            old_conj_ids, old_addrs = remote_state.get(
+                remote_id, (frozenset(), frozenset()))
+            if conj_ids != old_conj_ids:
+                changed_addrs |= old_addrs | addrs
+            else:
+                changed_addrs |= old_addrs ^ addrs
+            remote_state[remote_id] = (conj_ids, addrs)
+        return changed_addrs
 
+    @staticmethod
+    def _build_addr_conj_id_map(addrs, remote_state):
+        """Build a map of addr -> list of conj_ids for the given addrs."""
+        addr_to_conj = {}
+        for addr in addrs:
+            conj_ids = [conj_id
+                        for conj_id_set, remote_addrs in remote_state.values()
+                        if addr in remote_addrs
+                        for conj_id in conj_id_set]
+            if conj_ids:
+                addr_to_conj[addr] = sorted(conj_ids)
         return addr_to_conj
 
     def _update_flows_for_vlan_subr(self, direction, ethertype, vlan_tag,
-                                    flow_state, addr_to_conj):
+                                    flow_state, addrs, addr_to_conj):
         """Do the actual flow updates for given direction and ethertype."""
-        current_ips = set(flow_state.keys())
-        self.driver.delete_flows_for_ip_addresses(
-            current_ips - set(addr_to_conj.keys()),
-            direction, ethertype, vlan_tag)
+        removed_addrs = set(addr for addr in addrs
+                            if addr in flow_state and
+                            addr not in addr_to_conj)
+        if removed_addrs:
+            self.driver.delete_flows_for_ip_addresses(
+                removed_addrs, direction, ethertype, vlan_tag)
+            for addr in removed_addrs:
+                del flow_state[addr]
         for addr, conj_ids in addr_to_conj.items():
-            conj_ids.sort()
             if flow_state.get(addr) == conj_ids:
                 continue
             for flow in rules.create_flows_for_ip_address(
                     addr, direction, ethertype, vlan_tag, conj_ids):
                 self.driver._add_flow(**flow)
+            flow_state[addr] = conj_ids
 
     def update_flows_for_vlan(self, vlan_tag):
         """Install action=conjunction(conj_id, 1/2) flows,
         which depend on IP addresses of remote_group_id.
+
+        Only the flows of the addresses added to or removed from a remote
+        group, or of the remote groups whose conj_ids changed, are updated.
         """
         for (direction, ethertype), sg_conj_id_map in (
                 self.conj_ids[vlan_tag].items()):
-            # TODO(toshii): optimize when remote_groups have
-            # no address overlaps.
+            remote_state = self.remote_group_state[vlan_tag][
+                (direction, ethertype)]
+            changed_addrs = self._update_remote_group_state(
+                ethertype, sg_conj_id_map, remote_state)
+            if not changed_addrs:
+                continue
             addr_to_conj = self._build_addr_conj_id_map(
-                ethertype, sg_conj_id_map)
+                changed_addrs, remote_state)
+            if self.aggregate_addresses:
+                changed_addrs, addr_to_conj = self.aggregators[vlan_tag][
+                    (direction, ethertype)].update(changed_addrs,
+                                                   addr_to_conj)
             self._update_flows_for_vlan_subr(direction, ethertype, vlan_tag,
                 self.flow_state[vlan_tag][(direction, ethertype)],
-                addr_to_conj)
-            self.flow_state[vlan_tag][(direction, ethertype)] = addr_to_conj
+                changed_addrs, addr_to_conj)
 
     def add(self, vlan_tag, sg_id, remote_sg_id, direction, ethertype,
             priority_offset):
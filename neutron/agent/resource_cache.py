@@ -12,33 +12,125 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import datetime
+import os
+import time
+
 from neutron_lib.callbacks import events
 from neutron_lib.callbacks import registry
 from neutron_lib import context as n_ctx
 from neutron_lib import rpc as n_rpc
+from neutron_lib.utils import file as file_utils
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 
 from neutron._i18n import _
 from neutron.api.rpc.callbacks.consumer import registry as registry_rpc
 from neutron.api.rpc.callbacks import events as events_rpc
+from neutron.api.rpc.callbacks import resources as rpc_resources
 from neutron.api.rpc.handlers import resources_rpc
 from neutron import objects
+from neutron.objects import base as objects_base
 
 LOG = logging.getLogger(__name__)
 objects.register_objects()
 
+# Deleted IDs are remembered for this long (in seconds) so late updates for
+# deleted resources are discarded. It only needs to be larger than the
+# maximum delay of an RPC message or a bulk_pull response.
+DELETED_IDS_TTL = 3600
+# Upper bound of deleted IDs remembered per resource type.
+DELETED_IDS_MAX_SIZE = 100000
+# When resyncing, changes are pulled starting this many seconds before the
+# newest update received to cover clock differences between servers.
+RESYNC_CLOCK_SKEW = 60
+# Bumped whenever the layout of the snapshot written by save_snapshot changes
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class DeletedIdsTracker(object):
+    """Time ordered, bounded set of IDs of deleted resources.
+
+    IDs are expired once they are older than ttl seconds or when more than
+    max_size IDs are being tracked, oldest first. The number of expired IDs
+    is kept in the 'evicted' counter.
+    """
+    def __init__(self, ttl=DELETED_IDS_TTL, max_size=DELETED_IDS_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.evicted = 0
+        # ID -> deletion time, in insertion (and therefore time) order
+        self._deleted = collections.OrderedDict()
+
+    def __contains__(self, obj_id):
+        self._expire()
+        return obj_id in self._deleted
+
+    def __len__(self):
+        self._expire()
+        return len(self._deleted)
+
+    def add(self, obj_id):
+        """Records obj_id as deleted. Returns a list of the expired IDs."""
+        self._deleted.pop(obj_id, None)
+        self._deleted[obj_id] = time.time()
+        return self._expire()
+
+    def _expire(self):
+        expired = []
+        deadline = time.time() - self.ttl
+        while self._deleted:
+            obj_id, deleted_at = next(iter(self._deleted.items()))
+            if (deleted_at > deadline and
+                    len(self._deleted) <= self.max_size):
+                break
+            del self._deleted[obj_id]
+            expired.append(obj_id)
+        self.evicted += len(expired)
+        return expired
+
 
 class RemoteResourceCache(object):
     """Retrieves and stashes logical resources in their OVO format.
 
     This is currently only compatible with OVO objects that have an ID.
+
+    :param resource_types: list of resource types to track.
+    :param indexed_fields: optional dict mapping a resource type to a list
+                           of field names. A secondary index of
+                           value -> object IDs is kept for each of these
+                           fields so that get_resources queries filtering on
+                           them don't have to scan every cached object. If
+                           the field is a list, each of its values is
+                           indexed.
+    :param deleted_ids_ttl: seconds the IDs of deleted resources are
+                            remembered to discard late updates.
+    :param deleted_ids_max_size: maximum number of deleted resource IDs
+                                 remembered per resource type.
     """
-    def __init__(self, resource_types):
+    def __init__(self, resource_types, indexed_fields=None,
+                 deleted_ids_ttl=DELETED_IDS_TTL,
+                 deleted_ids_max_size=DELETED_IDS_MAX_SIZE):
         self.resource_types = resource_types
         self._cache_by_type_and_id = {rt: {} for rt in self.resource_types}
-        self._deleted_ids_by_type = {rt: set() for rt in self.resource_types}
+        indexed_fields = indexed_fields or {}
+        # rtype -> field -> value -> set of object IDs
+        self._indexes_by_type = {
+            rt: {f: collections.defaultdict(set)
+                 for f in indexed_fields.get(rt, ())}
+            for rt in self.resource_types}
+        self._deleted_ids_by_type = {
+            rt: DeletedIdsTracker(deleted_ids_ttl, deleted_ids_max_size)
+            for rt in self.resource_types}
         # track everything we've asked the server so we don't ask again
         self._satisfied_server_queries = set()
+        # newest updated_at or created_at received per type, used as
+        # resync watermark
+        self._last_update_by_type = {rt: None for rt in self.resource_types}
+        # types loaded from a snapshot and not reconciled with resync yet
+        self._snapshot_types = set()
         self._puller = resources_rpc.ResourcesPullRpcApi()
 
     def _type_cache(self, rtype):
@@ -109,6 +201,172 @@ class RemoteResourceCache(object):
             query_ids.add((rtype, ) + tuple(sorted(filters.items())))
         return query_ids
 
+    def save_snapshot(self, path):
+        """Writes the cached resources to path to warm the cache later.
+
+        The resources are stored as OVO primitives along with the server
+        queries they answer.
+        """
+        snapshot = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'resources': {
+                rtype: [r.obj_to_primitive()
+                        for r in self._type_cache(rtype).values()]
+                for rtype in self.resource_types},
+            'satisfied_server_queries': list(self._satisfied_server_queries),
+        }
+        try:
+            file_utils.replace_file(path, jsonutils.dumps(snapshot))
+        except Exception:
+            LOG.exception("Failed to write resource cache snapshot to %s",
+                          path)
+            return
+        LOG.debug("Wrote resource cache snapshot to %s: %s", path,
+                  {rtype: len(r) for rtype, r in
+                   snapshot['resources'].items()})
+
+    def load_snapshot(self, path):
+        """Warms the cache with a snapshot written by save_snapshot.
+
+        Resources of a type whose OVO version differs from the one in the
+        snapshot are skipped. The loaded resources must then be reconciled
+        with the server using resync, see needs_resync, so only the
+        resources changed while the agent was down are pulled. This is left
+        to the caller to not block on the server here. No notifications are
+        emitted for the loaded resources.
+        """
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                snapshot = jsonutils.loads(f.read())
+            if snapshot.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+                LOG.info("Ignoring resource cache snapshot %s with "
+                         "unsupported format", path)
+                return
+            loaded_types = set()
+            for rtype, primitives in snapshot['resources'].items():
+                if rtype not in self.resource_types:
+                    continue
+                rtype_cls = rpc_resources.get_resource_cls(rtype)
+                if any(p['versioned_object.version'] != rtype_cls.VERSION
+                       for p in primitives):
+                    LOG.info("Ignoring %s resources from cache snapshot "
+                             "with a different version", rtype)
+                    continue
+                for primitive in primitives:
+                    resource = rtype_cls.clean_obj_from_primitive(primitive)
+                    self._type_cache(rtype)[resource.id] = resource
+                    self._add_to_indexes(rtype, resource)
+                    self._record_update_time(rtype, resource)
+                loaded_types.add(rtype)
+            for query in snapshot['satisfied_server_queries']:
+                if query[0] in loaded_types:
+                    # JSON turned the query tuples into lists
+                    self._satisfied_server_queries.add(
+                        (query[0], ) + tuple((k, tuple(v))
+                                             for k, v in query[1:]))
+        except Exception:
+            LOG.exception("Failed to load resource cache snapshot %s", path)
+            self._clear(self.resource_types)
+            return
+        self._snapshot_types = loaded_types
+        LOG.info("Loaded resource cache snapshot %s: %s", path,
+                 {rtype: len(self._type_cache(rtype))
+                  for rtype in self.resource_types})
+
+    @property
+    def needs_resync(self):
+        """Whether resources loaded from a snapshot are not reconciled."""
+        return bool(self._snapshot_types)
+
+    def _clear(self, rtypes):
+        for rtype in rtypes:
+            self._cache_by_type_and_id[rtype] = {}
+            for index in self._indexes_by_type[rtype].values():
+                index.clear()
+            self._last_update_by_type[rtype] = None
+            self._forget_server_queries(rtype)
+
+    def _get_satisfied_filters(self, rtype):
+        """Turns the satisfied queries for rtype back into filter dicts.
+
+        Queries with a single filter key are merged into a single filter
+        per key, since multiple values are treated as an OR condition.
+        """
+        values_by_key = collections.defaultdict(set)
+        filters_list = []
+        for query in self._satisfied_server_queries:
+            if query[0] != rtype:
+                continue
+            filters = dict(query[1:])
+            if len(filters) == 1:
+                key, values = list(filters.items())[0]
+                values_by_key[key].update(values)
+            else:
+                filters_list.append(filters)
+        filters_list.extend({key: tuple(values)}
+                            for key, values in values_by_key.items())
+        return filters_list
+
+    def resync(self):
+        """Pulls the changes that may have been missed from the server.
+
+        Pushed updates are lost while the agent is disconnected from the
+        message bus. Rather than pulling everything again, this only asks
+        the server, for each query already satisfied, about the resources
+        changed since the newest update received for their type and about
+        the cached resources deleted or changed so that they no longer match
+        the query meanwhile.
+
+        The resources loaded from a snapshot of a type that fails to resync
+        or without any update time are dropped.
+
+        Returns the list of resource types that failed to resync.
+        """
+        context = n_ctx.get_admin_context()
+        failed = []
+        for rtype in self.resource_types:
+            last_update = self._last_update_by_type[rtype]
+            if last_update is None:
+                # nothing received for this type yet, just let the queries
+                # hit the server again when they are next issued
+                self._forget_server_queries(rtype)
+                continue
+            changed_since = (timeutils.normalize_time(last_update) -
+                             datetime.timedelta(seconds=RESYNC_CLOCK_SKEW))
+            try:
+                for filters in self._get_satisfied_filters(rtype):
+                    self._pull_changes(context, rtype,
+                                       changed_since.isoformat(), filters)
+            except Exception:
+                LOG.exception("Failed to pull %s changes from the server, "
+                              "it will be queried again on demand", rtype)
+                self._forget_server_queries(rtype)
+                failed.append(rtype)
+        self._clear([rtype for rtype in self._snapshot_types
+                     if rtype in failed or
+                     self._last_update_by_type[rtype] is None])
+        self._snapshot_types = set()
+        return failed
+
+    def _forget_server_queries(self, rtype):
+        self._satisfied_server_queries = {
+            q for q in self._satisfied_server_queries if q[0] != rtype}
+
+    def _pull_changes(self, context, rtype, changed_since, filters):
+        known_ids = [r.id for r in self._get_cached_resources(rtype, filters)]
+        resources, deleted_ids = self._puller.bulk_pull_changes(
+            context, rtype, changed_since, filter_kwargs=filters,
+            known_ids=known_ids)
+        for resource in resources:
+            self.record_resource_update(context, rtype, resource)
+        for resource_id in deleted_ids:
+            self.record_resource_delete(context, rtype, resource_id)
+        LOG.debug("%s %s resources changed and %s deleted since %s for "
+                  "query %s", len(resources), rtype, len(deleted_ids),
+                  changed_since, filters)
+
     def get_resources(self, rtype, filters):
         """Find resources that match key:values in filters dict.
 
@@ -119,7 +377,11 @@ class RemoteResourceCache(object):
         fashion.
         """
         self._flood_cache_for_query(rtype, **filters)
+        return self._get_cached_resources(rtype, filters)
 
+    def _get_cached_resources(self, rtype, filters):
+        """Find cached resources matching filters without asking the server.
+        """
         def match(obj):
             for key, values in filters.items():
                 for value in values:
@@ -135,14 +397,66 @@ class RemoteResourceCache(object):
                     # no match found for this key
                     return False
             return True
-        return self.match_resources_with_func(rtype, match)
+        candidate_ids = self._get_candidate_ids(rtype, filters)
+        if candidate_ids is None:
+            return self.match_resources_with_func(rtype, match)
+        type_cache = self._type_cache(rtype)
+        return [type_cache[obj_id] for obj_id in candidate_ids
+                if match(type_cache[obj_id])]
 
     def match_resources_with_func(self, rtype, matcher):
-        """Returns a list of all resources satisfying func matcher."""
-        # TODO(kevinbenton): this is O(N), offer better lookup functions
+        """Returns a list of all resources satisfying func matcher.
+
+        This is O(N) over the resources of rtype. Use get_resources with
+        filters on indexed fields where possible.
+        """
         return [r for r in self._type_cache(rtype).values()
                 if matcher(r)]
 
+    def _get_candidate_ids(self, rtype, filters):
+        """Returns IDs of objects possibly matching filters using indexes.
+
+        The narrowest set among all indexed filter keys is returned. None is
+        returned if none of the filter keys are indexed.
+        """
+        indexes = self._indexes_by_type.get(rtype, {})
+        candidates = None
+        for key, values in filters.items():
+            if key not in indexes:
+                continue
+            index = indexes[key]
+            ids = set()
+            for value in values:
+                # use get() so lookups don't populate the defaultdict
+                ids.update(index.get(value, ()))
+            if candidates is None or len(ids) < len(candidates):
+                candidates = ids
+            if not candidates:
+                break
+        return candidates
+
+    def _index_values(self, resource, field):
+        value = getattr(resource, field)
+        if isinstance(value, (list, tuple, set)):
+            return set(value)
+        return {value}
+
+    def _add_to_indexes(self, rtype, resource):
+        for field, index in self._indexes_by_type[rtype].items():
+            for value in self._index_values(resource, field):
+                index[value].add(resource.id)
+
+    def _remove_from_indexes(self, rtype, resource):
+        for field, index in self._indexes_by_type[rtype].items():
+            for value in self._index_values(resource, field):
+                ids = index.get(value)
+                if ids is None:
+                    continue
+                ids.discard(resource.id)
+                if not ids:
+                    # don't leak empty buckets for values no longer in use
+                    del index[value]
+
     def _is_stale(self, rtype, resource):
         """Determines if a given resource update is safe to ignore.
 
@@ -171,7 +485,11 @@ class RemoteResourceCache(object):
             LOG.debug("Ignoring stale update for %s: %s", rtype, resource)
             return
         existing = self._type_cache(rtype).get(resource.id)
+        if existing:
+            self._remove_from_indexes(rtype, existing)
         self._type_cache(rtype)[resource.id] = resource
+        self._add_to_indexes(rtype, resource)
+        self._record_update_time(rtype, resource)
         changed_fields = self._get_changed_fields(existing, resource)
         if not changed_fields:
             LOG.debug("Received resource %s update without any changes: %s",
@@ -192,34 +510,92 @@ class RemoteResourceCache(object):
                         existing=existing, updated=resource,
                         resource_id=resource.id)
 
+    def _record_update_time(self, rtype, resource):
+        # updated_at is only set once a resource is updated, the creation
+        # time of resources never updated counts as their last change
+        times = [resource.get(field, None)
+                 for field in ('updated_at', 'created_at')
+                 if field in resource.fields]
+        times = [t for t in times if t]
+        if not times:
+            return
+        changed_at = max(times)
+        last_update = self._last_update_by_type[rtype]
+        if last_update is None or changed_at > last_update:
+            self._last_update_by_type[rtype] = changed_at
+
     def record_resource_delete(self, context, rtype, resource_id):
         # deletions are final, record them so we never
         # accept new data for the same ID.
         LOG.debug("Resource %s deleted: %s", rtype, resource_id)
-        # TODO(kevinbenton): we need a way to expire items from the set at
-        # some TTL so it doesn't grow indefinitely with churn
         if resource_id in self._deleted_ids_by_type[rtype]:
             LOG.debug("Skipped duplicate delete event for %s", resource_id)
             return
-        self._deleted_ids_by_type[rtype].add(resource_id)
+        expired = self._deleted_ids_by_type[rtype].add(resource_id)
+        if expired:
+            LOG.debug("Expired %s deleted %s IDs (%s expired in total)",
+                      len(expired), rtype,
+                      self._deleted_ids_by_type[rtype].evicted)
+        # the deleted ID is remembered above, so there is no need to also
+        # keep the server query issued by get_resource_by_id for it
+        self._satisfied_server_queries.discard(
+            (rtype, ('id', (resource_id, ))))
         existing = self._type_cache(rtype).pop(resource_id, None)
+        if existing:
+            self._remove_from_indexes(rtype, existing)
         # local notification for agent internals to subscribe to
         registry.notify(rtype, events.AFTER_DELETE, self, context=context,
                         existing=existing, resource_id=resource_id)
 
     def _get_changed_fields(self, old, new):
         """Returns changed fields excluding update time and revision."""
-        new = new.to_dict()
-        changed = set(new)
         if old:
-            for k, v in old.to_dict().items():
-                if v == new.get(k):
-                    changed.discard(k)
+            changed = _get_changed_fields(old, new)
+        else:
+            changed = set(new.to_dict())
         for ignore in ('revision_number', 'updated_at'):
             changed.discard(ignore)
         return changed
 
 
+def _get_set_fields(obj):
+    """Returns the names of the fields set on an OVO, extra fields included.
+    """
+    set_fields = {f for f in obj.fields if obj.obj_attr_is_set(f)}
+    set_fields.update(getattr(obj, 'obj_extra_fields', ()))
+    return set_fields
+
+
+def _get_changed_fields(old, new):
+    """Returns the fields set on new that are unset or different on old.
+
+    Field values are compared directly rather than through to_dict(), and
+    nested OVOs are compared field by field, stopping at the first
+    difference, so unchanged nested objects are cheap to skip.
+    """
+    old_fields = _get_set_fields(old)
+    return {f for f in _get_set_fields(new)
+            if f not in old_fields or
+            _values_differ(getattr(old, f), getattr(new, f))}
+
+
+def _values_differ(old, new):
+    if old is new:
+        return False
+    if isinstance(new, objects_base.NeutronObject):
+        if type(old) is not type(new):
+            return True
+        new_fields = _get_set_fields(new)
+        return (_get_set_fields(old) != new_fields or
+                any(_values_differ(getattr(old, f), getattr(new, f))
+                    for f in new_fields))
+    if (isinstance(new, list) and new and
+            isinstance(new[0], objects_base.NeutronObject)):
+        return (not isinstance(old, list) or len(old) != len(new) or
+                any(_values_differ(o, n) for o, n in zip(old, new)))
+    return old != new
+
+
 class RemoteResourceWatcher(object):
     """Converts RPC callback notifications to local registry notifications.
 
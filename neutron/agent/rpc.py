@@ -25,17 +25,21 @@ from neutron_lib.callbacks import resources as callback_resources
 from neutron_lib import constants
 from neutron_lib.plugins import utils
 from neutron_lib import rpc as lib_rpc
+from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_service import loopingcall
 from oslo_utils import uuidutils
 
 from neutron.agent import resource_cache
 from neutron.api.rpc.callbacks import resources
 from neutron.common import constants as n_const
+from neutron.conf.agent import common as agent_conf
 from neutron import objects
 
 LOG = logging.getLogger(__name__)
 BINDING_DEACTIVATE = 'binding_deactivate'
+agent_conf.register_resource_cache_opts(cfg.CONF)
 
 
 def create_consumers(endpoints, prefix, topic_details, start_listening=True):
@@ -176,7 +180,16 @@ def create_cache_for_l2_agent():
         resources.NETWORK,
         resources.SUBNET
     ]
-    rcache = resource_cache.RemoteResourceCache(resource_types)
+    # fields commonly used in get_resources filters by the agent
+    indexed_fields = {
+        resources.PORT: ('network_id', 'device_owner', 'security_group_ids'),
+        resources.SECURITYGROUPRULE: ('security_group_id', ),
+    }
+    rcache = resource_cache.RemoteResourceCache(
+        resource_types, indexed_fields,
+        deleted_ids_ttl=cfg.CONF.AGENT.resource_cache_deleted_ids_ttl,
+        deleted_ids_max_size=(
+            cfg.CONF.AGENT.resource_cache_deleted_ids_max_size))
     rcache.start_watcher()
     return rcache
 
@@ -186,6 +199,18 @@ class CacheBackedPluginApi(PluginApi):
     def __init__(self, *args, **kwargs):
         super(CacheBackedPluginApi, self).__init__(*args, **kwargs)
         self.remote_resource_cache = create_cache_for_l2_agent()
+        self._start_cache_snapshots()
+
+    def _start_cache_snapshots(self):
+        interval = cfg.CONF.AGENT.resource_cache_snapshot_interval
+        if not interval:
+            return
+        path = cfg.CONF.AGENT.resource_cache_snapshot_path
+        self.remote_resource_cache.load_snapshot(path)
+        self._cache_snapshot_loop = loopingcall.FixedIntervalLoopingCall(
+            self.remote_resource_cache.save_snapshot, path)
+        self._cache_snapshot_loop.start(interval=interval,
+                                        initial_delay=interval)
 
     def register_legacy_notification_callbacks(self, legacy_interface):
         """Emulates the server-side notifications from ml2 AgentNotifierApi.
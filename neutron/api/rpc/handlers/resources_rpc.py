@@ -21,6 +21,7 @@ from neutron_lib import rpc as n_rpc
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_utils import timeutils
 
 from neutron._i18n import _
 from neutron.api.rpc.callbacks.consumer import registry as cons_registry
@@ -113,6 +114,32 @@ class ResourcesPullRpcApi(object):
         return [resource_type_cls.clean_obj_from_primitive(primitive)
                 for primitive in primitives]
 
+    @log_helpers.log_method_call
+    def bulk_pull_changes(self, context, resource_type, changed_since,
+                          filter_kwargs=None, known_ids=None):
+        """Pull the resources changed since a given time.
+
+        :param changed_since: ISO 8601 time string. Only resources matching
+                              filter_kwargs updated at or after it are
+                              returned.
+        :param known_ids: IDs of resources the caller knows about. The ones
+                          that no longer exist are reported as deleted, the
+                          ones changed so that they no longer match
+                          filter_kwargs are returned with the changed
+                          resources.
+        :returns: a tuple of the list of changed resources and the list of
+                  deleted resource IDs.
+        """
+        resource_type_cls = _resource_to_class(resource_type)
+        cctxt = self.client.prepare(version='1.2')
+        result = cctxt.call(context, 'bulk_pull_changes',
+            resource_type=resource_type,
+            version=resource_type_cls.VERSION, changed_since=changed_since,
+            filter_kwargs=filter_kwargs, known_ids=known_ids)
+        return ([resource_type_cls.clean_obj_from_primitive(primitive)
+                 for primitive in result['resources']],
+                result['deleted_ids'])
+
 
 class ResourcesPullRpcCallback(object):
     """Plugin-side RPC (implementation) for agent-to-plugin interaction.
@@ -125,9 +152,10 @@ class ResourcesPullRpcCallback(object):
     # History
     #   1.0 Initial version
     #   1.1 Added bulk_pull
+    #   1.2 Added bulk_pull_changes
 
     target = oslo_messaging.Target(
-        version='1.1', namespace=constants.RPC_NAMESPACE_RESOURCES)
+        version='1.2', namespace=constants.RPC_NAMESPACE_RESOURCES)
 
     @oslo_messaging.expected_exceptions(rpc_exc.CallbackNotFound)
     def pull(self, context, resource_type, version, resource_id):
@@ -145,6 +173,40 @@ class ResourcesPullRpcCallback(object):
                 for obj in resource_type_cls.get_objects(context, _pager=None,
                                                          **filter_kwargs)]
 
+    @oslo_messaging.expected_exceptions(rpc_exc.CallbackNotFound)
+    def bulk_pull_changes(self, context, resource_type, version,
+                          changed_since, filter_kwargs=None, known_ids=None):
+        filter_kwargs = dict(filter_kwargs or {})
+        resource_type_cls = _resource_to_class(resource_type)
+        changed_since = timeutils.normalize_time(
+            timeutils.parse_isotime(changed_since))
+        # resolve the changed IDs matching the filters first with a cheap
+        # query, so that only those resources are loaded
+        changed_ids = resource_type_cls.get_ids_changed_since(
+            context, changed_since, **filter_kwargs)
+        resources = []
+        if changed_ids:
+            filter_kwargs['id'] = changed_ids
+            resources = [obj.obj_to_primitive(target_version=version)
+                         for obj in resource_type_cls.get_objects(
+                             context, _pager=None, **filter_kwargs)]
+        deleted_ids = []
+        if known_ids:
+            existing_ids = set(resource_type_cls.get_values(
+                context, 'id', id=known_ids))
+            deleted_ids = [obj_id for obj_id in known_ids
+                           if obj_id not in existing_ids]
+            # the known resources changed so that they no longer match the
+            # filters are returned too, for the cache to stop matching them
+            left_ids = set(resource_type_cls.get_ids_changed_since(
+                context, changed_since, id=known_ids)) - set(changed_ids)
+            if left_ids:
+                resources.extend(
+                    obj.obj_to_primitive(target_version=version)
+                    for obj in resource_type_cls.get_objects(
+                        context, _pager=None, id=list(left_ids)))
+        return {'resources': resources, 'deleted_ids': deleted_ids}
+
 
 class ResourcesPushToServersRpcApi(object):
     """Publisher-side RPC (stub) for plugin-to-plugin fanout interaction.
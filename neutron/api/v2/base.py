@@ -308,15 +308,14 @@ class Controller(object):
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            tmp_list = []
             for obj in obj_list:
                 self._set_parent_id_into_ext_resources_request(
                     request, obj, parent_id, is_get=True)
-                if policy.check(
-                        request.context, self._plugin_handlers[self.SHOW],
-                        obj, plugin=self._plugin, pluralized=self._collection):
-                    tmp_list.append(obj)
-            obj_list = tmp_list
+            visible = policy.check_list(
+                request.context, self._plugin_handlers[self.SHOW],
+                obj_list, pluralized=self._collection)
+            obj_list = [obj for obj, is_visible in zip(obj_list, visible)
+                        if is_visible]
         # Use the first element in the list for discriminating which attributes
         # should be filtered out because of authZ policies
         # fields_to_add contains a list of attributes added for request policy
@@ -118,6 +118,27 @@ AGENT_STATE_OPTS = [
                 help=_('Log agent heartbeats')),
 ]
 
+RESOURCE_CACHE_OPTS = [
+    cfg.IntOpt('resource_cache_snapshot_interval', default=0,
+               help=_('Seconds between snapshots of the agent resource cache '
+                      'written to resource_cache_snapshot_path. The '
+                      'snapshot is loaded when the agent starts and only '
+                      'the resources changed since then are pulled from the '
+                      'server. 0 disables snapshots.')),
+    cfg.StrOpt('resource_cache_snapshot_path',
+               default='$state_path/resource_cache',
+               help=_('Location of the agent resource cache snapshot.')),
+    cfg.IntOpt('resource_cache_deleted_ids_ttl', default=3600, min=1,
+               help=_('Seconds the IDs of deleted resources are remembered '
+                      'by the agent resource cache, so that updates for '
+                      'them received late are discarded. It must be larger '
+                      'than the maximum delay of an RPC message.')),
+    cfg.IntOpt('resource_cache_deleted_ids_max_size', default=100000, min=1,
+               help=_('Maximum number of IDs of deleted resources remembered '
+                      'per resource type by the agent resource cache. The '
+                      'oldest IDs are forgotten first.')),
+]
+
 INTERFACE_DRIVER_OPTS = [
     cfg.StrOpt('interface_driver',
                help=_("The driver used to manage the virtual interface.")),
@@ -136,6 +157,24 @@ IPTABLES_OPTS = [
                        "of iptables-save. This option should not be turned "
                        "on for production systems because it imposes a "
                        "performance penalty.")),
+    cfg.IntOpt('iptables_save_interval', default=0, min=0,
+               help=_("Number of seconds during which the iptables rules "
+                      "applied by an agent are assumed to be unchanged. "
+                      "Within that interval, changes limited to the chains "
+                      "owned by the agent are computed from the rules it "
+                      "applied last, without reading the current rules "
+                      "with iptables-save first. Any other change, a "
+                      "failure to apply rules or the end of the interval "
+                      "reads the current rules again. Use 0 to always read "
+                      "the current rules.")),
+    cfg.FloatOpt('iptables_restore_batch_interval', default=0, min=0,
+                 help=_("Minimum number of seconds between two calls to the "
+                        "privsep daemon running the iptables-restore "
+                        "commands of all the namespaces handled by an "
+                        "agent. The commands requested meanwhile are run by "
+                        "a single call, which switches namespaces itself "
+                        "instead of running 'ip netns exec'. Use 0 to run "
+                        "each command separately.")),
 ]
 
 PROCESS_MONITOR_OPTS = [
@@ -219,6 +258,10 @@ def register_agent_state_opts_helper(conf):
     conf.register_opts(AGENT_STATE_OPTS, 'AGENT')
 
 
+def register_resource_cache_opts(conf):
+    conf.register_opts(RESOURCE_CACHE_OPTS, 'AGENT')
+
+
 def register_interface_driver_opts_helper(conf):
     conf.register_opts(INTERFACE_DRIVER_OPTS)
 
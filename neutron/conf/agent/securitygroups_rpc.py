@@ -36,7 +36,16 @@ security_group_opts = [
         default=True,
         help=_('Use ipset to speed-up the iptables based security groups. '
                'Enabling ipset support requires that ipset is installed on L2 '
-               'agent node.'))
+               'agent node.')),
+    cfg.BoolOpt(
+        'aggregate_remote_group_members',
+        default=False,
+        help=_('Merge the addresses of the members of remote security '
+               'groups into the smallest list of CIDRs covering them before '
+               'adding them to ipsets or to the flows of the openvswitch '
+               'firewall driver. This reduces the number of entries when '
+               'the addresses are contiguous, but can increase the number '
+               'of prefix lengths to look up per packet.')),
 ]
 
 
@@ -114,6 +114,14 @@ core_opts = [
                help=_("Neutron IPAM (IP address management) driver to use. "
                       "By default, the reference implementation of the "
                       "Neutron IPAM driver is used.")),
+    cfg.IntOpt('ipam_prefetch_size', default=0, min=0,
+               help=_("Number of free IP addresses prefetched per subnet by "
+                      "each API worker when the internal IPAM driver "
+                      "allocates any address of a subnet. Handing out "
+                      "prefetched addresses spreads the addresses picked by "
+                      "concurrent port creations and avoids loading the "
+                      "subnet allocations for every port. 0 disables "
+                      "prefetching.")),
     cfg.BoolOpt('vlan_transparent', default=False,
                 help=_('If True, then allow plugins that support it to '
                        'create VLAN transparent networks.')),
@@ -121,6 +121,12 @@ ovs_opts = [
                help=_("Timeout in seconds to wait for a single "
                       "OpenFlow request. "
                       "Used only for 'native' driver.")),
+    cfg.BoolOpt('of_bundle_deferred_flows', default=False,
+                help=_("Defer the flows modified while the agent processes "
+                       "ports and commit them to each bridge in one atomic "
+                       "OpenFlow bundle. The deferred flows are also "
+                       "committed before port statuses are reported to the "
+                       "server. Used only for 'native' driver.")),
 ]
 
 agent_opts = [
@@ -128,6 +134,18 @@ agent_opts = [
                 default=True,
                 help=_("Minimize polling by monitoring ovsdb for interface "
                        "changes.")),
+    cfg.StrOpt('ovsdb_monitor_interface', default='native',
+               choices=['native', 'ovsdb-client'],
+               help=_("Interface used to monitor ovsdb for interface changes "
+                      "when minimize_polling is set. 'native' uses the ovsdb "
+                      "connection of the agent, 'ovsdb-client' runs an "
+                      "'ovsdb-client monitor' process.")),
+    cfg.IntOpt('port_processing_chunk_size', default=0, min=0,
+               help=_("Number of added or updated ports processed together "
+                      "by the agent. The details of the next ports are "
+                      "fetched from the server while the current ones are "
+                      "wired, filtered and bound. 0 processes all the "
+                      "ports together.")),
     cfg.IntOpt('ovsdb_monitor_respawn_interval',
                default=constants.DEFAULT_OVSDBMON_RESPAWN,
                help=_("The number of seconds to wait before respawning the "
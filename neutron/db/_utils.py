@@ -17,7 +17,9 @@ NOTE: This module shall not be used by external projects. It will be moved
 
 import contextlib
 
+from neutron_lib.db import model_query as lib_model_query
 from neutron_lib.db import utils as db_utils
+from oslo_db.sqlalchemy import utils as sa_utils
 from oslo_log import log as logging
 from oslo_utils import excutils
 
@@ -81,3 +83,38 @@ def model_query(context, model):
     if query_filter is not None:
         query = query.filter(query_filter)
     return query
+
+
+def get_marker_keys(context, model, sorts, limit, marker):
+    """Retrieve the pagination keys of a marker.
+
+    get_collection_query() only paginates sorted queries. It then appends
+    the first set of unique keys returned by get_unique_keys() to the sort
+    keys, and paginate_query() reads the marker value of each of them to
+    build the criteria of the next page. get_unique_keys() caches its result
+    on the table, so the same set of unique keys is picked here. Only these
+    columns are loaded instead of the whole resource and its eager loaded
+    relationships; without sorts, only the id is loaded to check that the
+    marker exists.
+
+    :param context: The request context.
+    :param model: The model of the paginated resource.
+    :param sorts: A list of (key, direction) tuples.
+    :param limit: Indicates if pagination is in effect.
+    :param marker: The id of the marker resource.
+    :returns: A row with one attribute per pagination key if limit and marker
+        are given and the marker is visible in the context, None otherwise.
+    """
+    if not (limit and marker):
+        return None
+    keys = db_utils.get_and_validate_sort_keys(sorts or [], model)
+    if keys:
+        unique_keys = sa_utils.get_unique_keys(model)
+        if unique_keys:
+            keys += [key for key in unique_keys[0] if key not in keys]
+    else:
+        keys = ['id']
+    query = lib_model_query.query_with_hooks(context, model)
+    query = query.with_entities(
+        *[getattr(model, key).label(key) for key in keys])
+    return query.filter(model.id == marker).first()
@@ -43,6 +43,13 @@ from neutron.objects import subnetpool as subnetpool_obj
 
 LOG = logging.getLogger(__name__)
 
+# Port attributes built from the ports table and the IP allocations only,
+# without the functions extending the port resource.
+CORE_PORT_FIELDS = frozenset(['id', 'name', 'network_id', 'tenant_id',
+                              'project_id', 'mac_address', 'admin_state_up',
+                              'status', 'fixed_ips', 'device_id',
+                              'device_owner'])
+
 
 def convert_result_to_dict(f):
     @functools.wraps(f)
@@ -210,11 +217,14 @@ class DbBasePluginCommon(common_db_mixin.CommonDbMixin):
                "mac_address": port["mac_address"],
                "admin_state_up": port["admin_state_up"],
                "status": port["status"],
-               "fixed_ips": [{'subnet_id': ip["subnet_id"],
-                              'ip_address': ip["ip_address"]}
-                             for ip in port["fixed_ips"]],
                "device_id": port["device_id"],
                "device_owner": port["device_owner"]}
+        # NOTE: the IP allocations are not loaded by the queries projecting
+        # ports on other core fields.
+        if process_extensions or not fields or 'fixed_ips' in fields:
+            res["fixed_ips"] = [{'subnet_id': ip["subnet_id"],
+                                 'ip_address': ip["ip_address"]}
+                                for ip in port["fixed_ips"]]
         # Call auxiliary extend functions, if any
         if process_extensions:
             resource_extend.apply_funcs(port_def.COLLECTION_NAME, res, port)
@@ -41,11 +41,13 @@ from oslo_utils import excutils
 from oslo_utils import uuidutils
 from sqlalchemy import exc as sql_exc
 from sqlalchemy import not_
+from sqlalchemy import orm
 
 from neutron._i18n import _
 from neutron.api.rpc.agentnotifiers import l3_rpc_agent_api
 from neutron.common import ipv6_utils
 from neutron.common import utils
+from neutron.db import _utils as db_utils
 from neutron.db import db_base_plugin_common
 from neutron.db import ipam_pluggable_backend
 from neutron.db import models_v2
@@ -504,8 +506,10 @@ class NeutronDbPluginV2(db_base_plugin_common.DbBasePluginCommon,
     def _get_networks(self, context, filters=None, fields=None,
                       sorts=None, limit=None, marker=None,
                       page_reverse=False):
-        marker_obj = ndb_utils.get_marker_obj(self, context, 'network',
-                                              limit, marker)
+        marker_obj = db_utils.get_marker_keys(context, models_v2.Network,
+                                              sorts, limit, marker)
+        if marker and limit and marker_obj is None:
+            raise exc.NetworkNotFound(net_id=marker)
         return model_query.get_collection(
             context, models_v2.Network,
             # if caller needs postprocessing, it should implement it explicitly
@@ -1493,13 +1497,27 @@ class NeutronDbPluginV2(db_base_plugin_common.DbBasePluginCommon,
     def get_ports(self, context, filters=None, fields=None,
                   sorts=None, limit=None, marker=None,
                   page_reverse=False):
-        marker_obj = ndb_utils.get_marker_obj(self, context, 'port',
-                                              limit, marker)
+        marker_obj = db_utils.get_marker_keys(context, models_v2.Port,
+                                              sorts, limit, marker)
+        if marker and limit and marker_obj is None:
+            raise exc.PortNotFound(port_id=marker)
         query = self._get_ports_query(context, filters=filters,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
-        items = [self._make_port_dict(c, fields) for c in query]
+        # Only load the relationships of the ports and run the functions
+        # extending them when the requested fields are not all core fields.
+        process_extensions = not (
+            fields and db_base_plugin_common.CORE_PORT_FIELDS.issuperset(
+                fields))
+        if not process_extensions:
+            query = query.options(orm.lazyload('*'))
+            if 'fixed_ips' in fields:
+                query = query.options(
+                    orm.subqueryload(models_v2.Port.fixed_ips))
+        items = [self._make_port_dict(c, fields,
+                                      process_extensions=process_extensions)
+                 for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
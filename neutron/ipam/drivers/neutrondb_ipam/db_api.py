@@ -114,6 +114,18 @@ class IpamSubnetManager(object):
         return ipam_objs.IpamAllocation.get_objects(
             context, ipam_subnet_id=self._ipam_subnet_id, status=status)
 
+    def list_allocated_ips(self, context):
+        """Return the addresses currently allocated on the subnet.
+
+        Unlike list_allocations, only the ip_address column is fetched.
+
+        :param context: neutron api request context
+        :returns: a list of netaddr.IPAddress
+        """
+        return ipam_objs.IpamAllocation.get_values(
+            context, 'ip_address', ipam_subnet_id=self._ipam_subnet_id,
+            status=const.IPAM_ALLOCATION_STATUS_ALLOCATED)
+
     def create_allocation(self, context, ip_address,
                           status=const.IPAM_ALLOCATION_STATUS_ALLOCATED):
         """Create an IP allocation entry.
@@ -13,14 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import itertools
+import bisect
 import random
 
 import netaddr
 from neutron_lib import exceptions as n_exc
 from neutron_lib.plugins import directory
+from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log
+from oslo_utils import excutils
 from oslo_utils import uuidutils
 
 from neutron._i18n import _
@@ -38,6 +40,92 @@ MULTIPLIER = 100
 MAX_WIN_MULTI = MAX_WIN * MULTIPLIER
 
 
+class FreeIpRanges(object):
+    """Free addresses of an allocation pool.
+
+    The free addresses are kept as a sorted list of (first, last) integer
+    ranges, so that the n-th free address of the pool can be looked up
+    without building the set of free addresses.
+
+    :param first_ip: first address of the pool, as a netaddr.IPAddress.
+    :param last_ip: last address of the pool.
+    :param allocated: sorted list of allocated addresses, as integers.
+    """
+
+    def __init__(self, first_ip, last_ip, allocated):
+        self._version = first_ip.version
+        first = int(first_ip)
+        last = int(netaddr.IPAddress(last_ip, self._version))
+        self._ranges = []
+        # index of the first address of each range in the free addresses
+        self._offsets = []
+        self.size = 0
+        start = first
+        for ip in allocated[bisect.bisect_left(allocated, first):
+                            bisect.bisect_right(allocated, last)]:
+            if ip > start:
+                self._add_range(start, ip - 1)
+            start = ip + 1
+        if start <= last:
+            self._add_range(start, last)
+
+    def _add_range(self, first, last):
+        self._ranges.append((first, last))
+        self._offsets.append(self.size)
+        self.size += last - first + 1
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        i = bisect.bisect_right(self._offsets, index) - 1
+        return netaddr.IPAddress(
+            self._ranges[i][0] + index - self._offsets[i], self._version)
+
+
+class IpCandidates(object):
+    """Free IP addresses prefetched per subnet by this worker.
+
+    Addresses are prefetched in chunks randomly picked in the allocation
+    window and handed out locally, so that concurrent port creations do not
+    all sample the same window. A candidate is checked against the database
+    before being allocated and the allocation primary key still rejects
+    duplicates.
+
+    The 'hits', 'refills', 'stale' and 'collisions' counters are the number
+    of candidates handed out, of chunks prefetched, of candidates found
+    already allocated or out of the allocation pools and of duplicate
+    allocations rejected by the database.
+    """
+
+    def __init__(self):
+        self._candidates = {}
+        self.hits = 0
+        self.refills = 0
+        self.stale = 0
+        self.collisions = 0
+
+    def pop(self, subnet_id):
+        candidates = self._candidates.get(subnet_id)
+        if candidates:
+            return candidates.pop()
+
+    def refill(self, subnet_id, ip_addresses):
+        self._candidates[subnet_id] = list(ip_addresses)
+        self.refills += 1
+        LOG.debug("Prefetched %(count)d IP addresses for subnet %(subnet)s "
+                  "(hits: %(hits)d, refills: %(refills)d, stale: "
+                  "%(stale)d, collisions: %(collisions)d)",
+                  {'count': len(ip_addresses), 'subnet': subnet_id,
+                   'hits': self.hits, 'refills': self.refills,
+                   'stale': self.stale, 'collisions': self.collisions})
+
+    def discard(self, subnet_id):
+        self._candidates.pop(subnet_id, None)
+
+
+_ip_candidates = IpCandidates()
+
+
 class NeutronDbSubnet(ipam_base.Subnet):
     """Manage IP addresses for Neutron DB IPAM driver.
 
@@ -157,40 +245,39 @@ class NeutronDbSubnet(ipam_base.Subnet):
         """Generate an IP address from the set of available addresses."""
         return self._generate_ips(context, prefer_next)[0]
 
+    def _list_free_ranges(self, context):
+        """Return the free addresses of each allocation pool."""
+        # NOTE: free addresses are looked up by index in a list of free
+        # ranges built from the sorted allocated addresses, so neither the
+        # allocation OVOs nor an IPSet of the free addresses are built.
+        ip_allocations = sorted(
+            int(ip) for ip in self.subnet_manager.list_allocated_ips(context))
+        return [FreeIpRanges(netaddr.IPAddress(ip_pool.first_ip),
+                             ip_pool.last_ip, ip_allocations)
+                for ip_pool in self.subnet_manager.list_pools(context)]
+
     def _generate_ips(self, context, prefer_next=False, num_addresses=1):
         """Generate a set of IPs from the set of available addresses."""
         allocated_ips = []
         requested_num_addresses = num_addresses
 
-        allocations = self.subnet_manager.list_allocations(context)
-        # It is better not to use 'netaddr.IPSet.add',
-        # because _compact_single_network in 'IPSet.add'
-        # is quite time consuming.
-        ip_allocations = netaddr.IPSet(
-            [netaddr.IPAddress(allocation.ip_address)
-             for allocation in allocations])
-
-        for ip_pool in self.subnet_manager.list_pools(context):
-            ip_set = netaddr.IPSet()
-            ip_set.add(netaddr.IPRange(ip_pool.first_ip, ip_pool.last_ip))
-            av_set = ip_set.difference(ip_allocations)
-            if av_set.size == 0:
+        for av_ranges in self._list_free_ranges(context):
+            if av_ranges.size == 0:
                 continue
 
-            if av_set.size < requested_num_addresses:
+            if av_ranges.size < requested_num_addresses:
                 # All addresses of the address pool are allocated
                 # for the first time and the remaining addresses
                 # will be allocated in the next address pools.
-                allocated_num_addresses = av_set.size
+                allocated_num_addresses = av_ranges.size
             else:
                 # All expected addresses can be assigned in this loop.
                 allocated_num_addresses = requested_num_addresses
 
             if prefer_next:
-                allocated_ip_pool = list(itertools.islice(av_set,
-                    allocated_num_addresses))
-                allocated_ips.extend([str(allocated_ip)
-                                      for allocated_ip in allocated_ip_pool])
+                allocated_ips.extend(
+                    str(av_ranges[index])
+                    for index in range(allocated_num_addresses))
 
                 requested_num_addresses -= allocated_num_addresses
                 if requested_num_addresses:
@@ -198,12 +285,12 @@ class NeutronDbSubnet(ipam_base.Subnet):
                     continue
                 return allocated_ips
 
-            window = min(av_set.size, MAX_WIN)
+            window = min(av_ranges.size, MAX_WIN)
 
             # NOTE(gryf): If there is more than one address, make the window
             # bigger, so that are chances to fulfill demanded amount of IPs.
             if allocated_num_addresses > 1:
-                window = min(av_set.size,
+                window = min(av_ranges.size,
                              allocated_num_addresses * MULTIPLIER,
                              MAX_WIN_MULTI)
 
@@ -212,11 +299,10 @@ class NeutronDbSubnet(ipam_base.Subnet):
             else:
                 # Maximize randomness by using the random module's built in
                 # sampling function
-                av_ips = list(itertools.islice(av_set, 0, window))
-                allocated_ip_pool = random.sample(av_ips,
-                                                  allocated_num_addresses)
-                allocated_ips.extend([str(allocated_ip)
-                                      for allocated_ip in allocated_ip_pool])
+                allocated_ips.extend(
+                    str(av_ranges[index])
+                    for index in random.sample(range(window),
+                                               allocated_num_addresses))
 
             requested_num_addresses -= allocated_num_addresses
             if requested_num_addresses:
@@ -228,6 +314,50 @@ class NeutronDbSubnet(ipam_base.Subnet):
         raise ipam_exc.IpAddressGenerationFailure(
                   subnet_id=self.subnet_manager.neutron_id)
 
+    def _prefetch_ips(self, context, num_addresses):
+        """Pick up to num_addresses free IPs in the allocation window."""
+        ip_addresses = []
+        for av_ranges in self._list_free_ranges(context):
+            window = min(av_ranges.size,
+                         max(MAX_WIN, num_addresses * MULTIPLIER),
+                         MAX_WIN_MULTI)
+            count = min(window, num_addresses - len(ip_addresses))
+            ip_addresses.extend(
+                str(av_ranges[index])
+                for index in random.sample(range(window), count))
+            if len(ip_addresses) == num_addresses:
+                break
+        if not ip_addresses:
+            raise ipam_exc.IpAddressGenerationFailure(
+                subnet_id=self.subnet_manager.neutron_id)
+        return ip_addresses
+
+    def _is_candidate_ip_free(self, context, ip_address):
+        # The candidate may have been allocated by this or another worker,
+        # or the allocation pools may have changed, since it was prefetched
+        ip = netaddr.IPAddress(ip_address)
+        return (any(ip in pool for pool in self._pools or []) and
+                self.subnet_manager.check_unique_allocation(context,
+                                                            ip_address))
+
+    def _get_candidate_ip(self, context):
+        """Return a prefetched free IP address of the subnet."""
+        subnet_id = self.subnet_manager.neutron_id
+        ip_address = _ip_candidates.pop(subnet_id)
+        while ip_address:
+            if self._is_candidate_ip_free(context, ip_address):
+                _ip_candidates.hits += 1
+                return ip_address
+            _ip_candidates.stale += 1
+            ip_address = _ip_candidates.pop(subnet_id)
+
+        ip_addresses = self._prefetch_ips(context,
+                                          cfg.CONF.ipam_prefetch_size)
+        ip_address = ip_addresses.pop()
+        _ip_candidates.refill(subnet_id, ip_addresses)
+        _ip_candidates.hits += 1
+        return ip_address
+
     def allocate(self, address_request):
         # NOTE(pbondar): Ipam driver is always called in context of already
         # running transaction, which is started on create_port or upper level.
@@ -244,7 +374,10 @@ class NeutronDbSubnet(ipam_base.Subnet):
         else:
             prefer_next = isinstance(address_request,
                                      ipam_req.PreferNextAddressRequest)
-            ip_address = self._generate_ip(self._context, prefer_next)
+            if not prefer_next and cfg.CONF.ipam_prefetch_size:
+                ip_address = self._get_candidate_ip(self._context)
+            else:
+                ip_address = self._generate_ip(self._context, prefer_next)
 
         # Create IP allocation request object
         # The only defined status at this stage is 'ALLOCATED'.
@@ -262,6 +395,12 @@ class NeutronDbSubnet(ipam_base.Subnet):
         except db_exc.DBReferenceError:
             raise n_exc.SubnetNotFound(
                 subnet_id=self.subnet_manager.neutron_id)
+        except db_exc.DBDuplicateEntry:
+            with excutils.save_and_reraise_exception():
+                # NOTE: the request is retried by the API layer, drop the
+                # candidates which are likely shared with another worker
+                _ip_candidates.collisions += 1
+                _ip_candidates.discard(self.subnet_manager.neutron_id)
         return ip_address
 
     def bulk_allocate(self, address_request):
@@ -382,6 +521,7 @@ class NeutronDbPool(subnet_alloc.SubnetAllocator):
         IPAM-related data has no foreign key relationships to neutron subnet,
         so removing ipam subnet manually
         """
+        _ip_candidates.discard(subnet_id)
         count = ipam_db_api.IpamSubnetManager.delete(self._context,
                                                      subnet_id)
         if count < 1:
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import math
 import operator
 
@@ -31,6 +32,81 @@ from neutron.ipam import requests as ipam_req
 from neutron.ipam import utils as ipam_utils
 
 
+class FreePrefixes(object):
+    """Free prefixes of a subnet pool, kept as buddy free lists.
+
+    The network addresses of the free prefixes are indexed by prefix length.
+    Allocating a prefix splits the free prefix holding it and frees the
+    buddies of the allocated prefix, so that the allocated prefixes never
+    need to be looked at again.
+
+    :param ip_version: IP version of the subnet pool.
+    :param free_cidrs: disjoint free netaddr.IPNetwork of the subnet pool.
+    """
+
+    def __init__(self, ip_version, free_cidrs):
+        self._ip_version = ip_version
+        self._bits = (constants.IPv4_BITS
+                      if ip_version == constants.IP_VERSION_4
+                      else constants.IPv6_BITS)
+        self._free = collections.defaultdict(set)
+        for cidr in free_cidrs:
+            self._free[cidr.prefixlen].add(cidr.first)
+
+    def _network(self, address, prefixlen):
+        return address >> (self._bits - prefixlen) << (self._bits - prefixlen)
+
+    def _split(self, prefixlen, network, cidr):
+        """Allocate cidr from the free prefix network/prefixlen."""
+        self._free[prefixlen].remove(network)
+        if not self._free[prefixlen]:
+            del self._free[prefixlen]
+        for buddy_prefixlen in range(prefixlen + 1, cidr.prefixlen + 1):
+            buddy = (self._network(cidr.first, buddy_prefixlen) ^
+                     1 << (self._bits - buddy_prefixlen))
+            self._free[buddy_prefixlen].add(buddy)
+
+    def allocate_any(self, prefixlen):
+        """Allocate a prefix of the given length.
+
+        The prefix is taken from the lowest of the smallest free prefixes
+        holding it.
+
+        :returns: the allocated netaddr.IPNetwork or None if there is not
+                  enough free space.
+        """
+        prefixlens = [free_prefixlen for free_prefixlen in self._free
+                      if free_prefixlen <= prefixlen]
+        if not prefixlens:
+            return None
+        free_prefixlen = max(prefixlens)
+        network = min(self._free[free_prefixlen])
+        cidr = netaddr.IPNetwork((network, prefixlen),
+                                 version=self._ip_version)
+        self._split(free_prefixlen, network, cidr)
+        return cidr
+
+    def allocate(self, cidr):
+        """Allocate a specific prefix.
+
+        :returns: True if the prefix was free.
+        """
+        for free_prefixlen in list(self._free):
+            if free_prefixlen > cidr.prefixlen:
+                continue
+            network = self._network(cidr.first, free_prefixlen)
+            if network in self._free[free_prefixlen]:
+                self._split(free_prefixlen, network, cidr)
+                return True
+        return False
+
+
+# Free prefixes of the subnet pools allocated from by this process, keyed by
+# subnet pool ID. Each entry also holds the subnet pool hash, prefixes and
+# number of subnets it was computed for.
+_free_prefixes_cache = {}
+
+
 class SubnetAllocator(driver.Pool):
     """Class for handling allocation of subnet prefixes from a subnet pool.
 
@@ -48,6 +124,8 @@ class SubnetAllocator(driver.Pool):
         This method disallows to allocate concurrently 2 subnets in the same
         subnetpool, it's required to ensure non-overlapping cidrs in the same
         subnetpool.
+
+        :returns: the subnetpool hash before and after locking.
         """
         with db_api.CONTEXT_READER.using(self._context):
             current_hash = (
@@ -71,6 +149,7 @@ class SubnetAllocator(driver.Pool):
         if not count:
             raise db_exc.RetryRequest(exceptions.SubnetPoolInUse(
                                       subnet_pool_id=self._subnetpool['id']))
+        return current_hash, new_hash
 
     def _get_allocated_cidrs(self):
         with db_api.CONTEXT_READER.using(self._context):
@@ -89,6 +168,38 @@ class SubnetAllocator(driver.Pool):
                       key=operator.attrgetter('prefixlen'),
                       reverse=True)
 
+    def _count_allocated_cidrs(self):
+        with db_api.CONTEXT_READER.using(self._context):
+            return (self._context.session.query(models_v2.Subnet)
+                    .filter_by(subnetpool_id=self._subnetpool['id'])
+                    .count())
+
+    def _get_free_prefixes(self, pool_hash):
+        """Return the free prefixes of the locked subnetpool.
+
+        Cached free prefixes are used if the subnetpool hash, prefixes and
+        number of subnets did not change since they were computed, i.e. if
+        no subnet was allocated, deleted or rolled back by another process
+        and the prefixes were not updated. Otherwise they are computed from
+        the allocated subnets.
+
+        :returns: the free prefixes and the key to cache them with once a
+                  subnet has been allocated from them.
+        """
+        prefixes = tuple(sorted(str(x.cidr)
+                                for x in self._subnetpool.prefixes))
+        num_cidrs = self._count_allocated_cidrs()
+        key, free_prefixes = _free_prefixes_cache.pop(
+            self._subnetpool['id'], (None, None))
+        if key != (pool_hash, prefixes, num_cidrs):
+            free_prefixes = FreePrefixes(self._subnetpool['ip_version'],
+                                         self._get_available_prefix_list())
+        return free_prefixes, (prefixes, num_cidrs + 1)
+
+    def _cache_free_prefixes(self, pool_hash, free_prefixes, key):
+        _free_prefixes_cache[self._subnetpool['id']] = (
+            (pool_hash,) + key, free_prefixes)
+
     def _num_quota_units_in_prefixlen(self, prefixlen, quota_unit):
         return math.pow(2, quota_unit - prefixlen)
 
@@ -121,37 +232,37 @@ class SubnetAllocator(driver.Pool):
 
     def _allocate_any_subnet(self, request):
         with db_api.CONTEXT_WRITER.using(self._context):
-            self._lock_subnetpool()
+            pool_hash, new_hash = self._lock_subnetpool()
             self._check_subnetpool_tenant_quota(request.tenant_id,
                                                 request.prefixlen)
-            prefix_pool = self._get_available_prefix_list()
-            for prefix in prefix_pool:
-                if request.prefixlen >= prefix.prefixlen:
-                    subnet = next(prefix.subnet(request.prefixlen))
-                    gateway_ip = request.gateway_ip
-                    if not gateway_ip:
-                        gateway_ip = subnet.network + 1
-                    pools = ipam_utils.generate_pools(subnet.cidr,
-                                                      gateway_ip)
-
-                    return IpamSubnet(request.tenant_id,
-                                      request.subnet_id,
-                                      subnet.cidr,
-                                      gateway_ip=gateway_ip,
-                                      allocation_pools=pools)
-            msg = _("Insufficient prefix space to allocate subnet size /%s")
-            raise exceptions.SubnetAllocationError(
-                reason=msg % str(request.prefixlen))
+            free_prefixes, key = self._get_free_prefixes(pool_hash)
+            subnet = free_prefixes.allocate_any(request.prefixlen)
+            if not subnet:
+                msg = _("Insufficient prefix space to allocate subnet "
+                        "size /%s")
+                raise exceptions.SubnetAllocationError(
+                    reason=msg % str(request.prefixlen))
+            self._cache_free_prefixes(new_hash, free_prefixes, key)
+            gateway_ip = request.gateway_ip
+            if not gateway_ip:
+                gateway_ip = subnet.network + 1
+            pools = ipam_utils.generate_pools(subnet.cidr, gateway_ip)
+
+            return IpamSubnet(request.tenant_id,
+                              request.subnet_id,
+                              subnet.cidr,
+                              gateway_ip=gateway_ip,
+                              allocation_pools=pools)
 
     def _allocate_specific_subnet(self, request):
         with db_api.CONTEXT_WRITER.using(self._context):
-            self._lock_subnetpool()
+            pool_hash, new_hash = self._lock_subnetpool()
             self._check_subnetpool_tenant_quota(request.tenant_id,
                                                 request.prefixlen)
             cidr = request.subnet_cidr
-            available = self._get_available_prefix_list()
-            matched = netaddr.all_matching_cidrs(cidr, available)
-            if len(matched) is 1 and matched[0].prefixlen <= cidr.prefixlen:
+            free_prefixes, key = self._get_free_prefixes(pool_hash)
+            if free_prefixes.allocate(cidr):
+                self._cache_free_prefixes(new_hash, free_prefixes, key)
                 return IpamSubnet(request.tenant_id,
                                   request.subnet_id,
                                   cidr,
@@ -10,31 +10,63 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import itertools
+import time
+
 import eventlet
-from neutron_lib.utils import runtime
-from oslo_utils import uuidutils
+from eventlet import semaphore
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
 
 
 class BatchNotifier(object):
-    def __init__(self, batch_interval, callback):
-        self.pending_events = []
+    """Sends queued events to a callback in batches.
+
+    :param batch_interval: minimum number of seconds between two batches.
+    :param callback: function called with the list of batched events.
+    :param key_func: optional function returning a key for an event. A
+                     queued event is replaced by a newer event with the same
+                     key (last event wins) instead of being sent twice.
+    :param max_batch_size: optional maximum number of events passed to a
+                           single callback call.
+    :param max_queue_size: optional maximum number of pending events. Once
+                           reached, queue_event blocks until the pending
+                           events are sent.
+
+    The number of events queued, coalesced and sent and of batches sent are
+    kept in the 'queued', 'coalesced', 'sent' and 'batches' counters.
+    """
+    def __init__(self, batch_interval, callback, key_func=None,
+                 max_batch_size=None, max_queue_size=None):
         self.callback = callback
         self.batch_interval = batch_interval
-        self._lock_identifier = 'notifier-%s' % uuidutils.generate_uuid()
+        self.key_func = key_func
+        self.max_batch_size = max_batch_size
+        self._pending_events = collections.OrderedDict()
+        self._event_ids = itertools.count()
+        self._free_slots = (semaphore.Semaphore(max_queue_size)
+                            if max_queue_size else None)
+        self._dispatching = False
+        self.queued = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.batches = 0
+
+    @property
+    def pending_events(self):
+        return list(self._pending_events.values())
 
     def queue_event(self, event):
         """Called to queue sending an event with the next batch of events.
 
         Sending events individually, as they occur, has been problematic as it
-        can result in a flood of sends.  Previously, there was a loopingcall
-        thread that would send batched events on a periodic interval.  However,
-        maintaining a persistent thread in the loopingcall was also
-        problematic.
-
-        This replaces the loopingcall with a mechanism that creates a
-        short-lived thread on demand whenever an event is queued. That thread
-        will wait for a lock, send all queued events and then sleep for
-        'batch_interval' seconds to allow other events to queue up.
+        can result in a flood of sends. Instead, a single dispatcher thread
+        is started when an event is queued while none is running. It sends
+        a batch of queued events (at most 'max_batch_size' of them) and then
+        sleeps for 'batch_interval' seconds to allow other events to queue
+        up, until no events are left.
 
         This effectively acts as a rate limiter to only allow 1 batch per
         'batch_interval' seconds.
@@ -44,21 +76,56 @@ class BatchNotifier(object):
         if not event:
             return
 
-        self.pending_events.append(event)
+        key = self.key_func(event) if self.key_func else next(self._event_ids)
+        if key not in self._pending_events and self._free_slots:
+            # NOTE: this yields until enough pending events were sent
+            self._free_slots.acquire()
+            if key in self._pending_events:
+                # queued by someone else while we were waiting
+                self._free_slots.release()
+        if key in self._pending_events:
+            del self._pending_events[key]
+            self.coalesced += 1
+        self._pending_events[key] = event
+        self.queued += 1
 
-        @runtime.synchronized(self._lock_identifier)
-        def synced_send():
-            self._notify()
-            # sleeping after send while holding the lock allows subsequent
-            # events to batch up
-            eventlet.sleep(self.batch_interval)
+        if not self._dispatching:
+            self._dispatching = True
+            eventlet.spawn_n(self._dispatch)
 
-        eventlet.spawn_n(synced_send)
+    def _dispatch(self):
+        try:
+            while self._pending_events:
+                self._notify()
+                # sleeping after send allows subsequent events to batch up
+                eventlet.sleep(self.batch_interval)
+        finally:
+            self._dispatching = False
 
     def _notify(self):
-        if not self.pending_events:
+        # NOTE: a single batch is sent per call, _dispatch sleeps between
+        # batches so that events queued meanwhile still get rate limited.
+        batched_events = []
+        while self._pending_events and (
+                not self.max_batch_size or
+                len(batched_events) < self.max_batch_size):
+            batched_events.append(self._pending_events.popitem(last=False)[1])
+        if not batched_events:
             return
-
-        batched_events = self.pending_events
-        self.pending_events = []
-        self.callback(batched_events)
+        if self._free_slots:
+            for _event in batched_events:
+                self._free_slots.release()
+        start = time.time()
+        try:
+            self.callback(batched_events)
+        except Exception:
+            LOG.exception("Failed to send batch of %d events",
+                          len(batched_events))
+        self.sent += len(batched_events)
+        self.batches += 1
+        LOG.debug("Sent batch of %(count)d events in %(time).3f seconds "
+                  "(queued: %(queued)d, coalesced: %(coalesced)d, "
+                  "sent: %(sent)d)",
+                  {'count': len(batched_events),
+                   'time': time.time() - start, 'queued': self.queued,
+                   'coalesced': self.coalesced, 'sent': self.sent})
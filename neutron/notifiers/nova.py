@@ -44,6 +44,12 @@ NEUTRON_NOVA_EVENT_STATUS_MAP = {constants.PORT_STATUS_ACTIVE: 'completed',
 NOVA_API_VERSION = "2.1"
 
 
+def _get_event_key(event):
+    # a pending event is superseded by a newer event of the same kind for the
+    # same port of the same server
+    return event['server_uuid'], event['name'], event.get('tag')
+
+
 @registry.has_registry_receivers
 class Notifier(object):
 
@@ -65,7 +71,8 @@ class Notifier(object):
             ext for ext in nova_client.discover_extensions(NOVA_API_VERSION)
             if ext.name == "server_external_events"]
         self.batch_notifier = batch_notifier.BatchNotifier(
-            cfg.CONF.send_events_interval, self.send_events)
+            cfg.CONF.send_events_interval, self.send_events,
+            key_func=_get_event_key)
 
     def _get_nova_client(self):
         global_id = common_context.generate_request_id()
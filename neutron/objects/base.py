@@ -84,8 +84,8 @@ class Pager(object):
             if getattr(self, attr) is not None
         }
         if self.marker and self.limit:
-            res['marker_obj'] = obj_db_api.get_object(
-                obj_cls, context, id=self.marker)
+            res['marker_obj'] = obj_db_api.get_marker_keys(
+                obj_cls, context, self.sorts, self.limit, self.marker)
         return res
 
     def __str__(self):
@@ -609,6 +609,29 @@ class NeutronDbObject(NeutronObject):
 
             return values
 
+    @classmethod
+    def get_ids_changed_since(cls, context, changed_since,
+                              validate_filters=True, **kwargs):
+        """Fetch IDs of objects updated at or after a given time
+
+        Only supported for objects with standard attributes.
+
+        :param context:
+        :param changed_since: naive UTC datetime compared with the objects'
+                              created_at and updated_at standard attributes
+        :param validate_filters: Raises an error in case of passing an unknown
+                                 filter
+        :param kwargs: multiple keys defined by key=value pairs
+        :return: list of object IDs
+        """
+        if not cls.has_standard_attributes():
+            msg = _("Object '%s' doesn't track changes.") % cls.obj_name()
+            raise n_exc.InvalidInput(error_message=msg)
+        if validate_filters:
+            cls.validate_filters(**kwargs)
+        return obj_db_api.get_ids_changed_since(
+            cls, context, changed_since, **cls.modify_fields_to_db(kwargs))
+
     @classmethod
     def _validate_field(cls, field):
         if field not in cls.fields or cls.is_synthetic(field):
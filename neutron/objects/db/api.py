@@ -17,6 +17,10 @@ from neutron_lib.db import model_query
 from neutron_lib import exceptions as n_exc
 from neutron_lib.objects import utils as obj_utils
 from oslo_utils import uuidutils
+from sqlalchemy import sql
+
+from neutron.db import _utils as db_utils
+from neutron.db import standard_attr
 
 
 # Common database operation implementations
@@ -32,6 +36,12 @@ def get_object(obj_cls, context, **kwargs):
     return _get_filter_query(obj_cls, context, **kwargs).first()
 
 
+def get_marker_keys(obj_cls, context, sorts, limit, marker):
+    with obj_cls.db_context_reader(context):
+        return db_utils.get_marker_keys(
+            context, obj_cls.db_model, sorts, limit, marker)
+
+
 def count(obj_cls, context, **kwargs):
     return _get_filter_query(obj_cls, context, **kwargs).count()
 
@@ -59,6 +69,20 @@ def get_values(obj_cls, context, field, **kwargs):
             context, obj_cls.db_model, field, filters=filters)
 
 
+def get_ids_changed_since(obj_cls, context, changed_since, **kwargs):
+    std_attr = standard_attr.StandardAttribute
+    with obj_cls.db_context_reader(context):
+        filters = _kwargs_to_filters(**kwargs)
+        query = context.session.query(obj_cls.db_model.id).join(
+            std_attr,
+            obj_cls.db_model.standard_attr_id == std_attr.id).filter(
+            sql.or_(std_attr.created_at >= changed_since,
+                    std_attr.updated_at >= changed_since))
+        query = model_query.apply_filters(
+            query, obj_cls.db_model, filters, context)
+        return [db_id for db_id, in query]
+
+
 def create_object(obj_cls, context, values, populate_id=True):
     with obj_cls.db_context_writer(context):
         if (populate_id and
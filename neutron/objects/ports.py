@@ -407,6 +407,21 @@ class Port(base.NeutronDbObject):
         return super(Port, cls).get_objects(context, _pager, validate_filters,
                                             **kwargs)
 
+    @classmethod
+    def get_ids_changed_since(cls, context, changed_since,
+                              validate_filters=True, security_group_ids=None,
+                              **kwargs):
+        if security_group_ids:
+            ports_with_sg = cls.get_ports_ids_by_security_groups(
+                context, security_group_ids)
+            port_ids = kwargs.get("id", [])
+            if port_ids:
+                kwargs['id'] = list(set(port_ids) & set(ports_with_sg))
+            else:
+                kwargs['id'] = ports_with_sg
+        return super(Port, cls).get_ids_changed_since(
+            context, changed_since, validate_filters, **kwargs)
+
     @classmethod
     def get_port_ids_filter_by_segment_id(cls, context, segment_id):
         query = context.session.query(models_v2.Port.id)
@@ -128,7 +128,14 @@ class CollectionsController(utils.NeutronPecanController):
 
     @utils.expose(generic=True)
     def index(self, *args, **kwargs):
-        return self.get(*args, **kwargs)
+        # NOTE: only the JSON encoding of the collection is streamed, so that
+        # no single string holding the whole document is built. The plugin
+        # still returns the collection as a list, which the hooks process
+        # as a whole, hence memory is bounded by the page size only when
+        # the client paginates. Unpaginated lists are not bounded.
+        utils.set_response_data(request, pecan.response,
+                                self.get(*args, **kwargs))
+        return pecan.response
 
     def get(self, *args, **kwargs):
         # NOTE(blogan): these are set in the FieldsAndFiltersHoook
@@ -28,6 +28,7 @@ from pecan import request
 from neutron._i18n import _
 from neutron.api import api_common
 from neutron import manager
+from neutron import wsgi
 from neutron_lib import exceptions
 
 # Utility functions for Pecan controllers.
@@ -121,6 +122,30 @@ def _set_del_code(f):
     return wrapped
 
 
+def set_response_data(req, resp, data):
+    """Set the JSON body of a response from a dict.
+
+    The body is serialized in chunks while it is sent. The dict is kept in
+    the request context, so that the hooks processing the response read it
+    back with get_response_data instead of decoding the body again.
+    """
+    resp.app_iter = wsgi.iter_encode_body(data)
+    resp.content_type = 'application/json'
+    req.context['response_data'] = (resp.app_iter, data)
+
+
+def get_response_data(req, resp):
+    """Return the decoded JSON body of a response.
+
+    Like the json attribute of the response, raise ValueError if the body is
+    not JSON.
+    """
+    app_iter, data = req.context.get('response_data', (None, None))
+    if app_iter is not None and resp.app_iter is app_iter:
+        return data
+    return resp.json
+
+
 class NeutronPecanController(object):
 
     LIST = 'list'
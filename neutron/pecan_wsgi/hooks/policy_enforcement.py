@@ -159,7 +159,7 @@ class PolicyHook(hooks.PecanHook):
         if resource == 'extension':
             return
         try:
-            data = state.response.json
+            data = utils.get_response_data(state)
         except ValueError:
             return
         if state.request.method not in pecan_constants.ACTION_MAP:
@@ -175,37 +175,50 @@ class PolicyHook(hooks.PecanHook):
             action = controller.plugin_handlers[action_type]
         key = resource if is_single else collection
         to_process = [data[resource]] if is_single else data[collection]
-        # in the single case, we enforce which raises on violation
-        # in the plural case, we just check so violating items are hidden
-        policy_method = policy.enforce if is_single else policy.check
-        plugin = manager.NeutronManager.get_plugin_for_resource(collection)
-        try:
-            resp = [self._get_filtered_item(state.request, controller,
-                                            resource, collection, item)
-                    for item in to_process
-                    if (state.request.method != 'GET' or
-                        policy_method(neutron_context, action, item,
-                                      plugin=plugin,
-                                      pluralized=collection))]
-        except oslo_policy.PolicyNotAuthorized:
-            # This exception must be explicitly caught as the exception
-            # translation hook won't be called if an error occurs in the
-            # 'after' handler.  Instead of raising an HTTPNotFound exception,
-            # we have to set the status_code here to prevent the catch_errors
-            # middleware from turning this into a 500.
-            state.response.status_code = 404
-            return
+        if state.request.method == 'GET':
+            if is_single:
+                # in the single case, we enforce which raises on violation
+                plugin = manager.NeutronManager.get_plugin_for_resource(
+                    collection)
+                try:
+                    policy.enforce(neutron_context, action, to_process[0],
+                                   plugin=plugin, pluralized=collection)
+                except oslo_policy.PolicyNotAuthorized:
+                    # This exception must be explicitly caught as the
+                    # exception translation hook won't be called if an
+                    # error occurs in the 'after' handler.  Instead of
+                    # raising an HTTPNotFound exception, we have to set the
+                    # status_code here to prevent the catch_errors
+                    # middleware from turning this into a 500.
+                    state.response.status_code = 404
+                    return
+            else:
+                # in the plural case, we just check so violating items are
+                # hidden
+                visible = policy.check_list(neutron_context, action,
+                                            to_process, pluralized=collection)
+                to_process = [item for item, is_visible
+                              in zip(to_process, visible) if is_visible]
+        resp = self._get_filtered_items(state.request, controller,
+                                        resource, collection, to_process)
 
         if is_single:
             resp = resp[0]
-        state.response.json = {key: resp}
+        utils.set_response_data(state, {key: resp})
+        resource_cache = policy.get_request_resource_cache(neutron_context)
+        if resource_cache.hits or resource_cache.misses:
+            LOG.debug("Policy resource cache of the request: %(hits)s hits, "
+                      "%(misses)s misses",
+                      {'hits': resource_cache.hits,
+                       'misses': resource_cache.misses})
 
-    def _get_filtered_item(self, request, controller, resource, collection,
-                           data):
+    def _get_filtered_items(self, request, controller, resource, collection,
+                            items):
         neutron_context = request.context.get('neutron_context')
         to_exclude = self._exclude_attributes_by_policy(
-            neutron_context, controller, resource, collection, data)
-        return self._filter_attributes(request, data, to_exclude)
+            neutron_context, controller, resource, collection, items)
+        return [self._filter_attributes(request, item, item_to_exclude)
+                for item, item_to_exclude in zip(items, to_exclude)]
 
     def _filter_attributes(self, request, data, fields_to_strip):
         # This routine will remove the fields that were requested to the
@@ -215,15 +228,18 @@ class PolicyHook(hooks.PecanHook):
                     if item[0] not in fields_to_strip)
 
     def _exclude_attributes_by_policy(self, context, controller, resource,
-                                      collection, data):
+                                      collection, items):
         """Identifies attributes to exclude according to authZ policies.
 
-        Return a list of attribute names which should be stripped from the
-        response returned to the user because the user is not authorized
-        to see them.
+        Return, for each item, a list of attribute names which should be
+        stripped from the response returned to the user because the user is
+        not authorized to see them.
         """
-        attributes_to_exclude = []
-        for attr_name in data.keys():
+        attributes_to_exclude = [[] for _item in items]
+        attr_names = set()
+        for item in items:
+            attr_names.update(item.keys())
+        for attr_name in attr_names:
             # TODO(amotoki): All attribute maps have tenant_id and
             # it determines excluded attributes based on tenant_id.
             # We need to migrate tenant_id to project_id later
@@ -231,27 +247,31 @@ class PolicyHook(hooks.PecanHook):
             # to check all logs carefully.
             if attr_name == 'project_id':
                 continue
+            indexes = [i for i, item in enumerate(items) if attr_name in item]
             attr_data = controller.resource_info.get(attr_name)
             if attr_data and attr_data['is_visible']:
-                if policy.check(
-                        context,
-                        # NOTE(kevinbenton): this used to reference a
-                        # _plugin_handlers dict, why?
-                        'get_%s:%s' % (resource, attr_name),
-                        data,
-                        might_not_exist=True,
-                        pluralized=collection):
-                    # this attribute is visible, check next one
-                    continue
+                visible = policy.check_list(
+                    context,
+                    # NOTE(kevinbenton): this used to reference a
+                    # _plugin_handlers dict, why?
+                    'get_%s:%s' % (resource, attr_name),
+                    [items[i] for i in indexes],
+                    might_not_exist=True,
+                    pluralized=collection)
+                # only the items for which this attribute is not visible
+                # have it excluded
+                indexes = [i for i, is_visible in zip(indexes, visible)
+                           if not is_visible]
             # if the code reaches this point then either the policy check
             # failed or the attribute was not visible in the first place
-            attributes_to_exclude.append(attr_name)
-            # TODO(amotoki): As mentioned in the above TODO,
-            # we treat project_id and tenant_id equivalently.
-            # This should be migrated to project_id later.
-            if attr_name == 'tenant_id':
-                attributes_to_exclude.append('project_id')
-        if attributes_to_exclude:
+            for i in indexes:
+                attributes_to_exclude[i].append(attr_name)
+                # TODO(amotoki): As mentioned in the above TODO,
+                # we treat project_id and tenant_id equivalently.
+                # This should be migrated to project_id later.
+                if attr_name == 'tenant_id':
+                    attributes_to_exclude[i].append('project_id')
+        if any(attributes_to_exclude):
             LOG.debug("Attributes excluded by policy engine: %s",
                       attributes_to_exclude)
         return attributes_to_exclude
@@ -130,7 +130,7 @@ class QueryParametersHook(hooks.PecanHook):
                 state.request.method != 'GET'):
             return
         try:
-            data = state.response.json
+            data = utils.get_response_data(state)
         except ValueError:
             return
         # Do not attempt to paginate if the body is not a list of entities
@@ -146,4 +146,4 @@ class QueryParametersHook(hooks.PecanHook):
         pagination_links = pagination_helper.get_links(obj_list)
         if pagination_links:
             resp_body['_'.join([collection, 'links'])] = pagination_links
-        state.response.json = resp_body
+        utils.set_response_data(state, resp_body)
@@ -14,6 +14,8 @@
 
 from pecan import hooks
 
+from neutron.pecan_wsgi.hooks import utils
+
 
 class UserFilterHook(hooks.PecanHook):
 
@@ -26,7 +28,7 @@ class UserFilterHook(hooks.PecanHook):
         if not user_fields:
             return
         try:
-            data = state.response.json
+            data = utils.get_response_data(state)
         except ValueError:
             return
         resource = state.request.context.get('resource')
@@ -36,14 +38,13 @@ class UserFilterHook(hooks.PecanHook):
         is_single = resource in data
         key = resource if resource in data else collection
         if is_single:
-            data[key] = self._filter_item(
-                state.response.json[key], user_fields)
+            data[key] = self._filter_item(data[key], user_fields)
         else:
             data[key] = [
                 self._filter_item(i, user_fields)
-                for i in state.response.json[key]
+                for i in data[key]
             ]
-        state.response.json = data
+        utils.set_response_data(state, data)
 
     def _filter_item(self, item, fields):
         return {
@@ -28,3 +28,11 @@ def get_controller(state):
 def is_member_action(controller):
     return isinstance(controller,
                       resource.MemberActionController)
+
+
+def get_response_data(state):
+    return controller_utils.get_response_data(state.request, state.response)
+
+
+def set_response_data(state, data):
+    controller_utils.set_response_data(state.request, state.response, data)
@@ -273,6 +273,22 @@ def get_distributed_port_binding_by_host(context, port_id, host):
     return binding
 
 
+@db_api.CONTEXT_READER
+def get_distributed_port_bindings_by_host(context, port_ids, host):
+    """Takes a list of port_ids and returns their bindings for host.
+
+    return format is a dictionary keyed by port ID with the distributed
+    port binding on host as value. Ports without a binding on host are not
+    included.
+    """
+    if not port_ids:
+        return {}
+    query = (context.session.query(models.DistributedPortBinding).
+             filter(models.DistributedPortBinding.port_id.in_(port_ids),
+                    models.DistributedPortBinding.host == host))
+    return {binding.port_id: binding for binding in query}
+
+
 def get_distributed_port_bindings(context, port_id):
     with db_api.CONTEXT_READER.using(context):
         bindings = (context.session.query(models.DistributedPortBinding).
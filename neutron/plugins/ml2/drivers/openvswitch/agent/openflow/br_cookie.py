@@ -37,13 +37,16 @@ class OVSBridgeCookieMixin(object):
         if self._default_cookie not in self._reserved_cookies:
             self._reserved_cookies.add(self._default_cookie)
 
-        uuid_stamp = ovs_lib.generate_random_cookie()
+        uuid_stamp = ovs_lib.generate_random_cookie(self._default_cookie)
         while uuid_stamp in self._reserved_cookies:
-            uuid_stamp = ovs_lib.generate_random_cookie()
+            uuid_stamp = ovs_lib.generate_random_cookie(self._default_cookie)
 
         self._reserved_cookies.add(uuid_stamp)
         return uuid_stamp
 
+    def get_stale_cookie_masks(self):
+        return ovs_lib.get_stale_cookie_masks(self.reserved_cookies)
+
     def unset_cookie(self, cookie):
         self._reserved_cookies.discard(cookie)
 
@@ -14,8 +14,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import functools
 import random
+import threading
 
 import eventlet
 import netaddr
@@ -60,6 +62,16 @@ class OpenFlowSwitchMixin(object):
     def __init__(self, *args, **kwargs):
         self._app = kwargs.pop('os_ken_app')
         self.active_bundles = set()
+        self._deferring = False
+        self._deferred_msgs = []
+        # the greenthread sending a bundle or cleaning up flows holds the
+        # lock, the flow modifications of the others are queued meanwhile
+        self._flows_lock = threading.RLock()
+        self._flows_cond = threading.Condition(self._flows_lock)
+        self._flows_owner = None
+        self.deferred_flows_committed = 0
+        self.deferred_bundles_committed = 0
+        self.deferred_commit_time = 0
         super(OpenFlowSwitchMixin, self).__init__(*args, **kwargs)
 
     def _get_dp_by_dpid(self, dpid_int):
@@ -82,6 +94,19 @@ class OpenFlowSwitchMixin(object):
 
     def _send_msg(self, msg, reply_cls=None, reply_multi=False,
                   active_bundle=None):
+        if (active_bundle is None and
+                self._flows_owner is not eventlet.getcurrent() and
+                (self._deferring or self._flows_owner is not None)):
+            (_dp, _ofp, ofpp) = self._get_dp()
+            if reply_cls is None and isinstance(msg, ofpp.OFPFlowMod):
+                # NOTE: while a bundle is in flight or the flows are
+                # cleaned up, the flow modifications of other greenthreads
+                # are queued for the next bundle so that they cannot
+                # overtake it
+                self._deferred_msgs.append(msg)
+                return
+            # requests reading the switch state must see the deferred flows
+            self.apply_deferred_flows()
         timeout_sec = cfg.CONF.OVS.of_request_timeout
         timeout = eventlet.Timeout(seconds=timeout_sec)
         if active_bundle is not None:
@@ -153,11 +178,12 @@ class OpenFlowSwitchMixin(object):
                               out_port=ofp.OFPP_ANY)
         self._send_msg(msg, active_bundle=active_bundle)
 
-    def dump_flows(self, table_id=None):
+    def dump_flows(self, table_id=None, cookie=0, cookie_mask=0):
         (dp, ofp, ofpp) = self._get_dp()
         if table_id is None:
             table_id = ofp.OFPTT_ALL
-        msg = ofpp.OFPFlowStatsRequest(dp, table_id=table_id)
+        msg = ofpp.OFPFlowStatsRequest(dp, table_id=table_id, cookie=cookie,
+                                       cookie_mask=cookie_mask)
         replies = self._send_msg(msg,
                                  reply_cls=ofpp.OFPFlowStatsReply,
                                  reply_multi=True)
@@ -166,15 +192,97 @@ class OpenFlowSwitchMixin(object):
             flows += rep.body
         return flows
 
+    def _get_table_flow_counts(self):
+        (dp, _ofp, ofpp) = self._get_dp()
+        msg = ofpp.OFPTableStatsRequest(dp, 0)
+        replies = self._send_msg(msg,
+                                 reply_cls=ofpp.OFPTableStatsReply,
+                                 reply_multi=True)
+        return dict((stats.table_id, stats.active_count)
+                    for rep in replies for stats in rep.body
+                    if stats.active_count)
+
+    def _count_flows(self, table_id, cookie, cookie_mask):
+        (dp, ofp, ofpp) = self._get_dp()
+        msg = ofpp.OFPAggregateStatsRequest(dp, 0, table_id, ofp.OFPP_ANY,
+                                            ofp.OFPG_ANY, cookie, cookie_mask,
+                                            ofpp.OFPMatch())
+        reply = self._send_msg(msg, reply_cls=ofpp.OFPAggregateStatsReply)
+        return reply.body.flow_count
+
+    @contextlib.contextmanager
+    def _exclusive_flows(self):
+        with self._flows_lock:
+            owner = self._flows_owner
+            self._flows_owner = eventlet.getcurrent()
+            try:
+                yield
+            finally:
+                self._flows_owner = owner
+
+    @contextlib.contextmanager
+    def _cleaning_flows(self):
+        with self._flows_cond:
+            # do not commit the flow modifications deferred by someone else
+            while self._deferring:
+                self._flows_cond.wait()
+            with self._exclusive_flows():
+                yield
+            if not self._deferring:
+                # send the flow modifications queued meanwhile
+                self.apply_deferred_flows()
+
     def cleanup_flows(self):
-        cookies = set([f.cookie for f in self.dump_flows()]) - \
-                  self.reserved_cookies
-        LOG.debug("Reserved cookies for %s: %s", self.br_name,
-                  self.reserved_cookies)
-        for c in cookies:
-            LOG.warning("Deleting flow with cookie 0x%(cookie)x",
-                        {'cookie': c})
-            self.uninstall_flows(cookie=c, cookie_mask=ovs_lib.UINT64_BITMASK)
+        """Delete the flows whose cookies are not reserved, table by table.
+
+        The flows of the other cookie generations are deleted with cookie
+        masks instead of being dumped. A table is only dumped if it still has
+        flows of a reserved generation with an unreserved cookie afterwards.
+        The thread yields between tables.
+
+        A table is only cleaned up while the flow modifications are not
+        deferred, with exclusive access to the switch: the flow
+        modifications sent meanwhile are queued and the reserved cookies are
+        read again for every table.
+        """
+        with self._cleaning_flows():
+            table_ids = sorted(self._get_table_flow_counts())
+        for table_id in table_ids:
+            with self._cleaning_flows():
+                self._cleanup_table(table_id)
+            eventlet.sleep(0)
+
+    def _cleanup_table(self, table_id):
+        reserved_cookies = self.reserved_cookies
+        flow_count = self._count_flows(table_id, 0, 0)
+        reserved_count = sum(
+            self._count_flows(table_id, c, ovs_lib.UINT64_BITMASK)
+            for c in reserved_cookies)
+        if flow_count <= reserved_count:
+            return
+        LOG.warning("Deleting %(count)d stale flows from table %(table)d of "
+                    "bridge %(bridge)s (reserved cookies: %(cookies)s)",
+                    {'count': flow_count - reserved_count, 'table': table_id,
+                     'bridge': self.br_name, 'cookies': reserved_cookies})
+        for cookie, cookie_mask in ovs_lib.get_stale_cookie_masks(
+                reserved_cookies):
+            self.uninstall_flows(table_id=table_id, cookie=cookie,
+                                 cookie_mask=cookie_mask)
+        generations = set(c & ovs_lib.COOKIE_GENERATION_MASK
+                          for c in reserved_cookies)
+        generation_count = sum(
+            self._count_flows(table_id, g, ovs_lib.COOKIE_GENERATION_MASK)
+            for g in generations)
+        if generation_count <= reserved_count:
+            return
+        for generation in generations:
+            flows = self.dump_flows(table_id, cookie=generation,
+                                    cookie_mask=ovs_lib.COOKIE_GENERATION_MASK)
+            for c in set(f.cookie for f in flows) - reserved_cookies:
+                LOG.warning("Deleting flow with cookie 0x%(cookie)x",
+                            {'cookie': c})
+                self.uninstall_flows(table_id=table_id, cookie=c,
+                                     cookie_mask=ovs_lib.UINT64_BITMASK)
 
     def install_goto_next(self, table_id, active_bundle=None):
         self.install_goto(table_id=table_id, dest_table_id=table_id + 1,
@@ -246,6 +354,61 @@ class OpenFlowSwitchMixin(object):
     def bundled(self, atomic=False, ordered=False):
         return BundledOpenFlowBridge(self, atomic, ordered)
 
+    def defer_flows_on(self):
+        """Defer the flow modifications sent to the switch.
+
+        The deferred flow modifications are sent in one atomic and ordered
+        bundle by apply_deferred_flows() or defer_flows_off(), or before the
+        next request expecting a reply so that it sees them.
+        """
+        self._deferring = True
+
+    def defer_flows_off(self):
+        """Send the deferred flow modifications and stop deferring.
+
+        Deferral stays on if the flow modifications could not be sent, they
+        are sent again with the next bundle.
+        """
+        with self._flows_cond:
+            self.apply_deferred_flows()
+            self._deferring = False
+            self._flows_cond.notify_all()
+
+    def apply_deferred_flows(self):
+        with self._flows_lock:
+            # flow modifications queued while a bundle was in flight are
+            # sent in the next one
+            while self._deferred_msgs:
+                with self._exclusive_flows():
+                    self._send_deferred_bundle()
+
+    def _send_deferred_bundle(self):
+        msgs, self._deferred_msgs = self._deferred_msgs, []
+        start = timeutils.now()
+        try:
+            with self.bundled(atomic=True, ordered=True) as bundle:
+                active_bundle = dict(id=bundle.active_bundle,
+                                     bundle_flags=bundle.bundle_flags)
+                for msg in msgs:
+                    self._send_msg(msg, active_bundle=active_bundle)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # the bundle is discarded, keep its flow modifications
+                # ahead of the ones queued meanwhile
+                self._deferred_msgs[:0] = msgs
+        elapsed = timeutils.now() - start
+        self.deferred_flows_committed += len(msgs)
+        self.deferred_bundles_committed += 1
+        self.deferred_commit_time += elapsed
+        LOG.debug("Committed %(count)d deferred flow modifications to bridge "
+                  "%(bridge)s in %(elapsed).3f seconds (flow modifications: "
+                  "%(flows)d, bundles: %(bundles)d, time: %(time).3f)",
+                  {'count': len(msgs), 'bridge': self.br_name,
+                   'elapsed': elapsed,
+                   'flows': self.deferred_flows_committed,
+                   'bundles': self.deferred_bundles_committed,
+                   'time': self.deferred_commit_time})
+
 
 class BundledOpenFlowBridge(object):
     def __init__(self, br, atomic, ordered):
@@ -15,12 +15,14 @@
 
 import base64
 import collections
+import contextlib
 import functools
 import hashlib
 import signal
 import sys
 import time
 
+import eventlet
 import netaddr
 from neutron_lib.agent import constants as agent_consts
 from neutron_lib.agent import topics
@@ -311,6 +313,13 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             heartbeat.start(interval=report_interval)
         # Initialize iteration counter
         self.iter_num = 0
+        # Time spent in each stage of port processing during an iteration
+        self.port_stage_times = collections.defaultdict(float)
+        # Greenthread cleaning the stale flows in the background
+        self._stale_flows_cleanup = None
+        # Snapshot of the integration bridge ports during an rpc_loop
+        # iteration
+        self._int_br_ports_snapshot = None
         self.run_daemon_loop = True
 
         self.catch_sigterm = False
@@ -935,6 +944,8 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                 LOG.debug("Setting status for %s to DOWN", device)
                 devices_down.append(device)
         if devices_up or devices_down:
+            # the flows of the ports must be in place before they are up
+            self._apply_deferred_flows()
             devices_set = self.plugin_rpc.update_device_list(
                 self.context, devices_up, devices_down, self.agent_id,
                 self.conf.host)
@@ -1285,11 +1296,21 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                 br.set_db_attribute('Interface', phys_if_name,
                                     'options', {'peer': int_if_name})
 
+    def _get_int_br_ports(self):
+        """Return what to read the integration bridge ports from.
+
+        During an rpc_loop iteration, this is a snapshot of the ports read
+        at most once from the local OVSDB replica, otherwise the bridge.
+        """
+        if self._int_br_ports_snapshot is not None:
+            return self._int_br_ports_snapshot
+        return self.int_br
+
     def update_stale_ofport_rules(self):
         # ARP spoofing rules and drop-flow upon port-delete
         # use ofport-based rules
         previous = self.vifname_to_ofport_map
-        current = self.int_br.get_vif_port_to_ofport_map()
+        current = self._get_int_br_ports().get_vif_port_to_ofport_map()
 
         # if any ofport numbers have changed, re-process the devices as
         # added ports so any rules based on ofport numbers are updated.
@@ -1450,7 +1471,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         return port_info, ancillary_port_info, ports_not_ready_yet
 
     def scan_ports(self, registered_ports, sync, updated_ports=None):
-        cur_ports = self.int_br.get_vif_port_set()
+        cur_ports = self._get_int_br_ports().get_vif_port_set()
         self.int_br_device_count = len(cur_ports)
         port_info = self._get_port_info(registered_ports, cur_ports, sync)
         if updated_ports is None:
@@ -1478,7 +1499,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         The returned value is a set of port ids of the ports concerned by a
         vlan tag loss.
         """
-        port_tags = self.int_br.get_port_tag_dict()
+        port_tags = self._get_int_br_ports().get_port_tag_dict()
         changed_ports = set()
         for lvm in self.vlan_manager:
             for port in lvm.vif_ports.values():
@@ -1608,20 +1629,57 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                     br.cleanup_tunnel_port(ofport)
                     self.tun_br_ofports[tunnel_type].pop(remote_ip, None)
 
-    def treat_devices_added_or_updated(self, devices, provisioning_needed):
+    def _get_devices_details(self, devices):
+        return self.plugin_rpc.get_devices_details_list_and_failed_devices(
+            self.context, devices, self.agent_id, self.conf.host)
+
+    def _get_devices_details_chunks(self, devices):
+        """Yield chunks of devices with their details.
+
+        The details of the next chunk are fetched from the server while the
+        current chunk is processed. A single empty chunk without details is
+        yielded if there are no devices. The generator must be closed if it
+        is not consumed entirely.
+        """
+        if not devices:
+            yield set(), None
+            return
+        devices = list(devices)
+        chunk_size = (self.conf.AGENT.port_processing_chunk_size or
+                      len(devices))
+        chunks = [set(devices[i:i + chunk_size])
+                  for i in range(0, len(devices), chunk_size)]
+        next_details = None
+        try:
+            for i, chunk in enumerate(chunks):
+                start = time.time()
+                if next_details is not None:
+                    devices_details_list = next_details.wait()
+                else:
+                    devices_details_list = self._get_devices_details(chunk)
+                self.port_stage_times['details'] += time.time() - start
+                next_details = None
+                if i + 1 < len(chunks):
+                    next_details = eventlet.spawn(self._get_devices_details,
+                                                  chunks[i + 1])
+                yield chunk, devices_details_list
+        finally:
+            if next_details is not None:
+                # the chunks were not all processed, do not leave the
+                # prefetch running
+                next_details.kill()
+
+    def treat_devices_added_or_updated(self, devices, provisioning_needed,
+                                       devices_details_list=None):
         skipped_devices = []
         need_binding_devices = []
         binding_no_activated_devices = set()
-        devices_details_list = (
-            self.plugin_rpc.get_devices_details_list_and_failed_devices(
-                self.context,
-                devices,
-                self.agent_id,
-                self.conf.host))
+        if devices_details_list is None:
+            devices_details_list = self._get_devices_details(devices)
         failed_devices = set(devices_details_list.get('failed_devices'))
 
         devices = devices_details_list.get('devices')
-        vif_by_id = self.int_br.get_vifs_by_ids(
+        vif_by_id = self._get_int_br_ports().get_vifs_by_ids(
             [vif['device'] for vif in devices])
         for details in devices:
             device = details['device']
@@ -1755,42 +1813,59 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         # to be performed anyway when the admin state of a device is changed.
         # A device might be both in the 'added' and 'updated'
         # list at the same time; avoid processing it twice.
-        devices_added_updated = (port_info.get('added', set()) |
-                                 port_info.get('updated', set()))
-        need_binding_devices = []
+        added_devices = port_info.get('added', set())
+        updated_devices = port_info.get('updated', set())
+        devices_added_updated = added_devices | updated_devices
         skipped_devices = set()
-        binding_no_activated_devices = set()
-        if devices_added_updated:
-            start = time.time()
-            (skipped_devices, binding_no_activated_devices,
-             need_binding_devices, failed_devices['added']) = (
-                self.treat_devices_added_or_updated(
-                    devices_added_updated, provisioning_needed))
-            LOG.debug("process_network_ports - iteration:%(iter_num)d - "
-                      "treat_devices_added_or_updated completed. "
-                      "Skipped %(num_skipped)d and no activated binding "
-                      "devices %(num_no_active_binding)d of %(num_current)d "
-                      "devices currently available. "
-                      "Time elapsed: %(elapsed).3f",
-                      {'iter_num': self.iter_num,
-                       'num_skipped': len(skipped_devices),
-                       'num_no_active_binding':
-                           len(binding_no_activated_devices),
-                       'num_current': len(port_info['current']),
-                       'elapsed': time.time() - start})
-            # Update the list of current ports storing only those which
-            # have been actually processed.
-            skipped_devices = set(skipped_devices)
-            port_info['current'] = (port_info['current'] - skipped_devices)
-
-        # TODO(salv-orlando): Optimize avoiding applying filters
-        # unnecessarily, (eg: when there are no IP address changes)
-        added_ports = (port_info.get('added', set()) - skipped_devices -
-                       binding_no_activated_devices)
-        self._add_port_tag_info(need_binding_devices)
-        self.sg_agent.setup_port_filters(added_ports,
-                                         port_info.get('updated', set()))
-        failed_devices['added'] |= self._bind_devices(need_binding_devices)
+        # NOTE: without added or updated devices, the filters must still be
+        # set up to refresh the firewall when needed
+        with contextlib.closing(self._get_devices_details_chunks(
+                devices_added_updated)) as chunks:
+            for devices, devices_details_list in chunks:
+                need_binding_devices = []
+                binding_no_activated_devices = set()
+                start = time.time()
+                if devices:
+                    (skipped, binding_no_activated_devices,
+                     need_binding_devices, failed) = (
+                        self.treat_devices_added_or_updated(
+                            devices, provisioning_needed,
+                            devices_details_list))
+                    failed_devices['added'] |= failed
+                    skipped_devices |= set(skipped)
+                    LOG.debug("process_network_ports - iteration:"
+                              "%(iter_num)d - treat_devices_added_or_updated "
+                              "completed. Skipped %(num_skipped)d and no "
+                              "activated binding devices "
+                              "%(num_no_active_binding)d of "
+                              "%(num_devices)d devices. "
+                              "Time elapsed: %(elapsed).3f",
+                              {'iter_num': self.iter_num,
+                               'num_skipped': len(skipped),
+                               'num_no_active_binding':
+                                   len(binding_no_activated_devices),
+                               'num_devices': len(devices),
+                               'elapsed': time.time() - start})
+                self.port_stage_times['wiring'] += time.time() - start
+
+                # TODO(salv-orlando): Optimize avoiding applying filters
+                # unnecessarily, (eg: when there are no IP address changes)
+                start = time.time()
+                added_ports = ((added_devices & devices) - skipped_devices -
+                               binding_no_activated_devices)
+                self._add_port_tag_info(need_binding_devices)
+                self.sg_agent.setup_port_filters(added_ports,
+                                                 updated_devices & devices)
+                self.port_stage_times['firewall'] += time.time() - start
+                start = time.time()
+                failed_devices['added'] |= self._bind_devices(
+                    need_binding_devices)
+                self.port_stage_times['binding'] += time.time() - start
+
+        # Update the list of current ports storing only those which
+        # have been actually processed.
+        if skipped_devices:
+            port_info['current'] = port_info['current'] - skipped_devices
 
         if 'removed' in port_info and port_info['removed']:
             start = time.time()
@@ -1948,6 +2023,11 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                 'added': len(port_info.get('added', [])),
                 'updated': len(port_info.get('updated', [])),
                 'removed': len(port_info.get('removed', []))}}
+        if self.port_stage_times:
+            port_stats['regular']['stage_times'] = {
+                stage: round(elapsed, 3)
+                for stage, elapsed in self.port_stage_times.items()}
+            self.port_stage_times.clear()
         if self.ancillary_brs:
             port_stats['ancillary'] = {
                 'added': len(ancillary_port_info.get('added', [])),
@@ -1963,6 +2043,29 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             LOG.info("Cleaning stale %s flows", bridge.br_name)
             bridge.cleanup_flows()
 
+    def _cleanup_stale_flows_in_background(self):
+        try:
+            self.cleanup_stale_flows()
+        except Exception:
+            LOG.exception("Error while cleaning stale flows")
+            return False
+        return True
+
+    def _start_stale_flows_cleanup(self):
+        # NOTE: the cleanup only deletes flows whose cookies are not
+        # reserved, so it does not need to block the ports processing. The
+        # native bridges clean up a table at a time between the rpc_loop
+        # iterations deferring flows.
+        self._stale_flows_cleanup = eventlet.spawn(
+            self._cleanup_stale_flows_in_background)
+
+    def _stale_flows_cleanup_failed(self):
+        cleanup = self._stale_flows_cleanup
+        if cleanup is None or not cleanup.dead:
+            return False
+        self._stale_flows_cleanup = None
+        return not cleanup.wait()
+
     def process_port_info(self, start, polling_manager, sync, ovs_restarted,
                        ports, ancillary_ports, updated_ports_copy,
                        consecutive_resyncs, ports_not_ready_yet,
@@ -2119,6 +2222,38 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
             polling_manager.stop()
             polling_manager.start()
 
+    def _get_deferred_flows_bridges(self):
+        if (self.conf.OVS.of_interface != 'native' or
+                not self.conf.OVS.of_bundle_deferred_flows):
+            return []
+        bridges = [self.int_br] + list(self.phys_brs.values())
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        return bridges
+
+    @contextlib.contextmanager
+    def _deferred_flows(self):
+        bridges = self._get_deferred_flows_bridges()
+        for bridge in bridges:
+            bridge.defer_flows_on()
+        try:
+            yield
+        finally:
+            errors = []
+            for bridge in bridges:
+                try:
+                    bridge.defer_flows_off()
+                except Exception as e:
+                    LOG.error("Failed to commit the deferred flows of bridge "
+                              "%s", bridge.br_name)
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+
+    def _apply_deferred_flows(self):
+        for bridge in self._get_deferred_flows_bridges():
+            bridge.apply_deferred_flows()
+
     def rpc_loop(self, polling_manager):
         idl_monitor = self.ovs.ovsdb.idl_monitor
         sync = False
@@ -2139,11 +2274,18 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                 LOG.info("rpc_loop doing a full sync.")
                 sync = True
                 self.fullsync = False
+                # pushed updates may have been lost while we were gone
+                self.plugin_rpc.remote_resource_cache.resync()
+            elif self.plugin_rpc.remote_resource_cache.needs_resync:
+                # reconcile the resources loaded from a cache snapshot
+                self.plugin_rpc.remote_resource_cache.resync()
             port_info = {}
             ancillary_port_info = {}
             start = time.time()
             LOG.debug("Agent rpc_loop - iteration:%d started",
                       self.iter_num)
+            if self._stale_flows_cleanup_failed():
+                need_clean_stale_flow = True
             ovs_status = self.check_ovs_status()
             if ovs_status == constants.OVS_RESTARTED:
                 self._handle_ovs_restart(polling_manager)
@@ -2167,6 +2309,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                     LOG.exception("Error while configuring tunnel endpoints")
                     tunnel_sync = True
             ovs_restarted |= (ovs_status == constants.OVS_RESTARTED)
+            self._int_br_ports_snapshot = self.int_br.get_ports_snapshot()
             devices_need_retry = (any(failed_devices.values()) or
                 any(failed_ancillary_devices.values()) or
                 ports_not_ready_yet)
@@ -2214,10 +2357,11 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                                   port_info)
                         provisioning_needed = (
                                 ovs_restarted or bridges_recreated)
-                        failed_devices = self.process_network_ports(
-                            port_info, provisioning_needed)
+                        with self._deferred_flows():
+                            failed_devices = self.process_network_ports(
+                                port_info, provisioning_needed)
                         if need_clean_stale_flow:
-                            self.cleanup_stale_flows()
+                            self._start_stale_flows_cleanup()
                             need_clean_stale_flow = False
                         LOG.debug("Agent rpc_loop - iteration:%(iter_num)d - "
                                   "ports processed. Elapsed:%(elapsed).3f",
@@ -2252,6 +2396,7 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
                     self.updated_ports |= updated_ports_copy
                     self.activated_bindings |= activated_bindings_copy
                     sync = True
+            self._int_br_ports_snapshot = None
             port_stats = self.get_port_stats(port_info, ancillary_port_info)
             self.loop_count_and_wait(start, port_stats)
 
@@ -2264,9 +2409,13 @@ class OVSNeutronAgent(l2population_rpc.L2populationRpcCallBackTunnelMixin,
         br_names = [br.br_name for br in self.phys_brs.values()]
 
         self.ovs.ovsdb.idl_monitor.start_bridge_monitor(br_names)
+        idl_monitor = None
+        if cfg.CONF.AGENT.ovsdb_monitor_interface == 'native':
+            idl_monitor = self.ovs.ovsdb.idl_monitor
         with polling.get_polling_manager(
                 self.minimize_polling,
-                self.ovsdb_monitor_respawn_interval) as pm:
+                self.ovsdb_monitor_respawn_interval,
+                idl_monitor=idl_monitor) as pm:
             self.rpc_loop(polling_manager=pm)
 
     def _handle_sigterm(self, signum, frame):
@@ -1752,7 +1752,14 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             # get all networks for PortContext construction
             netctxs_by_netid = self.get_network_contexts(
                 plugin_context,
-                {p.network_id for p in port_dbs_by_id.values()})
+                {p.network_id for p in port_dbs_by_id.values() if p})
+            # get the bindings of all distributed ports for host
+            dvr_bindings_by_id = db.get_distributed_port_bindings_by_host(
+                plugin_context,
+                [p.id for p in port_dbs_by_id.values()
+                 if p and
+                 p.device_owner == const.DEVICE_OWNER_DVR_INTERFACE],
+                host)
             for dev_id in dev_ids:
                 port_id = dev_to_full_pids.get(dev_id)
                 port_db = port_dbs_by_id.get(port_id)
@@ -1762,8 +1769,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                     continue
                 port = self._make_port_dict(port_db)
                 if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
-                    binding = db.get_distributed_port_binding_by_host(
-                        plugin_context, port['id'], host)
+                    binding = dvr_bindings_by_id.get(port['id'])
                     bindlevelhost_match = host
                 else:
                     binding = p_utils.get_port_binding_by_status_and_host(
@@ -163,54 +163,77 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
         LOG.debug("Returning: %s", entry)
         return entry
 
-    def get_devices_details_list(self, rpc_context, **kwargs):
-        # cached networks used for reducing number of network db calls
-        cached_networks = {}
-        return [
-            self.get_device_details(
-                rpc_context,
-                device=device,
-                cached_networks=cached_networks,
-                **kwargs
-            )
-            for device in kwargs.pop('devices', [])
-        ]
-
-    def get_devices_details_list_and_failed_devices(self,
-                                                    rpc_context,
-                                                    **kwargs):
-        devices = []
-        failed_devices = []
-        devices_to_fetch = kwargs.pop('devices', [])
+    def _get_devices_details(self, rpc_context, devices, agent_id, host,
+                             failed_devices=None):
+        """Return the details of devices and the new status of their ports.
+
+        The ports, bindings, binding levels, segments and networks of all
+        devices are fetched in bulk, so the number of database queries does
+        not depend on the number of devices. If failed_devices is a list,
+        the devices whose details cannot be computed are appended to it
+        instead of raising. As in get_device_details, the status of a port
+        is only updated when its full details were returned.
+        """
         plugin = directory.get_plugin()
-        host = kwargs.get('host')
         bound_contexts = plugin.get_bound_ports_contexts(rpc_context,
-                                                         devices_to_fetch,
+                                                         devices,
                                                          host)
-        for device in devices_to_fetch:
-            if not bound_contexts.get(device):
+        details = []
+        new_status_map = {}
+        for device in devices:
+            port_context = bound_contexts.get(device)
+            if not port_context:
                 # unbound bound
                 LOG.debug("Device %(device)s requested by agent "
                           "%(agent_id)s not found in database",
-                          {'device': device,
-                           'agent_id': kwargs.get('agent_id')})
-                devices.append({'device': device})
+                          {'device': device, 'agent_id': agent_id})
+                details.append({'device': device})
                 continue
             try:
-                devices.append(self._get_device_details(
-                               rpc_context,
-                               agent_id=kwargs.get('agent_id'),
-                               host=host,
-                               device=device,
-                               port_context=bound_contexts[device]))
+                result = self._get_device_details(rpc_context,
+                                                  agent_id=agent_id,
+                                                  host=host,
+                                                  device=device,
+                                                  port_context=port_context)
             except Exception:
+                if failed_devices is None:
+                    raise
                 LOG.exception("Failed to get details for device %s",
                               device)
                 failed_devices.append(device)
-        new_status_map = {ctxt.current['id']: self._get_new_status(host, ctxt)
-                          for ctxt in bound_contexts.values() if ctxt}
-        # filter out any without status changes
-        new_status_map = {p: s for p, s in new_status_map.items() if s}
+                continue
+            details.append(result)
+            if 'network_id' in result:
+                # success so we update status
+                new_status = self._get_new_status(host, port_context)
+                if new_status:
+                    new_status_map[port_context.current['id']] = new_status
+        return details, new_status_map
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        devices_to_fetch = kwargs.pop('devices', [])
+        if not devices_to_fetch:
+            return []
+        host = kwargs.get('host')
+        devices, new_status_map = self._get_devices_details(
+            rpc_context, devices_to_fetch, kwargs.get('agent_id'), host)
+        if new_status_map:
+            plugin = directory.get_plugin()
+            plugin.update_port_statuses(rpc_context, new_status_map, host)
+        return devices
+
+    def get_devices_details_list_and_failed_devices(self,
+                                                    rpc_context,
+                                                    **kwargs):
+        failed_devices = []
+        devices_to_fetch = kwargs.pop('devices', [])
+        if not devices_to_fetch:
+            return {'devices': [], 'failed_devices': []}
+        plugin = directory.get_plugin()
+        host = kwargs.get('host')
+        devices, new_status_map = self._get_devices_details(
+            rpc_context, devices_to_fetch, kwargs.get('agent_id'), host,
+            failed_devices=failed_devices)
         try:
             plugin.update_port_statuses(rpc_context, new_status_map, host)
         except Exception:
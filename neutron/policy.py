@@ -14,9 +14,12 @@
 #    under the License.
 
 import collections
+import contextlib
+import functools
 import itertools
 import re
 import sys
+import threading
 
 from neutron_lib.api import attributes
 from neutron_lib.api.definitions import network as net_apidef
@@ -40,6 +43,12 @@ from neutron.common import constants as const
 LOG = logging.getLogger(__name__)
 
 _ENFORCER = None
+# Compiled match rules, keyed by the names of the rules to match and the
+# roles of the credentials they are evaluated for
+_COMPILED_RULES = {}
+_COMPILED_RULES_MAX_SIZE = 1000
+# The resource cache of the request whose policies are being enforced
+_REQUEST_STATE = threading.local()
 ADMIN_CTX_POLICY = 'context_is_admin'
 ADVSVC_CTX_POLICY = 'context_is_advsvc'
 
@@ -51,6 +60,7 @@ _RESOURCE_FOREIGN_KEYS = {
 
 def reset():
     global _ENFORCER
+    _COMPILED_RULES.clear()
     if _ENFORCER:
         _ENFORCER.clear()
         _ENFORCER = None
@@ -102,9 +112,55 @@ def set_rules(policies, overwrite=True):
 
     LOG.debug("Loading policies from file: %s", _ENFORCER.policy_path)
     init()
+    _COMPILED_RULES.clear()
     _ENFORCER.set_rules(policies, overwrite)
 
 
+class RequestResourceCache(object):
+    """Cache of the resources read to enforce the policies of a request.
+
+    Resources are fetched once per request, whatever the number of targets
+    referencing them. The numbers of lookups served from and missing the
+    cache are counted in hits and misses.
+    """
+
+    def __init__(self):
+        self._resources = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fetch):
+        """Return the resource cached for key, calling fetch on a miss."""
+        try:
+            resource = self._resources[key]
+        except KeyError:
+            self.misses += 1
+            resource = self._resources[key] = fetch()
+        else:
+            self.hits += 1
+        return resource
+
+
+def get_request_resource_cache(context):
+    """Return the resource cache bound to the context of a request."""
+    resource_cache = getattr(context, '_policy_resource_cache', None)
+    if resource_cache is None:
+        resource_cache = RequestResourceCache()
+        setattr(context, '_policy_resource_cache', resource_cache)
+    return resource_cache
+
+
+@contextlib.contextmanager
+def _request_resource_cache(context):
+    """Make the resource cache of context used by the policy checks."""
+    previous = getattr(_REQUEST_STATE, 'resource_cache', None)
+    _REQUEST_STATE.resource_cache = get_request_resource_cache(context)
+    try:
+        yield
+    finally:
+        _REQUEST_STATE.resource_cache = previous
+
+
 def _is_attribute_explicitly_set(attribute_name, resource, target, action):
     """Verify that an attribute is present and is explicitly set."""
     if target.get(const.ATTRIBUTES_TO_UPDATE):
@@ -306,8 +362,16 @@ class OwnerCheck(policy.Check):
                     policy="%s:%s" % (self.kind, self.match),
                     reason=err_reason)
 
-            target[self.target_field] = self._extract(
-                parent_res, target[parent_foreign_key], parent_field)
+            parent_id = target[parent_foreign_key]
+            resource_cache = getattr(_REQUEST_STATE, 'resource_cache', None)
+            if resource_cache is None:
+                value = self._extract(parent_res, parent_id, parent_field)
+            else:
+                value = resource_cache.get(
+                    ('_extract', parent_res, parent_id, parent_field),
+                    functools.partial(self._extract, parent_res, parent_id,
+                                      parent_field))
+            target[self.target_field] = value
 
         match = self.match % target
         if self.kind in creds:
@@ -365,6 +429,133 @@ def log_rule_list(match_rule):
         LOG.debug("Enforcing rules: %s", rules)
 
 
+def _get_rule(rules, name):
+    try:
+        return rules[name]
+    except KeyError:
+        return None
+
+
+def _compile_check(check, roles, rules, resolved, stack=()):
+    """Compile a policy check for the given roles.
+
+    Rules referenced by name are inlined and role checks are evaluated, so
+    only the checks depending on the target are left. The names of the
+    rules inlined are stored with the rule they were resolved to in
+    resolved.
+
+    :return: a boolean if the result of the check does not depend on the
+             target, or else a function taking the target and credentials
+             and returning the result of the check.
+    """
+    if isinstance(check, policy.RuleCheck) and check.match not in stack:
+        rule = _get_rule(rules, check.match)
+        resolved[check.match] = rule
+        if rule is None:
+            # We don't have any matching rule; fail closed
+            return False
+        return _compile_check(rule, roles, rules, resolved,
+                              stack + (check.match,))
+    if isinstance(check, (policy.AndCheck, policy.OrCheck)):
+        is_and = isinstance(check, policy.AndCheck)
+        funcs = []
+        for rule in check.rules:
+            compiled = _compile_check(rule, roles, rules, resolved, stack)
+            if compiled is (not is_and):
+                return compiled
+            if compiled is not is_and:
+                funcs.append(compiled)
+        if not funcs:
+            return is_and
+        if len(funcs) == 1:
+            return funcs[0]
+        if is_and:
+            return lambda target, creds: all(f(target, creds) for f in funcs)
+        return lambda target, creds: any(f(target, creds) for f in funcs)
+    if isinstance(check, policy.NotCheck):
+        compiled = _compile_check(check.rule, roles, rules, resolved, stack)
+        if isinstance(compiled, bool):
+            return not compiled
+        return lambda target, creds: not compiled(target, creds)
+    if isinstance(check, policy.Check):
+        if check.kind == 'role' and '%(' not in check.match:
+            return check.match.lower() in roles
+    elif str(check) in ('@', '!'):
+        # TrueCheck and FalseCheck
+        return str(check) == '@'
+    return lambda target, creds: bool(check(target, creds, _ENFORCER))
+
+
+def _get_compiled_rule(match_rule, credentials):
+    """Return the compiled match rule for the given credentials.
+
+    Compiled rules are cached and reused for as long as the rules they
+    were built from are not changed.
+    """
+    roles = frozenset(role.lower() for role in credentials.get('roles', []))
+    key = (tuple(_process_rules_list([], match_rule)), roles)
+    rules = _ENFORCER.rules
+    cached = _COMPILED_RULES.get(key)
+    if cached is not None:
+        compiled, resolved = cached
+        if all(_get_rule(rules, name) is rule
+               for name, rule in resolved.items()):
+            return compiled
+    resolved = {}
+    compiled = _compile_check(match_rule, roles, rules, resolved)
+    if len(_COMPILED_RULES) >= _COMPILED_RULES_MAX_SIZE:
+        _COMPILED_RULES.clear()
+    _COMPILED_RULES[key] = (compiled, resolved)
+    return compiled
+
+
+def check_list(context, action, targets, might_not_exist=False,
+               pluralized=None):
+    """Verifies that the action is valid on each target in this context.
+
+    This is equivalent to calling check for each target, but the policy
+    rules are loaded and compiled only once for all the targets.
+
+    :param context: neutron context
+    :param action: string representing the action to be checked
+        this should be colon separated for clarity.
+    :param targets: list of dictionaries representing the objects of the
+        action.
+    :param might_not_exist: If True the policy check is skipped (and the
+        function returns True for every target) if the specified policy
+        does not exist. Defaults to false.
+    :param pluralized: pluralized case of resource
+        e.g. firewall_policy -> pluralized = "firewall_policies"
+
+    :return: Returns a list with, for each target, True if access is
+        permitted else False.
+    """
+    if context.is_admin:
+        return [True] * len(targets)
+    _ENFORCER.load_rules()
+    if might_not_exist and not (_ENFORCER.rules and action in _ENFORCER.rules):
+        return [True] * len(targets)
+    credentials = context.to_policy_values()
+    enforce_attr_based_check = get_resource_and_action(
+        action, pluralized)[1]
+    compiled = None
+    results = []
+    with _request_resource_cache(context):
+        for target in targets:
+            if target is None:
+                target = {}
+            if compiled is None or enforce_attr_based_check:
+                # the match rule for attribute based checks depends on the
+                # attributes set in each target
+                match_rule = _build_match_rule(action, target, pluralized)
+                compiled = _get_compiled_rule(match_rule, credentials)
+            if isinstance(compiled, bool):
+                results.append(compiled)
+            else:
+                results.append(compiled(target, credentials))
+    return results
+
+
 def check(context, action, target, plugin=None, might_not_exist=False,
           pluralized=None):
     """Verifies that the action is valid on the target in this context.
@@ -395,10 +586,11 @@ def check(context, action, target, plugin=None, might_not_exist=False,
                                                      action,
                                                      target,
                                                      pluralized)
-    result = _ENFORCER.enforce(match_rule,
-                               target,
-                               credentials,
-                               pluralized=pluralized)
+    with _request_resource_cache(context):
+        result = _ENFORCER.enforce(match_rule,
+                                   target,
+                                   credentials,
+                                   pluralized=pluralized)
     return result
 
 
@@ -428,8 +620,9 @@ def enforce(context, action, target, plugin=None, pluralized=None):
                                                target,
                                                pluralized)
     try:
-        result = _ENFORCER.enforce(rule, target, credentials, action=action,
-                                   do_raise=True)
+        with _request_resource_cache(context):
+            result = _ENFORCER.enforce(rule, target, credentials,
+                                       action=action, do_raise=True)
     except policy.PolicyNotAuthorized:
         with excutils.save_and_reraise_exception():
             log_rule_list(rule)
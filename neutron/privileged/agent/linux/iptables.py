@@ -0,0 +1,112 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import re
+import subprocess
+
+from neutron_lib import constants
+from pyroute2 import netns
+import six
+
+from neutron._i18n import _
+from neutron import privileged
+
+
+RESTORE_COMMANDS = {constants.IP_VERSION_4: 'iptables-restore',
+                    constants.IP_VERSION_6: 'ip6tables-restore'}
+
+# xlock wait interval, in microseconds
+XLOCK_WAIT_INTERVAL = 200000
+
+# the name of a file in /var/run/netns
+NAMESPACE_RE = re.compile(r'^[A-Za-z0-9_.-]{1,255}$')
+
+
+def get_restore_args(ip_version, noflush=False, wait_seconds=None):
+    """Return the arguments of an iptables-restore command.
+
+    :param ip_version: 4 for iptables-restore, 6 for ip6tables-restore.
+    :param noflush: do not flush the previous contents of the tables.
+    :param wait_seconds: wait for the xtables lock for up to this number of
+                         seconds, None to not wait.
+    """
+    if ip_version not in RESTORE_COMMANDS:
+        raise ValueError(_("Invalid IP version %s") % ip_version)
+    args = [RESTORE_COMMANDS[ip_version]]
+    if noflush:
+        args.append('-n')
+    if wait_seconds is not None:
+        wait_seconds = int(wait_seconds)
+        if wait_seconds < 1:
+            raise ValueError(_("Invalid xtables lock wait time %s") %
+                             wait_seconds)
+        args += ['-w', str(wait_seconds), '-W', str(XLOCK_WAIT_INTERVAL)]
+    return args
+
+
+def _validate_namespace(namespace):
+    if not namespace:
+        # the namespace of the privsep daemon
+        return
+    if (not isinstance(namespace, six.string_types) or
+            not NAMESPACE_RE.match(namespace) or
+            namespace in ('.', '..')):
+        raise ValueError(_("Invalid namespace name %r") % namespace)
+
+
+def _run_restore(args, process_input):
+    process = subprocess.Popen(args, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate(process_input.encode('utf-8'))
+    return (process.returncode, stdout.decode('utf-8', 'replace'),
+            stderr.decode('utf-8', 'replace'))
+
+
+@privileged.default.entrypoint
+def restore_iptables(restores):
+    """Run a list of iptables-restore commands, each in its namespace.
+
+    The calling thread switches to the namespace of each command instead of
+    running it through "ip netns exec", and goes back to its own namespace
+    afterwards. The arguments of the commands are built here, see
+    get_restore_args().
+
+    :param restores: a list of (namespace, ip_version, noflush,
+                     wait_seconds, process_input) tuples. The namespace can
+                     be None.
+    :return: a list of (returncode, stdout, stderr) tuples, one per command.
+    """
+    commands = []
+    for namespace, ip_version, noflush, wait_seconds, process_input in (
+            restores):
+        _validate_namespace(namespace)
+        commands.append((namespace,
+                         get_restore_args(ip_version, noflush, wait_seconds),
+                         process_input))
+
+    results = []
+    own_netns = os.open('/proc/thread-self/ns/net', os.O_RDONLY)
+    try:
+        for namespace, args, process_input in commands:
+            try:
+                if namespace:
+                    netns.setns(namespace, flags=0)
+                results.append(_run_restore(args, process_input))
+            except OSError as e:
+                results.append((1, '', str(e)))
+            finally:
+                if namespace:
+                    netns.setns(own_netns)
+    finally:
+        os.close(own_netns)
+    return results
@@ -33,6 +33,7 @@ from neutron.tests.common import helpers
 from neutron.tests.functional.pecan_wsgi import test_functional
 from neutron.tests.functional.pecan_wsgi import utils as pecan_utils
 from neutron.tests.unit import dummy_plugin
+from neutron import wsgi
 
 
 _SERVICE_PLUGIN_RESOURCE = 'serviceplugin'
@@ -331,6 +332,17 @@ class TestResourceController(TestRootController):
         response = self.app.get('/v2.0/ports.json')
         self.assertEqual(response.status_int, 200)
 
+    def test_get_collection_is_streamed(self):
+        with mock.patch.object(wsgi, 'iter_encode_body',
+                               wraps=wsgi.iter_encode_body) as iter_body:
+            response = self.app.get('/v2.0/ports.json',
+                                    headers={'X-Project-Id': 'tenid'})
+        self.assertEqual(200, response.status_int)
+        streamed = iter_body.call_args[0][0]
+        self.assertEqual(response.json, streamed)
+        self.assertEqual([self.port['id']],
+                         [port['id'] for port in streamed['ports']])
+
     def _check_item(self, expected, item):
         for attribute in expected:
             self.assertIn(attribute, item)
@@ -285,6 +285,38 @@ class TestPolicyEnforcementHook(test_functional.PecanFunctionalTest):
         json_response = jsonutils.loads(response.body)
         self.assertNotIn('restricted_attr', json_response['mehs'][0])
 
+    def test_after_on_list_hides_items_not_authorized(self):
+        self.mock_plugin.get_mehs.return_value = [
+            {'id': 'xxx', 'attr': 'meh', 'restricted_attr': '',
+             'tenant_id': 'tenid'},
+            {'id': 'yyy', 'attr': 'meh', 'restricted_attr': '',
+             'tenant_id': 'tenid'}]
+        response = self.app.get('/v2.0/mehs',
+                                headers={'X-Project-Id': 'tenid'})
+        self.assertEqual(200, response.status_int)
+        json_response = jsonutils.loads(response.body)
+        self.assertEqual(['xxx'],
+                         [meh['id'] for meh in json_response['mehs']])
+
+    def test_after_on_list_excludes_attribute_per_item(self):
+        policy._ENFORCER.set_rules(
+            oslo_policy.Rules.from_dict(
+                {'get_meh:attr': 'field:mehs:tenant_id=tenid'}),
+            overwrite=False)
+        self.mock_plugin.get_mehs.return_value = [
+            {'id': 'xxx', 'attr': 'meh', 'restricted_attr': '',
+             'tenant_id': 'tenid'},
+            {'id': 'xxx', 'attr': 'meh', 'restricted_attr': '',
+             'tenant_id': 'other'}]
+        response = self.app.get('/v2.0/mehs',
+                                headers={'X-Project-Id': 'tenid'})
+        self.assertEqual(200, response.status_int)
+        json_response = jsonutils.loads(response.body)
+        self.assertIn('attr', json_response['mehs'][0])
+        self.assertNotIn('attr', json_response['mehs'][1])
+        for meh in json_response['mehs']:
+            self.assertNotIn('restricted_attr', meh)
+
     def test_after_inits_policy(self):
         self.mock_plugin.get_mehs.return_value = [{
             'id': 'xxx',
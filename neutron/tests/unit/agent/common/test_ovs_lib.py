@@ -578,6 +578,80 @@ class OVS_Lib_Test(base.BaseTestCase):
             set_ctrl_field_mock.assert_called_once_with(
                 'controller_burst_limit', ovs_lib.CTRL_BURST_LIMIT_MIN)
 
+    @staticmethod
+    def _fake_row(name, **columns):
+        row = mock.MagicMock(**columns)
+        row.name = name
+        return row
+
+    def _fake_bridge_rows(self):
+        ifaces = [
+            self._fake_row('tap1', ofport=[5], external_ids={
+                'iface-id': 'port1', 'attached-mac': 'ca:fe:de:ad:be:ef'}),
+            self._fake_row('tap2', ofport=[], external_ids={
+                'iface-id': 'port2', 'attached-mac': 'ca:fe:de:ad:be:ee'}),
+            self._fake_row('patch-tun', ofport=[1], external_ids={}),
+        ]
+        ports = [self._fake_row(iface.name, tag=[1] if i < 2 else [],
+                                interfaces=[iface])
+                 for i, iface in enumerate(ifaces)]
+        ports.append(self._fake_row(self.BR_NAME, tag=[], interfaces=[]))
+        br = self._fake_row(self.BR_NAME, ports=ports)
+        other_br = self._fake_row('br-ex', ports=[])
+        self.br.ovsdb.idl.tables = {
+            'Bridge': mock.Mock(rows={1: other_br, 2: br})}
+
+    def test_ports_snapshot(self):
+        self._fake_bridge_rows()
+        snapshot = self.br.get_ports_snapshot()
+        self.assertEqual({'port1'}, snapshot.get_vif_port_set())
+        self.assertEqual({'port1': 5, 'patch-tun': 1},
+                         snapshot.get_vif_port_to_ofport_map())
+        self.assertEqual({'tap1': 1, 'tap2': 1, 'patch-tun': []},
+                         snapshot.get_port_tag_dict())
+        vifs = snapshot.get_vifs_by_ids(['port1', 'port2', 'port3'])
+        self.assertEqual(('tap1', 5, 'ca:fe:de:ad:be:ef', self.br),
+                         (vifs['port1'].port_name, vifs['port1'].ofport,
+                          vifs['port1'].vif_mac, vifs['port1'].switch))
+        self.assertIsNone(vifs['port2'])
+        self.assertIsNone(vifs['port3'])
+
+    def test_ports_snapshot_read_once(self):
+        self._fake_bridge_rows()
+        snapshot = self.br.get_ports_snapshot()
+        self.assertEqual({'port1'}, snapshot.get_vif_port_set())
+        self.br.ovsdb.idl.tables = {}
+        self.assertEqual({'port1'}, snapshot.get_vif_port_set())
+        self.assertIn('tap1', snapshot.get_vifs_by_ids(['port1'])['port1']
+                      .port_name)
+
+    def test_ports_snapshot_no_bridge(self):
+        self.br.ovsdb.idl.tables = {'Bridge': mock.Mock(rows={})}
+        snapshot = self.br.get_ports_snapshot()
+        self.assertEqual(set(), snapshot.get_vif_port_set())
+        self.assertEqual({}, snapshot.get_port_tag_dict())
+
+    def test_generate_random_cookie_generation_of(self):
+        cookie = ovs_lib.generate_random_cookie(generation_of=0xabcd << 48)
+        self.assertEqual(0xabcd << 48, cookie & ovs_lib.COOKIE_GENERATION_MASK)
+
+    def test_get_stale_cookie_masks(self):
+        cookies = [0xabcd << 48 | 1, 0xabcd << 48 | 2, 0x1234 << 48 | 3]
+        masks = ovs_lib.get_stale_cookie_masks(cookies)
+        self.assertLessEqual(len(masks), 2 * ovs_lib.COOKIE_GENERATION_BITS)
+
+        def _is_stale(cookie):
+            return any(cookie & m == c for c, m in masks)
+
+        for cookie in cookies + [0xabcd << 48 | 0xffff, 0x1234 << 48]:
+            self.assertFalse(_is_stale(cookie))
+        for cookie in [0, 0xabcc << 48 | 1, 0x1235 << 48,
+                       ovs_lib.UINT64_BITMASK]:
+            self.assertTrue(_is_stale(cookie))
+
+    def test_get_stale_cookie_masks_no_cookie(self):
+        self.assertEqual([(0, 0)], ovs_lib.get_stale_cookie_masks([]))
+
 
 class TestDeferredOVSBridge(base.BaseTestCase):
 
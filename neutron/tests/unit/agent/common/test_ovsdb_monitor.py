@@ -85,3 +85,83 @@ class TestSimpleInterfaceMonitor(base.BaseTestCase):
             self.monitor.process_events()
             self.assertEqual(self.monitor.new_events['added'][0]['ofport'],
                              ovs_lib.UNASSIGNED_OFPORT)
+
+
+class TestSimpleInterfaceIdlMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSimpleInterfaceIdlMonitor, self).setUp()
+        self.idl_monitor = mock.Mock()
+        self.idl_monitor.tables = {'Interface': mock.Mock(
+            rows={}, columns={'name': None, 'ofport': None,
+                              'external_ids': None})}
+        self.monitor = ovsdb_monitor.SimpleInterfaceIdlMonitor(
+            self.idl_monitor)
+        self.event = ovsdb_monitor.InterfaceEvent(self.monitor)
+
+    @staticmethod
+    def _make_row(name, ofport=None, external_ids=None):
+        row = mock.Mock(ofport=[ofport] if ofport else [],
+                        external_ids=external_ids or {})
+        row.name = name
+        row._table.name = 'Interface'
+        return row
+
+    def test_start_reports_existing_interfaces(self):
+        self.idl_monitor.tables['Interface'].rows = {
+            'uuid': self._make_row('tap1', 5, {'iface-id': 'port1'})}
+        self.monitor.start(block=True)
+        self.assertTrue(self.monitor.is_active())
+        self.idl_monitor.notify_handler.watch_event.assert_called_once_with(
+            self.monitor._event)
+        self.assertEqual(
+            {'added': [{'name': 'tap1', 'ofport': 5,
+                        'external_ids': {'iface-id': 'port1'}}],
+             'removed': []},
+            self.monitor.get_events())
+
+    def test_start_without_interface_columns(self):
+        del self.idl_monitor.tables['Interface'].columns['ofport']
+        self.assertRaises(ovsdb_monitor.InterfaceTableNotMonitored,
+                          self.monitor.start)
+        self.assertFalse(self.monitor.is_active())
+        self.idl_monitor.notify_handler.watch_event.assert_not_called()
+
+    def test_start_without_interface_table(self):
+        self.idl_monitor.tables = {}
+        self.assertRaises(ovsdb_monitor.InterfaceTableNotMonitored,
+                          self.monitor.start)
+
+    def test_stop(self):
+        self.monitor.start()
+        self.monitor.stop()
+        self.assertFalse(self.monitor.is_active())
+        self.idl_monitor.notify_handler.unwatch_event.assert_called_once_with(
+            self.monitor._event)
+
+    def test_events(self):
+        self.monitor.start()
+        self.assertFalse(self.monitor.has_updates)
+        self.event.run(self.event.ROW_CREATE, self._make_row('tap1'), None)
+        self.event.run(self.event.ROW_DELETE, self._make_row('tap2', 6), None)
+        self.event.run(self.event.ROW_UPDATE, self._make_row('tap1', 7), None)
+        self.assertTrue(self.monitor.has_updates)
+        self.assertEqual(
+            {'added': [{'name': 'tap1', 'ofport': 7, 'external_ids': {}}],
+             'removed': [{'name': 'tap2', 'ofport': 6, 'external_ids': {}}]},
+            self.monitor.get_events())
+        self.assertFalse(self.monitor.has_updates)
+
+    def test_unassigned_ofport(self):
+        self.monitor.start()
+        self.event.run(self.event.ROW_CREATE, self._make_row('tap1'), None)
+        self.assertEqual(ovs_lib.UNASSIGNED_OFPORT,
+                         self.monitor.get_events()['added'][0]['ofport'])
+
+    def test_event_matches_ofport_updates_only(self):
+        row = self._make_row('tap1', 5)
+        self.assertTrue(self.event.matches(self.event.ROW_CREATE, row))
+        self.assertTrue(self.event.matches(
+            self.event.ROW_UPDATE, row, mock.Mock(spec=['ofport'])))
+        self.assertFalse(self.event.matches(
+            self.event.ROW_UPDATE, row, mock.Mock(spec=['external_ids'])))
@@ -15,6 +15,7 @@
 import mock
 
 from neutron.agent.common import base_polling
+from neutron.agent.common import ovsdb_monitor
 from neutron.agent.common import polling
 from neutron.agent.ovsdb.native import helpers
 from neutron.tests import base
@@ -109,6 +110,21 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
             self.pm.stop()
         mock_stop.assert_called_with()
 
+    def test_idl_monitor(self):
+        pm = polling.InterfacePollingMinimizer(idl_monitor=mock.Mock())
+        self.assertIsInstance(pm._monitor,
+                              ovsdb_monitor.SimpleInterfaceIdlMonitor)
+
+    def test_idl_monitor_without_interface_table(self):
+        pm = polling.InterfacePollingMinimizer(
+            idl_monitor=mock.Mock(tables={}))
+        with mock.patch.object(ovsdb_monitor.SimpleInterfaceMonitor,
+                               'start') as mock_start:
+            pm.start()
+        self.assertIsInstance(pm._monitor,
+                              ovsdb_monitor.SimpleInterfaceMonitor)
+        mock_start.assert_called_once_with(block=True)
+
     def mock_has_updates(self, return_value):
         target = ('neutron.agent.common.ovsdb_monitor.SimpleInterfaceMonitor'
                   '.has_updates')
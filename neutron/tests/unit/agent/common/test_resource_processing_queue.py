@@ -110,3 +110,16 @@ class TestExclusiveResourceProcessor(base.BaseTestCase):
         self.assertFalse(update.hit_retry_limit())
         rpqueue.add(update)
         self.assertTrue(update.hit_retry_limit())
+
+    def test_pending_updates(self):
+        rpqueue = queue.ResourceProcessingQueue()
+        updates = [queue.ResourceUpdate(FAKE_ID, PRIORITY_RPC),
+                   queue.ResourceUpdate(FAKE_ID_2, PRIORITY_RPC)]
+        for update in updates:
+            rpqueue.add(update)
+        pending_updates = rpqueue.pending_updates()
+        self.assertEqual(sorted(updates), sorted(pending_updates))
+        # the snapshot is not affected by further changes to the queue
+        list(rpqueue.each_update_to_next_resource())
+        self.assertEqual(2, len(pending_updates))
+        self.assertEqual(1, len(rpqueue.pending_updates()))
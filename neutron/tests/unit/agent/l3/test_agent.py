@@ -14,6 +14,7 @@
 #    under the License.
 
 import copy
+import datetime
 from itertools import chain as iter_chain
 from itertools import combinations as iter_combinations
 
@@ -2478,6 +2479,7 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
             agent._process_router_if_compatible.side_effect = (
                 oslo_messaging.MessagingTimeout)
         agent._queue = mock.Mock()
+        agent._queue.pending_updates.return_value = []
         agent._resync_router = mock.Mock()
         update = mock.Mock()
         update.id = router_id
@@ -2520,6 +2522,70 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
         agent._process_router_update()
         self.assertTrue(agent.plugin_rpc.get_routers.called)
 
+    def _queue_router_updates(self, agent, router_ids, **kwargs):
+        for router_id in router_ids:
+            agent._queue.add(resource_processing_queue.ResourceUpdate(
+                router_id, l3_agent.PRIORITY_RPC, **kwargs))
+
+    def test_process_routers_update_fetches_pending_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._process_router_if_compatible = mock.Mock()
+        router_ids = sorted(_uuid() for _i in range(3))
+        routers = [{'id': router_id} for router_id in router_ids]
+        self._queue_router_updates(agent, router_ids)
+        # routers of updates which are not fetched are not batched
+        self._queue_router_updates(agent, [_uuid()],
+                                   action=l3_agent.DELETE_ROUTER)
+        self.plugin_api.get_routers.return_value = routers
+
+        for _i in router_ids:
+            agent._process_router_update()
+
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, mock.ANY)
+        self.assertEqual(
+            set(router_ids),
+            set(self.plugin_api.get_routers.call_args[0][1]))
+        agent._process_router_if_compatible.assert_has_calls(
+            [mock.call(router) for router in routers], any_order=True)
+        self.assertEqual(3, agent._process_router_if_compatible.call_count)
+        self.assertFalse(agent._prefetched_routers)
+
+    def test_process_routers_update_fetched_related_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._process_router_if_compatible = mock.Mock()
+        router_ids = [_uuid(), _uuid()]
+        related_router_id = _uuid()
+        self._queue_router_updates(agent, router_ids)
+        self.plugin_api.get_routers.return_value = [
+            {'id': router_id}
+            for router_id in router_ids + [related_router_id]]
+        agent._process_router_update()
+        agent._process_router_if_compatible.assert_called_once_with(
+            {'id': router_ids[0]})
+        self.assertEqual([{'id': router_ids[1]}],
+                         agent._prefetched_routers[router_ids[1]][1])
+        related_updates = [update for update in agent._queue.pending_updates()
+                           if update.id == related_router_id]
+        self.assertEqual(1, len(related_updates))
+        self.assertEqual(l3_agent.ADD_UPDATE_RELATED_ROUTER,
+                         related_updates[0].action)
+
+    def test_process_routers_update_prefetched_routers_too_old(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._process_router_if_compatible = mock.Mock()
+        router_ids = [_uuid(), _uuid()]
+        self._queue_router_updates(agent, router_ids)
+        self.plugin_api.get_routers.return_value = [
+            {'id': router_id} for router_id in router_ids]
+        agent._process_router_update()
+        # the router was updated again after it was fetched
+        agent._prefetched_routers[router_ids[1]] = (
+            timeutils.utcnow() - datetime.timedelta(seconds=1),
+            [{'id': router_ids[1]}])
+        agent._process_router_update()
+        self.assertEqual(2, self.plugin_api.get_routers.call_count)
+
     def test_process_routers_update_rpc_timeout_on_get_ext_net(self):
         self._test_process_routers_update_rpc_timeout(ext_net_call=True,
                                                       ext_net_call_failed=True)
@@ -25,6 +25,7 @@ from neutron.agent.linux.openvswitch_firewall import constants as ovsfw_consts
 from neutron.agent.linux.openvswitch_firewall import exceptions
 from neutron.agent.linux.openvswitch_firewall import firewall as ovsfw
 from neutron.common import constants as n_const
+from neutron.conf.agent import securitygroups_rpc as security_config
 from neutron.plugins.ml2.drivers.openvswitch.agent.common import constants \
         as ovs_consts
 from neutron.plugins.ml2.drivers.openvswitch.agent.openflow.ovs_ofctl \
@@ -297,6 +298,7 @@ class TestConjIdMap(base.BaseTestCase):
 class TestConjIPFlowManager(base.BaseTestCase):
     def setUp(self):
         super(TestConjIPFlowManager, self).setUp()
+        security_config.register_securitygroups_opts()
         self.driver = mock.Mock()
         self.manager = ovsfw.ConjIPFlowManager(self.driver)
         self.vlan_tag = 100
@@ -329,23 +331,130 @@ class TestConjIPFlowManager(base.BaseTestCase):
                        reg_net=self.vlan_tag, table=82)])
 
     def test_sg_removed(self):
+        remote_group = self.driver.sg_port_map.get_sg.return_value
+        remote_group.get_ethertype_filtered_addresses.return_value = [
+            '10.22.3.4']
         with mock.patch.object(self.manager.conj_id_map,
                                'get_conj_id') as get_id_mock, \
-             mock.patch.object(self.manager.conj_id_map,
-                               'delete_sg') as delete_sg_mock:
+                mock.patch.object(self.manager.conj_id_map,
+                                  'delete_sg') as delete_sg_mock:
             get_id_mock.return_value = self.conj_id
             delete_sg_mock.return_value = [('remote_id', self.conj_id)]
             self.manager.add(self.vlan_tag, 'sg', 'remote_id',
                              constants.INGRESS_DIRECTION, constants.IPv4, 0)
-            self.manager.flow_state[self.vlan_tag][(
-                constants.INGRESS_DIRECTION, constants.IPv4)] = {
-                    '10.22.3.4': [self.conj_id]}
+            self.manager.update_flows_for_vlan(self.vlan_tag)
+            self.assertEqual({'10.22.3.4': [self.conj_id]},
+                             self.manager.flow_state[self.vlan_tag][(
+                                 constants.INGRESS_DIRECTION,
+                                 constants.IPv4)])
+            self.driver._add_flow.reset_mock()
+            self.driver.delete_flows_for_ip_addresses.reset_mock()
 
             self.manager.sg_removed('sg')
         self.driver._add_flow.assert_not_called()
         self.driver.delete_flows_for_ip_addresses.assert_called_once_with(
             {'10.22.3.4'}, constants.INGRESS_DIRECTION, constants.IPv4,
             self.vlan_tag)
+        self.assertEqual({}, self.manager.flow_state[self.vlan_tag][(
+            constants.INGRESS_DIRECTION, constants.IPv4)])
+
+    def _get_added_addresses(self):
+        return set(c[1]['nw_src']
+                   for c in self.driver._add_flow.call_args_list)
+
+    def test_update_flows_for_vlan_incremental(self):
+        # 5000 members and 2 remote groups sharing part of them
+        members = ['10.%d.%d.%d' % (i >> 16, (i >> 8) & 0xff, i & 0xff)
+                   for i in range(5000)]
+        groups = {'remote_1': mock.Mock(), 'remote_2': mock.Mock()}
+        groups['remote_1'].get_ethertype_filtered_addresses.return_value = (
+            members)
+        groups['remote_2'].get_ethertype_filtered_addresses.return_value = (
+            members[:10])
+        self.driver.sg_port_map.get_sg.side_effect = groups.get
+        self.manager.add(self.vlan_tag, 'sg', 'remote_1',
+                         constants.INGRESS_DIRECTION, constants.IPv4, 0)
+        self.manager.add(self.vlan_tag, 'sg', 'remote_2',
+                         constants.INGRESS_DIRECTION, constants.IPv4, 0)
+        self.manager.update_flows_for_vlan(self.vlan_tag)
+        self.assertEqual(set(m + '/32' for m in members),
+                         self._get_added_addresses())
+
+        self.driver._add_flow.reset_mock()
+        self.manager.update_flows_for_vlan(self.vlan_tag)
+        self.driver._add_flow.assert_not_called()
+
+        # a member joins remote_1 and another one leaves it
+        groups['remote_1'].get_ethertype_filtered_addresses.return_value = (
+            members[1:] + ['10.1.0.0'])
+        self.manager.update_flows_for_vlan(self.vlan_tag)
+        self.assertEqual(set(['10.1.0.0/32', '10.0.0.0/32']),
+                         self._get_added_addresses())
+        self.driver.delete_flows_for_ip_addresses.assert_not_called()
+
+        # the member leaving remote_2 is no longer in any group
+        self.driver._add_flow.reset_mock()
+        groups['remote_2'].get_ethertype_filtered_addresses.return_value = (
+            members[1:10])
+        self.manager.update_flows_for_vlan(self.vlan_tag)
+        self.driver._add_flow.assert_not_called()
+        self.driver.delete_flows_for_ip_addresses.assert_called_once_with(
+            {'10.0.0.0'}, constants.INGRESS_DIRECTION, constants.IPv4,
+            self.vlan_tag)
+
+    def test_update_flows_for_vlan_aggregated(self):
+        self.manager.aggregate_addresses = True
+        groups = {'remote_1': mock.Mock(), 'remote_2': mock.Mock()}
+        groups['remote_1'].get_ethertype_filtered_addresses.return_value = [
+            '10.0.0.%d' % i for i in range(8)]
+        groups['remote_2'].get_ethertype_filtered_addresses.return_value = [
+            '10.0.0.7', '10.0.1.1']
+        self.driver.sg_port_map.get_sg.side_effect = groups.get
+        self.manager.add(self.vlan_tag, 'sg', 'remote_1',
+                         constants.INGRESS_DIRECTION, constants.IPv4, 0)
+        self.manager.add(self.vlan_tag, 'sg', 'remote_2',
+                         constants.INGRESS_DIRECTION, constants.IPv4, 0)
+        self.manager.update_flows_for_vlan(self.vlan_tag)
+        self.assertEqual(
+            set(['10.0.0.0/30', '10.0.0.4/31', '10.0.0.6/32', '10.0.0.7/32',
+                 '10.0.1.1/32']),
+            self._get_added_addresses())
+
+        self.driver._add_flow.reset_mock()
+        groups['remote_2'].get_ethertype_filtered_addresses.return_value = [
+            '10.0.1.1']
+        self.manager.update_flows_for_vlan(self.vlan_tag)
+        self.assertEqual(set(['10.0.0.0/29']), self._get_added_addresses())
+        self.driver.delete_flows_for_ip_addresses.assert_called_once_with(
+            {'10.0.0.4/31', '10.0.0.6/32', '10.0.0.0/30', '10.0.0.7/32'},
+            constants.INGRESS_DIRECTION, constants.IPv4, self.vlan_tag)
+        self.assertEqual(
+            set(['10.0.0.0/29', '10.0.1.1/32']),
+            set(self.manager.flow_state[self.vlan_tag][(
+                constants.INGRESS_DIRECTION, constants.IPv4)]))
+
+
+class TestAddressAggregator(base.BaseTestCase):
+    def test_update(self):
+        aggregator = ovsfw.AddressAggregator()
+        addrs = ['10.0.0.%d' % i for i in range(4)]
+        self.assertEqual(
+            (set(['10.0.0.0/31', '10.0.0.2/32', '10.0.0.3/32']),
+             {'10.0.0.0/31': [1], '10.0.0.2/32': [1, 2],
+              '10.0.0.3/32': [1]}),
+            aggregator.update(addrs, {'10.0.0.0': [1], '10.0.0.1': [1],
+                                      '10.0.0.2': [1, 2], '10.0.0.3': [1]}))
+        self.assertEqual(
+            (set(['10.0.0.0/31', '10.0.0.2/32', '10.0.0.3/32',
+                  '10.0.0.0/30']),
+             {'10.0.0.0/30': [1]}),
+            aggregator.update(['10.0.0.2'], {'10.0.0.2': [1]}))
+        self.assertEqual(
+            (set(['10.0.0.0/30', '10.0.0.0/31', '10.0.0.3/32']),
+             {'10.0.0.0/31': [1], '10.0.0.3/32': [1]}),
+            aggregator.update(['10.0.0.2'], {}))
+        self.assertEqual({(1,): set(['10.0.0.0', '10.0.0.1', '10.0.0.3'])},
+                         aggregator.conj_id_addrs)
 
 
 class FakeOVSPort(object):
@@ -358,6 +467,7 @@ class FakeOVSPort(object):
 class TestOVSFirewallDriver(base.BaseTestCase):
     def setUp(self):
         super(TestOVSFirewallDriver, self).setUp()
+        security_config.register_securitygroups_opts()
         mock_bridge = mock.patch.object(
             ovs_lib, 'OVSBridge', autospec=True).start()
         self.firewall = ovsfw.OVSFirewallDriver(mock_bridge)
@@ -744,6 +854,7 @@ class TestOVSFirewallDriver(base.BaseTestCase):
 class TestCookieContext(base.BaseTestCase):
     def setUp(self):
         super(TestCookieContext, self).setUp()
+        security_config.register_securitygroups_opts()
         # Don't attempt to connect to ovsdb
         mock.patch('neutron.agent.ovsdb.impl_idl.api_factory').start()
         # Don't trigger iptables -> ovsfw migration
@@ -12,6 +12,7 @@
 #    limitations under the License.
 
 import mock
+import netaddr
 
 from neutron.agent.linux import ipset_manager
 from neutron.tests import base
@@ -163,3 +164,31 @@ class IpsetManagerTestCase(BaseIpsetManagerTest):
         self.expect_destroy()
         self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
         self.verify_mock_calls()
+
+    def test_set_members_aggregated(self):
+        self.ipset.aggregate_members = True
+        self.expect_set(['10.0.0.1', '10.0.0.2/31', '10.0.0.4/31',
+                         '10.0.0.6'])
+        self.assertEqual((FAKE_IPS, []), self._set_members(FAKE_IPS))
+        self.expect_set(['10.0.0.0/29'])
+        all_ips = ['10.0.0.0'] + FAKE_IPS + ['10.0.0.7']
+        self.assertEqual((['10.0.0.0', '10.0.0.7'], []),
+                         self._set_members(all_ips))
+        self.expect_add(['10.0.0.0/30', '10.0.0.4/31', '10.0.0.6'])
+        self.expect_del(['10.0.0.0/29'])
+        self.assertEqual(([], ['10.0.0.7']),
+                         self._set_members(all_ips[:-1]))
+        self.verify_mock_calls()
+
+    def test_set_members_aggregated_all_zero_ipv4(self):
+        self.ipset.aggregate_members = True
+        self.expect_set(['0.0.0.0/0'])
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE,
+                               ['0.0.0.0/1', '128.0.0.0/1'])
+        self.verify_mock_calls()
+
+    def _set_members(self, member_ips):
+        add_ips, del_ips = self.ipset.set_members(TEST_SET_ID, ETHERTYPE,
+                                                  member_ips)
+        return ([str(netaddr.IPNetwork(ip).ip) for ip in sorted(add_ips)],
+                [str(netaddr.IPNetwork(ip).ip) for ip in sorted(del_ips)])
@@ -16,6 +16,7 @@
 import os
 import sys
 
+import eventlet
 import fixtures
 import mock
 from neutron_lib import exceptions
@@ -1177,6 +1178,152 @@ class IptablesManagerStateFulTestCase(IptablesManagerBaseTestCase):
 
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
+    def _get_restore_inputs(self):
+        return [c[1]['process_input'] for c in self.execute.call_args_list
+                if c[0][0][0] == 'iptables-restore']
+
+    def _count_saves(self):
+        return len([c for c in self.execute.call_args_list
+                    if c[0][0][0] == 'iptables-save'])
+
+    def test_apply_owned_chains_without_save(self):
+        cfg.CONF.set_override('iptables_save_interval', 60, 'AGENT')
+        self.execute.return_value = ''
+        self.iptables.apply()
+        self.assertEqual(1, self._count_saves())
+
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].remove_rule('filter', '-j DROP')
+        self.iptables.apply()
+        # nothing changed
+        self.iptables.apply()
+
+        self.assertEqual(1, self._count_saves())
+        self.assertEqual(6 if self.use_ipv6 else 3,
+                         self.iptables.saves_avoided)
+        restore_inputs = self._get_restore_inputs()
+        self.assertEqual(3, len(restore_inputs))
+        self.assertEqual('# Generated by iptables_manager\n'
+                         '*filter\n'
+                         ':%(bn)s-filter - [0:0]\n'
+                         '-I %(bn)s-filter 1 -j DROP\n'
+                         'COMMIT\n'
+                         '# Completed by iptables_manager\n' % IPTABLES_ARG,
+                         restore_inputs[1])
+        self.assertEqual('# Generated by iptables_manager\n'
+                         '*filter\n'
+                         '-D %(bn)s-filter 1\n'
+                         'COMMIT\n'
+                         '# Completed by iptables_manager\n' % IPTABLES_ARG,
+                         restore_inputs[2])
+
+    def test_apply_unowned_chains_with_save(self):
+        cfg.CONF.set_override('iptables_save_interval', 60, 'AGENT')
+        self.execute.return_value = ''
+        self.iptables.ipv4['filter'].add_chain('shared', wrap=False)
+        self.iptables.apply()
+
+        removed_chains = []
+
+        def modify_rules(current_lines, table, table_name):
+            removed_chains.append(set(table.remove_chains))
+            return orig_modify_rules(current_lines, table, table_name)
+        orig_modify_rules = self.iptables._modify_rules
+        self.iptables._modify_rules = modify_rules
+        self.iptables.ipv4['filter'].remove_chain('shared', wrap=False)
+        self.iptables.apply()
+
+        self.assertEqual(2, self._count_saves())
+        self.assertEqual(1 if self.use_ipv6 else 0,
+                         self.iptables.saves_avoided)
+        # the pending removal survived the attempt without iptables-save
+        self.assertEqual([{'shared'}, {'shared'}],
+                         [c for c in removed_chains if c])
+
+    def test_apply_save_interval_elapsed(self):
+        cfg.CONF.set_override('iptables_save_interval', 60, 'AGENT')
+        self.execute.return_value = ''
+        with mock.patch.object(iptables_manager.time, 'time',
+                               return_value=1000):
+            self.iptables.apply()
+            self.iptables.apply()
+        self.assertEqual(1, self._count_saves())
+        with mock.patch.object(iptables_manager.time, 'time',
+                               return_value=1060):
+            self.iptables.apply()
+        self.assertEqual(2, self._count_saves())
+
+    def test_apply_save_after_restore_failure(self):
+        cfg.CONF.set_override('iptables_save_interval', 60, 'AGENT')
+
+        def execute(args, **kwargs):
+            if args[0] == 'iptables-restore' and self.fail_restore:
+                raise RuntimeError()
+            return ''
+        self.fail_restore = False
+        self.execute.side_effect = execute
+        self.iptables.apply()
+
+        self.fail_restore = True
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.assertEqual(1, self._count_saves())
+
+        self.fail_restore = False
+        self.iptables.apply()
+        self.assertEqual(2, self._count_saves())
+
+    def test_apply_batched_restore(self):
+        cfg.CONF.set_override('iptables_restore_batch_interval', 0.01,
+                              'AGENT')
+        self.addCleanup(setattr, iptables_manager, '_restore_batcher', None)
+        self.execute.return_value = ''
+        self.iptables.namespace = 'ns1'
+        with mock.patch.object(iptables_manager.priv_iptables,
+                               'restore_iptables') as restore:
+            restore.side_effect = lambda restores: [(0, '', '')] * len(
+                restores)
+            self.iptables.apply()
+
+        restores = [r for c in restore.call_args_list for r in c[0][0]]
+        self.assertEqual(2 if self.use_ipv6 else 1, len(restores))
+        self.assertEqual(('ns1', 4, True, None), restores[0][:4])
+        self.assertIn('*filter', restores[0][4])
+        if self.use_ipv6:
+            self.assertEqual(('ns1', 6, True, None), restores[1][:4])
+        self.assertNotIn(['ip', 'netns', 'exec', 'ns1', 'iptables-restore',
+                          '-n'],
+                         [c[0][0] for c in self.execute.call_args_list])
+
+    def test_apply_batched_restore_with_table_lock(self):
+        cfg.CONF.set_override('iptables_restore_batch_interval', 0.01,
+                              'AGENT')
+        self.addCleanup(setattr, iptables_manager, '_restore_batcher', None)
+        iptables_manager.IptablesManager.use_table_lock = True
+        self.execute.return_value = ''
+        self.iptables.namespace = 'ns1'
+        with mock.patch.object(iptables_manager.priv_iptables,
+                               'restore_iptables') as restore:
+            restore.side_effect = lambda restores: [(0, '', '')] * len(
+                restores)
+            self.iptables.apply()
+
+        restores = [r for c in restore.call_args_list for r in c[0][0]]
+        self.assertEqual(2 if self.use_ipv6 else 1, len(restores))
+        for _namespace, _ip_version, noflush, wait_seconds, _input in (
+                restores):
+            self.assertTrue(noflush)
+            self.assertEqual('10', wait_seconds)
+
+    def test_apply_save_interval_disabled(self):
+        self.execute.return_value = ''
+        self.iptables.apply()
+        self.iptables.apply()
+        self.assertEqual(2, self._count_saves())
+        self.assertEqual(0, self.iptables.saves_avoided)
+
 
 class IptablesManagerStateFulTestCaseIPv6(IptablesManagerStateFulTestCase):
     use_ipv6 = True
@@ -1316,6 +1463,52 @@ class IptablesManagerStateFulTestCaseEmptyCustomBinaryNameIPv6(
     use_ipv6 = True
 
 
+class IptablesRestoreBatcherTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesRestoreBatcherTestCase, self).setUp()
+        self.restore = mock.patch.object(
+            iptables_manager.priv_iptables, 'restore_iptables').start()
+        self.batcher = iptables_manager.IptablesRestoreBatcher(0.01)
+
+    def test_restore_batched(self):
+        self.restore.side_effect = lambda restores: [(0, '', '')] * len(
+            restores)
+        pool = eventlet.GreenPool()
+        results = [pool.spawn(self.batcher.restore, 'ns%d' % i, 4,
+                              ['rule', ''], noflush=True)
+                   for i in range(10)]
+
+        self.assertEqual([None] * 10, [r.wait() for r in results])
+        restores = [r for c in self.restore.call_args_list for r in c[0][0]]
+        self.assertEqual(
+            [('ns%d' % i, 4, True, None, 'rule\n') for i in range(10)],
+            restores)
+        self.restore.assert_called_once_with(mock.ANY)
+
+    def test_restore_with_wait(self):
+        self.restore.side_effect = lambda restores: [(0, '', '')] * len(
+            restores)
+        self.assertIsNone(self.batcher.restore(
+            'ns1', 6, ['rule'], noflush=True, wait_seconds='10'))
+        self.restore.assert_called_once_with(
+            [('ns1', 6, True, '10', 'rule')])
+
+    def test_restore_failure(self):
+        self.restore.return_value = [
+            (iptables_manager.XTABLES_RESOURCE_PROBLEM_CODE, '', 'locked')]
+        err = self.batcher.restore('ns1', 4, ['rule'])
+        self.assertIsInstance(err, exceptions.ProcessExecutionError)
+        self.assertEqual(iptables_manager.XTABLES_RESOURCE_PROBLEM_CODE,
+                         err.returncode)
+        self.assertIn('locked', str(err))
+
+    def test_restore_privsep_failure(self):
+        self.restore.side_effect = RuntimeError
+        err = self.batcher.restore('ns1', 4, ['rule'])
+        self.assertIsInstance(err, RuntimeError)
+
+
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def setUp(self):
@@ -12,17 +12,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 import mock
+import netaddr
 from neutron_lib.callbacks import events
 from neutron_lib.callbacks import registry
 from neutron_lib import context
+from oslo_utils import timeutils
 
 from neutron.agent import resource_cache
 from neutron.api.rpc.callbacks import events as events_rpc
+from neutron.objects import ports
 from neutron.tests import base
 
 
 class OVOLikeThing(object):
+    VERSION = '1.0'
+
     def __init__(self, id, revision_number=10, **kwargs):
         self.id = id
         self.fields = ['id', 'revision_number']
@@ -34,8 +41,19 @@ class OVOLikeThing(object):
     def to_dict(self):
         return {f: getattr(self, f) for f in self.fields}
 
-    def get(self, k):
-        return getattr(self, k, None)
+    def get(self, k, default=None):
+        return getattr(self, k, default)
+
+    def obj_attr_is_set(self, k):
+        return hasattr(self, k)
+
+    def obj_to_primitive(self):
+        return {'versioned_object.version': self.VERSION,
+                'versioned_object.data': self.to_dict()}
+
+    @classmethod
+    def clean_obj_from_primitive(cls, primitive):
+        return cls(**primitive['versioned_object.data'])
 
 
 class RemoteResourceCacheTestCase(base.BaseTestCase):
@@ -110,6 +128,54 @@ class RemoteResourceCacheTestCase(base.BaseTestCase):
         self.assertItemsEqual([geese[3]],
                               self.rcache.get_resources('goose', is_small))
 
+    def test_get_resources_indexed(self):
+        rcache = resource_cache.RemoteResourceCache(
+            ['goose'], indexed_fields={'goose': ('size', 'flocks')})
+        mock.patch.object(rcache, '_puller').start()
+        geese = [OVOLikeThing(3, size='large', flocks=['a', 'b']),
+                 OVOLikeThing(5, size='medium', flocks=['b']),
+                 OVOLikeThing(4, size='large', flocks=[]),
+                 OVOLikeThing(6, size='small', flocks=['c'])]
+        for goose in geese:
+            rcache.record_resource_update(self.ctx, 'goose', goose)
+        with mock.patch.object(rcache, 'match_resources_with_func') as m:
+            self.assertItemsEqual(
+                [geese[0], geese[2]],
+                rcache.get_resources('goose', {'size': ('large', )}))
+            self.assertItemsEqual(
+                [geese[0], geese[1]],
+                rcache.get_resources('goose', {'flocks': ('b', )}))
+            self.assertItemsEqual(
+                [geese[0], geese[1], geese[3]],
+                rcache.get_resources('goose', {'flocks': ('b', 'c')}))
+            self.assertItemsEqual(
+                [geese[1]],
+                rcache.get_resources('goose', {'flocks': ('b', ),
+                                               'size': ('medium', )}))
+            self.assertEqual(
+                [], rcache.get_resources('goose', {'size': ('tiny', )}))
+            self.assertFalse(m.called)
+
+    def test_get_resources_indexed_update_and_delete(self):
+        rcache = resource_cache.RemoteResourceCache(
+            ['goose'], indexed_fields={'goose': ('size', )})
+        mock.patch.object(rcache, '_puller').start()
+        rcache.record_resource_update(self.ctx, 'goose',
+                                      OVOLikeThing(3, size='large'))
+        rcache.record_resource_update(self.ctx, 'goose',
+                                      OVOLikeThing(3, size='small',
+                                                   revision_number=11))
+        self.assertEqual(
+            [], rcache.get_resources('goose', {'size': ('large', )}))
+        self.assertEqual(
+            [3], [g.id for g in
+                  rcache.get_resources('goose', {'size': ('small', )})])
+        rcache.record_resource_delete(self.ctx, 'goose', 3)
+        self.assertEqual(
+            [], rcache.get_resources('goose', {'size': ('small', )}))
+        # empty index buckets are removed
+        self.assertEqual({}, rcache._indexes_by_type['goose']['size'])
+
     def test_match_resources_with_func(self):
         geese = [OVOLikeThing(3, size='large'), OVOLikeThing(5, size='medium'),
                  OVOLikeThing(4, size='xlarge'), OVOLikeThing(6, size='small')]
@@ -155,6 +221,51 @@ class RemoteResourceCacheTestCase(base.BaseTestCase):
         self.assertEqual('small', received_kw[1]['updated'].size)
         self.assertEqual(set(['size']), received_kw[1]['changed_fields'])
 
+    def _make_port(self, **kwargs):
+        port_id = 'ca9e3f8e-4b53-4a8f-9a52-fe5e0d8e5c7b'
+        net_id = '5b2f6c2e-21b0-4d39-8b8a-0d6d8a2f6b4c'
+        attrs = dict(
+            id=port_id, network_id=net_id,
+            mac_address=netaddr.EUI('fa:16:3e:ec:c7:d9'),
+            admin_state_up=True, revision_number=1,
+            security_group_ids={'4e2f8f4c-6b5d-4c4d-9a36-2c7d8e1b5c8e'},
+            allowed_address_pairs=[], device_owner='compute:nova',
+            fixed_ips=[ports.IPAllocation(
+                port_id=port_id, network_id=net_id,
+                subnet_id='0ee1d6e9-8d6b-4a1d-8a5a-7c5b6c3c5e4a',
+                ip_address=netaddr.IPAddress('10.0.0.5'))],
+            bindings=[ports.PortBinding(port_id=port_id, host='host1',
+                                        status='ACTIVE',
+                                        profile={'a': 'b'})])
+        attrs.update(kwargs)
+        port = ports.Port(**attrs)
+        port.obj_reset_changes()
+        return port
+
+    def test__get_changed_fields_ovo(self):
+        old = self._make_port()
+        self.assertEqual(
+            set(), self.rcache._get_changed_fields(
+                old, self._make_port(revision_number=2)))
+        new = self._make_port(revision_number=2)
+        new.bindings[0].profile = {'a': 'c'}
+        new.fixed_ips[0].ip_address = netaddr.IPAddress('10.0.0.6')
+        with mock.patch.object(ports.Port, 'to_dict') as to_dict:
+            self.assertEqual({'bindings', 'fixed_ips'},
+                             self.rcache._get_changed_fields(old, new))
+            self.assertFalse(to_dict.called)
+        self.assertEqual(
+            {'security_group_ids'},
+            self.rcache._get_changed_fields(
+                old, self._make_port(security_group_ids=set())))
+        self.assertEqual(
+            {'fixed_ips'},
+            self.rcache._get_changed_fields(old,
+                                            self._make_port(fixed_ips=[])))
+        self.assertEqual(
+            set(old.to_dict()) - {'revision_number', 'updated_at'},
+            self.rcache._get_changed_fields(None, old))
+
     def test_record_resource_delete(self):
         received_kw = []
         receiver = lambda *a, **k: received_kw.append(k)
@@ -182,6 +293,209 @@ class RemoteResourceCacheTestCase(base.BaseTestCase):
         self.rcache.record_resource_delete(self.ctx, 'goose', 3)
         self.assertEqual(2, len(received_kw))
 
+    def test_record_resource_delete_discards_id_query(self):
+        self._pullmock.bulk_pull.return_value = []
+        self.assertIsNone(self.rcache.get_resource_by_id('goose', 3))
+        self.assertIn(('goose', ('id', (3, ))),
+                      self.rcache._satisfied_server_queries)
+        self.rcache.record_resource_delete(self.ctx, 'goose', 3)
+        self.assertNotIn(('goose', ('id', (3, ))),
+                         self.rcache._satisfied_server_queries)
+
+    def test_deleted_ids_expire(self):
+        rcache = resource_cache.RemoteResourceCache(
+            ['goose'], deleted_ids_ttl=10, deleted_ids_max_size=2)
+        with mock.patch.object(resource_cache.time, 'time',
+                               return_value=100):
+            rcache.record_resource_delete(self.ctx, 'goose', 1)
+            rcache.record_resource_delete(self.ctx, 'goose', 2)
+            self.assertTrue(rcache._is_stale('goose', OVOLikeThing(1)))
+            # exceeding max_size evicts the oldest ID
+            rcache.record_resource_delete(self.ctx, 'goose', 3)
+            self.assertFalse(rcache._is_stale('goose', OVOLikeThing(1)))
+            self.assertTrue(rcache._is_stale('goose', OVOLikeThing(2)))
+        with mock.patch.object(resource_cache.time, 'time',
+                               return_value=111):
+            self.assertFalse(rcache._is_stale('goose', OVOLikeThing(3)))
+        self.assertEqual(3, rcache._deleted_ids_by_type['goose'].evicted)
+        self.assertEqual(0, len(rcache._deleted_ids_by_type['goose']))
+
+    def test_resync(self):
+        t0 = datetime.datetime(2019, 1, 1, 10)
+        self._pullmock.bulk_pull.return_value = []
+        self.rcache.get_resources('goose', {'size': ('large', 'small')})
+        self.rcache.get_resources('goose', {'size': ('large', ),
+                                            'color': ('white', )})
+        self.rcache.get_resource_by_id('duck', 9)
+        for goose in (OVOLikeThing(3, size='large', color='white',
+                                   updated_at=t0),
+                      OVOLikeThing(4, size='small', color='grey',
+                                   updated_at=t0 - datetime.timedelta(1))):
+            self.rcache.record_resource_update(self.ctx, 'goose', goose)
+        updated = OVOLikeThing(4, size='small', color='white',
+                               revision_number=11,
+                               updated_at=t0 + datetime.timedelta(1))
+        self._pullmock.bulk_pull_changes.return_value = ([updated], [3])
+
+        self.rcache.resync()
+
+        changed_since = '2019-01-01T09:59:00'
+        self._pullmock.bulk_pull_changes.assert_has_calls([
+            mock.call(mock.ANY, 'goose', changed_since,
+                      filter_kwargs={'size': ('large', ),
+                                     'color': ('white', )},
+                      known_ids=[3]),
+            mock.call(mock.ANY, 'goose', changed_since,
+                      filter_kwargs={'size': mock.ANY},
+                      known_ids=mock.ANY),
+        ], any_order=True)
+        self.assertEqual(2, self._pullmock.bulk_pull_changes.call_count)
+        self.assertIsNone(self.rcache.get_resource_by_id('goose', 3))
+        self.assertEqual('white',
+                         self.rcache.get_resource_by_id('goose', 4).color)
+        # no duck was ever received, the query is asked again on demand
+        self._pullmock.bulk_pull.reset_mock()
+        self.rcache.get_resource_by_id('duck', 9)
+        self._pullmock.bulk_pull.assert_called_once_with(
+            mock.ANY, 'duck', filter_kwargs={'id': (9, )})
+
+    def test_resync_resource_leaving_query(self):
+        t0 = datetime.datetime(2019, 1, 1, 10)
+        self._pullmock.bulk_pull.return_value = []
+        self.rcache.get_resources('goose', {'size': ('large', )})
+        self.rcache.record_resource_update(
+            self.ctx, 'goose',
+            OVOLikeThing(3, size='large', updated_at=t0))
+        updated = OVOLikeThing(3, size='small', revision_number=11,
+                               updated_at=t0 + datetime.timedelta(1))
+        self._pullmock.bulk_pull_changes.return_value = ([updated], [])
+
+        self.rcache.resync()
+
+        self._pullmock.bulk_pull.reset_mock()
+        self.assertEqual(
+            [], self.rcache.get_resources('goose', {'size': ('large', )}))
+        self.assertFalse(self._pullmock.bulk_pull.called)
+        self.assertEqual('small',
+                         self.rcache.get_resource_by_id('goose', 3).size)
+
+    def test_resync_resources_never_updated(self):
+        # e.g. security group rules, their updated_at is never set
+        t0 = datetime.datetime(2019, 1, 1, 10)
+        self._pullmock.bulk_pull.return_value = []
+        self.rcache.get_resources('goose', {'size': ('large', )})
+        for goose_id, created_at in ((3, t0),
+                                     (4, t0 - datetime.timedelta(1))):
+            self.rcache.record_resource_update(
+                self.ctx, 'goose',
+                OVOLikeThing(goose_id, size='large', updated_at=None,
+                             created_at=created_at))
+        self._pullmock.bulk_pull_changes.return_value = ([], [])
+
+        self.rcache.resync()
+
+        self._pullmock.bulk_pull_changes.assert_called_once_with(
+            mock.ANY, 'goose', '2019-01-01T09:59:00',
+            filter_kwargs={'size': ('large', )}, known_ids=mock.ANY)
+        # the query is still satisfied
+        self._pullmock.bulk_pull.reset_mock()
+        self.assertEqual(
+            2, len(self.rcache.get_resources('goose', {'size': ('large', )})))
+        self.assertFalse(self._pullmock.bulk_pull.called)
+
+    def test_resync_failure_forgets_queries(self):
+        self._pullmock.bulk_pull.return_value = []
+        self.rcache.get_resources('goose', {'size': ('large', )})
+        self.rcache.record_resource_update(
+            self.ctx, 'goose',
+            OVOLikeThing(3, size='large',
+                         updated_at=datetime.datetime(2019, 1, 1)))
+        self._pullmock.bulk_pull_changes.side_effect = RuntimeError
+        self.rcache.resync()
+        self._pullmock.bulk_pull.reset_mock()
+        self.rcache.get_resources('goose', {'size': ('large', )})
+        self.assertTrue(self._pullmock.bulk_pull.called)
+
+    def test_snapshot(self):
+        path = self.get_temp_file_path('snapshot')
+        t0 = datetime.datetime(2019, 1, 1, 10)
+        self._pullmock.bulk_pull.return_value = []
+        self.rcache.get_resources('goose', {'size': ('large', )})
+        self.rcache.get_resource_by_id('duck', 2)
+        self.rcache.record_resource_update(
+            self.ctx, 'goose', OVOLikeThing(3, size='large', created_at=t0))
+        self.rcache.record_resource_update(
+            self.ctx, 'duck', OVOLikeThing(2, size='small', created_at=t0))
+        self.rcache.save_snapshot(path)
+
+        class DatedOVOLikeThing(OVOLikeThing):
+            @classmethod
+            def clean_obj_from_primitive(cls, primitive):
+                obj = OVOLikeThing.clean_obj_from_primitive(primitive)
+                obj.created_at = timeutils.parse_strtime(obj.created_at)
+                return obj
+
+        rcache = resource_cache.RemoteResourceCache(
+            ['duck', 'goose'], indexed_fields={'goose': ('size', )})
+        puller = mock.patch.object(rcache, '_puller').start()
+        with mock.patch.object(resource_cache.rpc_resources,
+                               'get_resource_cls',
+                               return_value=DatedOVOLikeThing):
+            rcache.load_snapshot(path)
+        # the server is not asked until the cache is resynced
+        self.assertFalse(puller.method_calls)
+        self.assertTrue(rcache.needs_resync)
+
+        def bulk_pull_changes(context, rtype, changed_since, **kwargs):
+            if rtype == 'duck':
+                raise RuntimeError()
+            return [], []
+
+        puller.bulk_pull_changes.side_effect = bulk_pull_changes
+        self.assertEqual(['duck'], rcache.resync())
+        self.assertFalse(rcache.needs_resync)
+        # the duck failed to resync so it is dropped
+        puller.bulk_pull.return_value = []
+        self.assertIsNone(rcache.get_resource_by_id('duck', 2))
+        self.assertTrue(puller.bulk_pull.called)
+        puller.bulk_pull.reset_mock()
+        geese = rcache.get_resources('goose', {'size': ('large', )})
+        self.assertFalse(puller.bulk_pull.called)
+        self.assertEqual([3], [g.id for g in geese])
+
+    def test_snapshot_without_update_times(self):
+        path = self.get_temp_file_path('snapshot')
+        self.rcache.record_resource_update(
+            self.ctx, 'goose', OVOLikeThing(3, size='large'))
+        self.rcache.save_snapshot(path)
+        rcache = resource_cache.RemoteResourceCache(['duck', 'goose'])
+        mock.patch.object(rcache, '_puller').start()
+        with mock.patch.object(resource_cache.rpc_resources,
+                               'get_resource_cls',
+                               return_value=OVOLikeThing):
+            rcache.load_snapshot(path)
+        self.assertEqual([3], list(rcache._type_cache('goose')))
+        self.assertEqual([], rcache.resync())
+        # nothing to resync them from
+        self.assertEqual({}, rcache._type_cache('goose'))
+
+    def test_load_snapshot_version_mismatch(self):
+        path = self.get_temp_file_path('snapshot')
+        self.rcache.record_resource_update(
+            self.ctx, 'goose', OVOLikeThing(3, size='large'))
+        self.rcache.save_snapshot(path)
+        rcache = resource_cache.RemoteResourceCache(['duck', 'goose'])
+        newer = mock.Mock(VERSION='1.1')
+        with mock.patch.object(resource_cache.rpc_resources,
+                               'get_resource_cls', return_value=newer):
+            rcache.load_snapshot(path)
+        self.assertFalse(newer.clean_obj_from_primitive.called)
+        self.assertEqual({}, rcache._type_cache('goose'))
+
+    def test_load_snapshot_missing(self):
+        self.rcache.load_snapshot('/nonexistent/snapshot')
+        self.assertEqual({}, self.rcache._type_cache('goose'))
+
     def test_resource_change_handler(self):
         with mock.patch.object(resource_cache.RemoteResourceWatcher,
                                '_init_rpc_listeners'):
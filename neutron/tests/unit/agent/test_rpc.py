@@ -22,6 +22,7 @@ from neutron_lib.callbacks import events
 from neutron_lib.callbacks import resources
 from neutron_lib import constants
 from neutron_lib import rpc as n_rpc
+from oslo_config import cfg
 from oslo_context import context as oslo_context
 from oslo_utils import uuidutils
 
@@ -202,6 +203,31 @@ class TestCacheBackedPluginApi(base.BaseTestCase):
                                                    level=0,
                                                    segment=self._segment)])
 
+    def test_cache_snapshots(self):
+        cfg.CONF.set_override('resource_cache_snapshot_interval', 30,
+                              group='AGENT')
+        with mock.patch.object(rpc, 'create_cache_for_l2_agent') as cache, \
+                mock.patch.object(rpc.loopingcall,
+                                  'FixedIntervalLoopingCall') as loop:
+            rpc.CacheBackedPluginApi(lib_topics.PLUGIN)
+        path = cfg.CONF.AGENT.resource_cache_snapshot_path
+        cache.return_value.load_snapshot.assert_called_once_with(path)
+        loop.assert_called_once_with(cache.return_value.save_snapshot, path)
+        loop.return_value.start.assert_called_once_with(interval=30,
+                                                        initial_delay=30)
+
+    def test_create_cache_for_l2_agent_deleted_ids_opts(self):
+        cfg.CONF.set_override('resource_cache_deleted_ids_ttl', 600,
+                              group='AGENT')
+        cfg.CONF.set_override('resource_cache_deleted_ids_max_size', 1000,
+                              group='AGENT')
+        with mock.patch.object(rpc.resource_cache,
+                               'RemoteResourceCache') as rcache:
+            rpc.create_cache_for_l2_agent()
+        rcache.assert_called_once_with(mock.ANY, mock.ANY,
+                                       deleted_ids_ttl=600,
+                                       deleted_ids_max_size=1000)
+
     def test__legacy_notifier_resource_delete(self):
         self._api._legacy_notifier(resources.PORT, events.AFTER_DELETE, self,
                                    mock.ANY, resource_id=self._port_id,
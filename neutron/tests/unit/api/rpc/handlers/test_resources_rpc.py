@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+
 import mock
 from neutron_lib.agent import topics
 from neutron_lib import context
@@ -168,6 +170,25 @@ class ResourcesPullRpcApiTestCase(ResourcesRpcBaseTestCase):
             version=TEST_VERSION, filter_kwargs=filter_kwargs)
         self.assertEqual(expected_objs, result)
 
+    def test_bulk_pull_changes(self):
+        self.obj_registry.register(FakeResource)
+        expected_objs = [_create_test_resource(self.context)]
+        self.cctxt_mock.call.return_value = {
+            'resources': [e.obj_to_primitive() for e in expected_objs],
+            'deleted_ids': ['gone']}
+
+        filter_kwargs = {'a': ('b', )}
+        result = self.rpc.bulk_pull_changes(
+            self.context, FakeResource.obj_name(), '2019-01-01T00:00:00',
+            filter_kwargs=filter_kwargs, known_ids=['gone'])
+
+        self.rpc.client.prepare.assert_called_once_with(version='1.2')
+        self.cctxt_mock.call.assert_called_once_with(
+            self.context, 'bulk_pull_changes', resource_type='FakeResource',
+            version=TEST_VERSION, changed_since='2019-01-01T00:00:00',
+            filter_kwargs=filter_kwargs, known_ids=['gone'])
+        self.assertEqual((expected_objs, ['gone']), result)
+
     def test_pull_resource_not_found(self):
         resource_dict = _create_test_dict()
         resource_id = resource_dict['id']
@@ -238,6 +259,61 @@ class ResourcesPullRpcCallbackTestCase(ResourcesRpcBaseTestCase):
                 version=TEST_VERSION, filter_kwargs={'id': r1.id})
             self.assertEqual([r1.obj_to_primitive()], objs)
 
+    def test_bulk_pull_changes(self):
+        r1 = self.resource_obj
+        r2 = _create_test_resource(self.context)
+        r3 = _create_test_resource(self.context)
+
+        @classmethod
+        def get_objs(cls, context, _pager=None, **kwargs):
+            return [r for r in [r1, r2, r3] if r.id in kwargs['id']]
+
+        @classmethod
+        def get_values(cls, context, field, **kwargs):
+            return [r.id for r in [r1, r2, r3] if r.id in kwargs['id']]
+
+        @classmethod
+        def get_changed_ids(cls, context, changed_since, **kwargs):
+            self.assertEqual(datetime.datetime(2019, 1, 1, 10),
+                             changed_since)
+            return [r.id for r in [r1, r2]
+                    if 'id' not in kwargs or r.id in kwargs['id']]
+
+        with mock.patch.object(FakeResource, 'get_objects', new=get_objs), \
+                mock.patch.object(FakeResource, 'get_values',
+                                  new=get_values, create=True), \
+                mock.patch.object(FakeResource, 'get_ids_changed_since',
+                                  new=get_changed_ids, create=True):
+            result = self.callbacks.bulk_pull_changes(
+                self.context, resource_type=FakeResource.obj_name(),
+                version=TEST_VERSION,
+                changed_since='2019-01-01T12:00:00+02:00')
+            self.assertItemsEqual([r1.obj_to_primitive(),
+                                   r2.obj_to_primitive()],
+                                  result['resources'])
+            self.assertEqual([], result['deleted_ids'])
+
+            result = self.callbacks.bulk_pull_changes(
+                self.context, resource_type=FakeResource.obj_name(),
+                version=TEST_VERSION,
+                changed_since='2019-01-01T10:00:00',
+                filter_kwargs={'id': (r2.id, r3.id)},
+                known_ids=[r3.id, 'gone'])
+            self.assertEqual([r2.obj_to_primitive()], result['resources'])
+            self.assertEqual(['gone'], result['deleted_ids'])
+
+            # r1 changed and no longer matches the filters
+            result = self.callbacks.bulk_pull_changes(
+                self.context, resource_type=FakeResource.obj_name(),
+                version=TEST_VERSION,
+                changed_since='2019-01-01T10:00:00',
+                filter_kwargs={'id': [r2.id, r3.id]},
+                known_ids=[r1.id, r3.id])
+            self.assertItemsEqual([r1.obj_to_primitive(),
+                                   r2.obj_to_primitive()],
+                                  result['resources'])
+            self.assertEqual([], result['deleted_ids'])
+
     @mock.patch.object(FakeResource, 'obj_to_primitive')
     def test_pull_backports_to_older_version(self, to_prim_mock):
         with mock.patch.object(resources_rpc.prod_registry, 'pull',
@@ -15,8 +15,11 @@
 
 import mock
 from neutron_lib import context
+from neutron_lib.db import model_query
+from oslo_db.sqlalchemy import utils as sa_utils
 
 from neutron.db import _utils as db_utils
+from neutron.db import models_v2
 from neutron.tests.unit import testlib_api
 
 
@@ -46,3 +49,66 @@ class TestCommonHelpFunctions(testlib_api.SqlTestCase):
                           self.admin_ctx, create_fn, delete_fn,
                           create_bindings)
         delete_fn.assert_called_once_with(1234)
+
+
+class TestGetMarkerKeys(testlib_api.SqlTestCase):
+
+    def setUp(self):
+        super(TestGetMarkerKeys, self).setUp()
+        self.admin_ctx = context.get_admin_context()
+        self.network = models_v2.Network(
+            id='net-id', name='net', project_id='project', status='ACTIVE',
+            admin_state_up=True)
+        with self.admin_ctx.session.begin():
+            self.admin_ctx.session.add(self.network)
+
+    def _get_marker_keys(self, ctx, sorts, limit=1, marker='net-id'):
+        return db_utils.get_marker_keys(
+            ctx, models_v2.Network, sorts, limit, marker)
+
+    def _get_unique_keys(self, exclude=()):
+        # the model may have several unique keys, get_collection_query()
+        # appends the first of them to the sort keys
+        return [key for key in sa_utils.get_unique_keys(models_v2.Network)[0]
+                if key not in exclude]
+
+    def test_get_marker_keys(self):
+        sort_keys = ['name', 'status']
+        marker = self._get_marker_keys(
+            self.admin_ctx, [('name', True), ('status', False)])
+        expected_keys = sort_keys + self._get_unique_keys(exclude=sort_keys)
+        self.assertEqual(expected_keys, marker.keys())
+        self.assertEqual(
+            tuple(getattr(self.network, key) for key in expected_keys),
+            tuple(marker))
+
+    def test_get_marker_keys_without_sorts(self):
+        marker = self._get_marker_keys(self.admin_ctx, None)
+        self.assertEqual(['id'], marker.keys())
+
+    def test_get_marker_keys_paginate(self):
+        network = models_v2.Network(
+            id='net-id-2', name='net2', project_id='project',
+            status='ACTIVE', admin_state_up=True)
+        with self.admin_ctx.session.begin():
+            self.admin_ctx.session.add(network)
+        sorts = [('name', True)]
+        marker = self._get_marker_keys(self.admin_ctx, sorts)
+        query = model_query.get_collection_query(
+            self.admin_ctx, models_v2.Network, sorts=sorts, limit=1,
+            marker_obj=marker)
+        self.assertEqual(['net-id-2'], [net.id for net in query])
+
+    def test_get_marker_keys_no_pagination(self):
+        self.assertIsNone(
+            self._get_marker_keys(self.admin_ctx, None, limit=None))
+        self.assertIsNone(
+            self._get_marker_keys(self.admin_ctx, None, marker=None))
+
+    def test_get_marker_keys_not_found(self):
+        self.assertIsNone(
+            self._get_marker_keys(self.admin_ctx, None, marker='other-id'))
+
+    def test_get_marker_keys_other_project(self):
+        ctx = context.Context('user', 'other-project')
+        self.assertIsNone(self._get_marker_keys(ctx, None))
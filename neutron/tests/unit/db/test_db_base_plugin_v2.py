@@ -27,6 +27,7 @@ from neutron_lib.callbacks import registry
 from neutron_lib import constants
 from neutron_lib import context
 from neutron_lib.db import api as db_api
+from neutron_lib.db import resource_extend
 from neutron_lib import exceptions as lib_exc
 from neutron_lib import fixture
 from neutron_lib.plugins import directory
@@ -1206,6 +1207,35 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
             self._test_list_resources('port', [port1],
                                       query_params=query_params)
 
+    def _test_list_ports_with_fields(self, fields, process_extensions):
+        with self.port() as port:
+            with mock.patch.object(
+                    resource_extend, 'apply_funcs',
+                    wraps=resource_extend.apply_funcs) as apply_funcs:
+                res = self._list(
+                    'ports', query_params='&'.join(
+                        'fields=%s' % field for field in fields))
+        self.assertEqual(process_extensions, apply_funcs.called)
+        self.assertEqual(1, len(res['ports']))
+        self.assertEqual(set(fields), set(res['ports'][0]))
+        return port['port'], res['ports'][0]
+
+    def test_list_ports_with_core_fields(self):
+        port, listed_port = self._test_list_ports_with_fields(
+            ['id', 'device_id'], False)
+        self.assertEqual(port['id'], listed_port['id'])
+        self.assertEqual(port['device_id'], listed_port['device_id'])
+
+    def test_list_ports_with_core_fields_fixed_ips(self):
+        port, listed_port = self._test_list_ports_with_fields(
+            ['id', 'fixed_ips'], False)
+        self.assertEqual(port['fixed_ips'], listed_port['fixed_ips'])
+
+    def test_list_ports_with_extension_fields(self):
+        port, listed_port = self._test_list_ports_with_fields(
+            ['id', 'description'], True)
+        self.assertEqual(port['id'], listed_port['id'])
+
     def test_list_ports_public_network(self):
         with self.network(shared=True) as network:
             with self.subnet(network) as subnet:
@@ -1299,6 +1329,16 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                                             (port1, port2, port3),
                                             ('mac_address', 'asc'), 2, 2)
 
+    def test_list_ports_with_pagination_unknown_marker(self):
+        if self._skip_native_pagination:
+            self.skipTest("Skip test for not implemented pagination feature")
+        with self.port():
+            req = self.new_list_request(
+                'ports',
+                params='limit=1&marker=%s' % uuidutils.generate_uuid())
+            res = req.get_response(self.api)
+            self.assertEqual(webob.exc.HTTPNotFound.code, res.status_int)
+
     def test_list_ports_with_pagination_reverse_native(self):
         if self._skip_native_pagination:
             self.skipTest("Skip test for not implemented pagination feature")
@@ -92,6 +92,14 @@ class TestIpamSubnetManager(testlib_api.SqlTestCase):
         for allocation in allocs:
             self.assertIn(str(allocation.ip_address), ips)
 
+    def test_list_allocated_ips(self):
+        ips = ['1.2.3.4', '1.2.3.6', '1.2.3.7']
+        for ip in ips:
+            self.subnet_manager.create_allocation(self.ctx, ip)
+        allocated_ips = self.subnet_manager.list_allocated_ips(self.ctx)
+        self.assertEqual(sorted(ips),
+                         sorted(str(ip) for ip in allocated_ips))
+
     def _test_create_allocation(self):
         self.subnet_manager.create_allocation(self.ctx,
                                               self.subnet_ip)
@@ -19,6 +19,8 @@ from neutron_lib import constants
 from neutron_lib import context
 from neutron_lib import exceptions as n_exc
 from neutron_lib.plugins import directory
+from oslo_config import cfg
+from oslo_db import exception as db_exc
 from oslo_utils import uuidutils
 
 from neutron.common import constants as n_const
@@ -26,6 +28,7 @@ from neutron.ipam.drivers.neutrondb_ipam import driver
 from neutron.ipam import exceptions as ipam_exc
 from neutron.ipam import requests as ipam_req
 from neutron.objects import ipam as ipam_obj
+from neutron.tests import base
 from neutron.tests.unit.db import test_db_base_plugin_v2 as test_db_plugin
 from neutron.tests.unit import testlib_api
 
@@ -408,6 +411,82 @@ class TestNeutronDbIpamSubnet(testlib_api.SqlTestCase,
                           ipam_subnet.allocate,
                           ipam_req.PreferNextAddressRequest)
 
+    def test_prefernext_allocate_skips_allocated_addresses(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/24', ip_version=constants.IP_VERSION_4)[0]
+        for ip in ('192.168.0.2', '192.168.0.3', '192.168.0.5'):
+            ipam_subnet.allocate(ipam_req.SpecificAddressRequest(ip))
+        self.assertEqual(
+            ['192.168.0.4', '192.168.0.6', '192.168.0.7'],
+            ipam_subnet._generate_ips(self.ctx, prefer_next=True,
+                                      num_addresses=3))
+
+    def test_allocate_any_address_skips_allocated_addresses(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/29', ip_version=constants.IP_VERSION_4)[0]
+        for ip in ('192.168.0.2', '192.168.0.4', '192.168.0.6'):
+            ipam_subnet.allocate(ipam_req.SpecificAddressRequest(ip))
+        ip_addresses = ipam_subnet._generate_ips(self.ctx, num_addresses=2)
+        self.assertEqual(['192.168.0.3', '192.168.0.5'], sorted(ip_addresses))
+
+    def _enable_prefetch(self, prefetch_size):
+        cfg.CONF.set_override('ipam_prefetch_size', prefetch_size)
+        ip_candidates = driver.IpCandidates()
+        mock.patch.object(driver, '_ip_candidates', ip_candidates).start()
+        return ip_candidates
+
+    def test_allocate_any_address_prefetch(self):
+        ip_candidates = self._enable_prefetch(3)
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/24', ip_version=constants.IP_VERSION_4)[0]
+        with mock.patch.object(ipam_subnet.subnet_manager,
+                               'list_allocated_ips',
+                               wraps=ipam_subnet.subnet_manager.
+                               list_allocated_ips) as list_ips:
+            ip_addresses = [ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+                            for _i in range(4)]
+        self.assertEqual(4, len(set(ip_addresses)))
+        self.assertEqual(2, list_ips.call_count)
+        self.assertEqual(4, ip_candidates.hits)
+        self.assertEqual(2, ip_candidates.refills)
+        self.assertEqual(0, ip_candidates.stale)
+
+    def test_allocate_any_address_prefetch_skips_stale_candidates(self):
+        ip_candidates = self._enable_prefetch(3)
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/29', ip_version=constants.IP_VERSION_4)[0]
+        ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        subnet_id = ipam_subnet.subnet_manager.neutron_id
+        candidates = list(ip_candidates._candidates[subnet_id])
+        ipam_subnet.allocate(ipam_req.SpecificAddressRequest(candidates[-1]))
+        ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        self.assertEqual(candidates[0], ip_address)
+        self.assertEqual(1, ip_candidates.stale)
+
+    def test_allocate_any_address_prefetch_exhausted_pools_fails(self):
+        self._enable_prefetch(3)
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/30', ip_version=constants.IP_VERSION_4)[0]
+        ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        self.assertRaises(ipam_exc.IpAddressGenerationFailure,
+                          ipam_subnet.allocate,
+                          ipam_req.AnyAddressRequest)
+
+    def test_allocate_any_address_prefetch_collision(self):
+        ip_candidates = self._enable_prefetch(3)
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/24', ip_version=constants.IP_VERSION_4)[0]
+        ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        with mock.patch.object(ipam_subnet.subnet_manager,
+                               'create_allocation',
+                               side_effect=db_exc.DBDuplicateEntry):
+            self.assertRaises(db_exc.DBDuplicateEntry,
+                              ipam_subnet.allocate,
+                              ipam_req.AnyAddressRequest)
+        self.assertEqual(1, ip_candidates.collisions)
+        self.assertIsNone(ip_candidates.pop(
+            ipam_subnet.subnet_manager.neutron_id))
+
     def _test_deallocate_address(self, cidr, ip_version):
         ipam_subnet = self._create_and_allocate_ipam_subnet(
             cidr, ip_version=ip_version)[0]
@@ -484,3 +563,39 @@ class TestNeutronDbIpamSubnet(testlib_api.SqlTestCase,
         pools = [netaddr.IPRange('192.168.10.20', '192.168.10.41'),
                  netaddr.IPRange('192.168.10.50', '192.168.10.60')]
         self.assertTrue(self._test__no_pool_changes(pools))
+
+
+class TestFreeIpRanges(base.BaseTestCase):
+
+    def _get_free_ips(self, first_ip, last_ip, allocated):
+        av_ranges = driver.FreeIpRanges(
+            netaddr.IPAddress(first_ip), last_ip,
+            sorted(int(netaddr.IPAddress(ip)) for ip in allocated))
+        return [str(av_ranges[i]) for i in range(av_ranges.size)]
+
+    def test_no_allocations(self):
+        self.assertEqual(
+            ['10.0.0.2', '10.0.0.3', '10.0.0.4'],
+            self._get_free_ips('10.0.0.2', '10.0.0.4', []))
+
+    def test_allocations(self):
+        self.assertEqual(
+            ['10.0.0.3', '10.0.0.5', '10.0.0.6'],
+            self._get_free_ips('10.0.0.2', '10.0.0.7',
+                               ['10.0.0.1', '10.0.0.2', '10.0.0.4',
+                                '10.0.0.7', '10.0.0.9']))
+
+    def test_all_allocated(self):
+        self.assertEqual(
+            [], self._get_free_ips('10.0.0.2', '10.0.0.3',
+                                   ['10.0.0.2', '10.0.0.3']))
+
+    def test_v6(self):
+        self.assertEqual(
+            ['::1', '::3'],
+            self._get_free_ips('::1', '::3', ['::2']))
+
+    def test_index_out_of_range(self):
+        av_ranges = driver.FreeIpRanges(
+            netaddr.IPAddress('10.0.0.2'), '10.0.0.3', [])
+        self.assertRaises(IndexError, av_ranges.__getitem__, 2)
@@ -26,6 +26,7 @@ from oslo_utils import uuidutils
 
 from neutron.ipam import requests as ipam_req
 from neutron.ipam import subnet_alloc
+from neutron.tests import base
 from neutron.tests.unit.db import test_db_base_plugin_v2
 from neutron.tests.unit import testlib_api
 
@@ -93,6 +94,36 @@ class TestSubnetAllocation(testlib_api.SqlTestCase):
             self.assertEqual('10.1.2.0/24', str(detail.subnet_cidr))
             self.assertEqual(24, detail.prefixlen)
 
+    def _test_allocate_any_subnets(self, num_cidrs):
+        sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
+                                      ['10.1.0.0/16'], 21, 4)
+        sp = self.plugin._get_subnetpool(self.ctx, sp['id'])
+        sa = subnet_alloc.SubnetAllocator(sp, self.ctx)
+        with mock.patch.object(sa, '_count_allocated_cidrs',
+                               side_effect=num_cidrs), \
+                mock.patch.object(sa, '_get_available_prefix_list',
+                                  wraps=sa._get_available_prefix_list) as gl:
+            cidrs = []
+            for _i in num_cidrs:
+                req = ipam_req.AnySubnetRequest(self._tenant_id,
+                                                uuidutils.generate_uuid(),
+                                                constants.IPv4, 24)
+                cidrs.append(
+                    str(sa.allocate_subnet(req).get_details().subnet_cidr))
+        return cidrs, gl.call_count
+
+    def test_allocate_any_subnet_cached_free_prefixes(self):
+        cidrs, call_count = self._test_allocate_any_subnets([0, 1, 2])
+        self.assertEqual(['10.1.0.0/24', '10.1.1.0/24', '10.1.2.0/24'],
+                         cidrs)
+        self.assertEqual(1, call_count)
+
+    def test_allocate_any_subnet_subnets_changed(self):
+        # the allocated subnets were not created or were deleted
+        cidrs, call_count = self._test_allocate_any_subnets([0, 0])
+        self.assertEqual(['10.1.0.0/24', '10.1.0.0/24'], cidrs)
+        self.assertEqual(2, call_count)
+
     def test_insufficient_prefix_space_for_any_allocation(self):
         sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
                                       ['10.1.1.0/24', '192.168.1.0/24'],
@@ -198,3 +229,51 @@ class TestSubnetAllocation(testlib_api.SqlTestCase):
                                          'fe80::/63')
         with mock.patch("sqlalchemy.orm.query.Query.update", return_value=0):
             self.assertRaises(db_exc.RetryRequest, sa.allocate_subnet, req)
+
+
+class TestFreePrefixes(base.BaseTestCase):
+
+    def _get_free_prefixes(self, ip_version, free_cidrs):
+        return subnet_alloc.FreePrefixes(
+            ip_version, [netaddr.IPNetwork(cidr) for cidr in free_cidrs])
+
+    def test_allocate_any(self):
+        free_prefixes = self._get_free_prefixes(
+            4, ['10.0.0.0/16', '10.1.0.0/24'])
+        self.assertEqual(netaddr.IPNetwork('10.1.0.0/26'),
+                         free_prefixes.allocate_any(26))
+        self.assertEqual(netaddr.IPNetwork('10.1.0.64/26'),
+                         free_prefixes.allocate_any(26))
+        self.assertEqual(netaddr.IPNetwork('10.1.0.128/25'),
+                         free_prefixes.allocate_any(25))
+        self.assertEqual(netaddr.IPNetwork('10.0.0.0/25'),
+                         free_prefixes.allocate_any(25))
+
+    def test_allocate_any_insufficient_space(self):
+        free_prefixes = self._get_free_prefixes(4, ['10.0.0.0/25'])
+        self.assertIsNone(free_prefixes.allocate_any(24))
+        self.assertEqual(netaddr.IPNetwork('10.0.0.0/25'),
+                         free_prefixes.allocate_any(25))
+        self.assertIsNone(free_prefixes.allocate_any(32))
+
+    def test_allocate(self):
+        free_prefixes = self._get_free_prefixes(4, ['10.0.0.0/16'])
+        self.assertTrue(
+            free_prefixes.allocate(netaddr.IPNetwork('10.0.5.0/24')))
+        self.assertFalse(
+            free_prefixes.allocate(netaddr.IPNetwork('10.0.5.0/24')))
+        self.assertFalse(
+            free_prefixes.allocate(netaddr.IPNetwork('10.0.4.0/23')))
+        self.assertFalse(
+            free_prefixes.allocate(netaddr.IPNetwork('10.1.0.0/24')))
+        self.assertEqual(netaddr.IPNetwork('10.0.4.0/24'),
+                         free_prefixes.allocate_any(24))
+        self.assertEqual(netaddr.IPNetwork('10.0.6.0/23'),
+                         free_prefixes.allocate_any(23))
+
+    def test_allocate_any_v6(self):
+        free_prefixes = self._get_free_prefixes(6, ['fe80::/48'])
+        self.assertEqual(netaddr.IPNetwork('fe80::/64'),
+                         free_prefixes.allocate_any(64))
+        self.assertEqual(netaddr.IPNetwork('fe80:0:0:2::/63'),
+                         free_prefixes.allocate_any(63))
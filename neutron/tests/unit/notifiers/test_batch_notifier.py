@@ -61,3 +61,93 @@ class TestBatchNotifier(base.BaseTestCase):
                 # wait for coroutines to finish
                 eventlet.sleep(0.1)
             self.assertTrue(send_events.called)
+
+    def test_queue_event_single_dispatcher(self):
+        for i in range(0, 5):
+            self.notifier.queue_event(mock.Mock())
+        self.assertEqual(5, len(self.notifier.pending_events))
+        self.assertEqual(1, self.spawn_n.call_count)
+
+    def test_queue_event_coalesce(self):
+        callback = mock.Mock()
+        notifier = batch_notifier.BatchNotifier(
+            0.1, callback, key_func=lambda event: event[0])
+        for event in (('a', 1), ('b', 1), ('a', 2), ('c', 1), ('b', 2)):
+            notifier.queue_event(event)
+        self.assertEqual([('a', 2), ('c', 1), ('b', 2)],
+                         notifier.pending_events)
+        notifier._notify()
+        callback.assert_called_once_with([('a', 2), ('c', 1), ('b', 2)])
+        self.assertEqual(5, notifier.queued)
+        self.assertEqual(2, notifier.coalesced)
+        self.assertEqual(3, notifier.sent)
+        self.assertEqual(1, notifier.batches)
+
+    def test_notify_max_batch_size(self):
+        callback = mock.Mock()
+        notifier = batch_notifier.BatchNotifier(0.1, callback,
+                                                max_batch_size=2)
+        for event in range(1, 6):
+            notifier.queue_event(event)
+        notifier._notify()
+        callback.assert_called_once_with([1, 2])
+        self.assertEqual([3, 4, 5], notifier.pending_events)
+        notifier._notify()
+        notifier._notify()
+        callback.assert_has_calls([mock.call([1, 2]), mock.call([3, 4]),
+                                   mock.call([5])])
+        self.assertEqual(3, notifier.batches)
+        self.assertEqual(0, len(notifier.pending_events))
+
+    def _get_requeuing_notifier(self, batch_interval):
+        # the callback queues a follow-up event until event 3 was sent
+        def requeue(events):
+            if events[0] < 3:
+                notifier.queue_event(events[0] + 1)
+
+        notifier = batch_notifier.BatchNotifier(
+            batch_interval, mock.Mock(side_effect=requeue))
+        return notifier
+
+    def test_notify_event_queued_by_callback(self):
+        notifier = self._get_requeuing_notifier(0.1)
+        notifier.queue_event(1)
+        notifier._notify()
+        notifier.callback.assert_called_once_with([1])
+        self.assertEqual([2], notifier.pending_events)
+
+    def test_dispatch_event_queued_by_callback(self):
+        self.spawn_n_p.stop()
+        notifier = self._get_requeuing_notifier(0.01)
+        notifier.queue_event(1)
+        while notifier.pending_events or notifier._dispatching:
+            eventlet.sleep(0.01)
+        notifier.callback.assert_has_calls(
+            [mock.call([1]), mock.call([2]), mock.call([3])])
+        self.assertEqual(3, notifier.callback.call_count)
+        self.assertEqual(3, notifier.batches)
+
+    def test_notify_callback_failure(self):
+        callback = mock.Mock(side_effect=[ValueError, None])
+        notifier = batch_notifier.BatchNotifier(0.1, callback,
+                                                max_batch_size=1)
+        notifier.queue_event(1)
+        notifier.queue_event(2)
+        notifier._notify()
+        notifier._notify()
+        self.assertEqual(2, callback.call_count)
+        self.assertEqual(2, notifier.sent)
+
+    def test_queue_event_max_queue_size(self):
+        self.spawn_n_p.stop()
+        sent = []
+        notifier = batch_notifier.BatchNotifier(0.01, sent.extend,
+                                                max_queue_size=2)
+        notifier.queue_event(1)
+        notifier.queue_event(2)
+        # blocks until the dispatcher sent the pending events
+        notifier.queue_event(3)
+        self.assertEqual([1, 2], sent)
+        while notifier.pending_events:
+            eventlet.sleep(0.01)
+        self.assertEqual([1, 2, 3], sent)
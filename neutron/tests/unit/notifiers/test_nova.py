@@ -321,6 +321,20 @@ class TestNovaNotify(base.BaseTestCase):
                                                              {}, returned_obj)
         self.assertEqual(expected_event, event)
 
+    def test_port_update_events_coalesced(self):
+        device_id = '32102d7b-1cf4-404d-b50a-97aae1f55f87'
+        returned_obj = {'port':
+                        {'device_owner': DEVICE_OWNER_COMPUTE,
+                         'id': 'bee50827-bcee-4cc8-91c1-a27b0ce54222',
+                         'device_id': device_id}}
+        with mock.patch('eventlet.spawn_n'):
+            for i in range(3):
+                self.nova_notifier.send_network_change('update_port', {},
+                                                       returned_obj)
+        self.assertEqual(
+            1, len(self.nova_notifier.batch_notifier.pending_events))
+        self.assertEqual(2, self.nova_notifier.batch_notifier.coalesced)
+
     @mock.patch('novaclient.client.Client')
     def test_endpoint_types(self, mock_client):
         device_id = '32102d7b-1cf4-404d-b50a-97aae1f55f87'
@@ -44,14 +44,16 @@ class GetObjectsTestCase(test_base.BaseTestCase):
 
         with mock.patch.object(
                 model_query, 'get_collection') as get_collection:
-            with mock.patch.object(api, 'get_object') as get_object:
+            with mock.patch.object(
+                    api, 'get_marker_keys') as get_marker_keys:
                 api.get_objects(FakeObj, ctxt, _pager=pager)
-        get_object.assert_called_with(FakeObj, ctxt, id=marker)
+        get_marker_keys.assert_called_with(
+            FakeObj, ctxt, None, limit, marker)
         get_collection.assert_called_with(
             ctxt, FakeObj.db_model, dict_func=None,
             filters={},
             limit=limit,
-            marker_obj=get_object.return_value)
+            marker_obj=get_marker_keys.return_value)
 
 
 class GetValuesTestCase(test_base.BaseTestCase):
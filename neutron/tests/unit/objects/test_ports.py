@@ -10,6 +10,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 import mock
 from neutron_lib import constants
 from oslo_utils import uuidutils
@@ -282,6 +284,42 @@ class PortDbObjectTestCase(obj_test_base.BaseDbObjectTestCase,
                     self.context, id=(objs[i].id, ),
                     security_group_ids=(group, )))
 
+    def test_get_ids_changed_since(self):
+        objs = []
+        for i in range(2):
+            objs.append(self._make_object(self.obj_fields[i]))
+            objs[i].create()
+        past = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        future = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        self.assertItemsEqual(
+            [obj.id for obj in objs],
+            ports.Port.get_ids_changed_since(self.context, past))
+        self.assertEqual(
+            [], ports.Port.get_ids_changed_since(self.context, future))
+
+    def test_get_ids_changed_since_with_filters(self):
+        objs = []
+        group = self._create_test_security_group_id()
+        for i in range(3):
+            objs.append(self._make_object(self.obj_fields[i]))
+            if i:
+                objs[i].security_group_ids = {group}
+            objs[i].create()
+        past = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        self.assertItemsEqual(
+            [objs[1].id, objs[2].id],
+            ports.Port.get_ids_changed_since(
+                self.context, past, security_group_ids=(group, )))
+        self.assertEqual(
+            [objs[2].id],
+            ports.Port.get_ids_changed_since(
+                self.context, past, id=[objs[0].id, objs[2].id],
+                security_group_ids=(group, )))
+        self.assertEqual(
+            [objs[0].id],
+            ports.Port.get_ids_changed_since(
+                self.context, past, id=[objs[0].id]))
+
     def test__attach_security_group(self):
         obj = self._make_object(self.obj_fields[0])
         obj.create()
@@ -10,10 +10,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+from eventlet import greenthread
 import mock
 from os_ken.ofproto import ofproto_v1_3
 from os_ken.ofproto import ofproto_v1_3_parser
 
+from neutron.agent.common import ovs_lib
+from neutron.conf.plugins.ml2.drivers import ovs_conf
 from neutron.plugins.ml2.drivers.openvswitch.agent.openflow.native \
     import ofswitch
 from neutron.tests import base
@@ -104,3 +108,271 @@ class TestBundledOpenFlowBridge(base.BaseTestCase):
         args, kwargs = self.br.br._send_msg.call_args_list[1]
         self.assertEqual(ofproto_v1_3.ONF_BCT_COMMIT_REQUEST,
                          args[0].type)
+
+
+class FakeSwitch(ofswitch.OpenFlowSwitchMixin):
+    br_name = 'br-fake'
+    default_cookie = _default_cookie = 1234
+
+    def __init__(self):
+        super(FakeSwitch, self).__init__(os_ken_app=mock.Mock())
+        self.dp = mock.Mock()
+
+    def _get_dp(self):
+        return self.dp, ofproto_v1_3, ofproto_v1_3_parser
+
+
+class TestDeferredFlows(base.BaseTestCase):
+    def setUp(self):
+        super(TestDeferredFlows, self).setUp()
+        ovs_conf.register_ovs_agent_opts()
+        self.br = FakeSwitch()
+        self.sent = []
+        self.send_msg = mock.patch.object(
+            ofswitch.ofctl_api, 'send_msg',
+            side_effect=self._send_msg).start()
+
+    def _send_msg(self, app, msg, reply_cls=None, reply_multi=False):
+        self.sent.append(msg)
+        if isinstance(msg, ofproto_v1_3_parser.ONFBundleCtrlMsg):
+            # replies are numbered after their request
+            return FakeReply(msg.type + 1)
+        if reply_multi:
+            return []
+
+    def _spawn_during_bundle(self, func):
+        # func runs in another greenthread while the first bundle of deferred
+        # flow modifications is in flight
+        threads = []
+
+        def send_msg(app, msg, reply_cls=None, reply_multi=False):
+            result = self._send_msg(app, msg, reply_cls, reply_multi)
+            if (isinstance(msg, ofproto_v1_3_parser.ONFBundleAddMsg) and
+                    not threads):
+                threads.append(eventlet.spawn(func))
+                eventlet.sleep(0)
+            return result
+
+        self.send_msg.side_effect = send_msg
+        return threads
+
+    def _assert_bundle_sent(self, flow_mods, sent):
+        self.assertEqual(len(flow_mods) + 2, len(sent))
+        self.assertEqual(ofproto_v1_3.ONF_BCT_OPEN_REQUEST, sent[0].type)
+        self.assertEqual(ofproto_v1_3.ONF_BF_ATOMIC |
+                         ofproto_v1_3.ONF_BF_ORDERED, sent[0].flags)
+        for flow_mod, msg in zip(flow_mods, sent[1:-1]):
+            self.assertIsInstance(msg, ofproto_v1_3_parser.ONFBundleAddMsg)
+            self.assertEqual(sent[0].bundle_id, msg.bundle_id)
+            self.assertEqual(flow_mod, msg.message.match['in_port'])
+        self.assertEqual(ofproto_v1_3.ONF_BCT_COMMIT_REQUEST, sent[-1].type)
+
+    def test_flows_not_deferred(self):
+        self.br.install_drop(in_port=1)
+        self.assertEqual(1, len(self.sent))
+        self.assertIsInstance(self.sent[0], ofproto_v1_3_parser.OFPFlowMod)
+
+    def test_deferred_flows(self):
+        self.br.defer_flows_on()
+        self.br.install_drop(in_port=1)
+        self.br.uninstall_flows(in_port=2)
+        self.assertEqual([], self.sent)
+
+        self.br.apply_deferred_flows()
+        self._assert_bundle_sent([1, 2], self.sent)
+        self.assertEqual(2, self.br.deferred_flows_committed)
+        self.assertEqual(1, self.br.deferred_bundles_committed)
+
+        # still deferring
+        self.br.install_drop(in_port=3)
+        self.assertEqual(4, len(self.sent))
+        self.br.defer_flows_off()
+        self._assert_bundle_sent([3], self.sent[4:])
+        self.assertEqual(3, self.br.deferred_flows_committed)
+        self.assertEqual(2, self.br.deferred_bundles_committed)
+
+        self.br.install_drop(in_port=4)
+        self.assertEqual(8, len(self.sent))
+
+    def test_deferred_flows_applied_before_request_with_reply(self):
+        self.br.defer_flows_on()
+        self.br.install_drop(in_port=1)
+        self.br.dump_flows()
+        self._assert_bundle_sent([1], self.sent[:3])
+        self.assertIsInstance(self.sent[3],
+                              ofproto_v1_3_parser.OFPFlowStatsRequest)
+        self.br.defer_flows_off()
+        self.assertEqual(4, len(self.sent))
+
+    def test_deferred_flows_failure(self):
+        self.br.defer_flows_on()
+        self.br.install_drop(in_port=1)
+        self.send_msg.side_effect = RuntimeError
+        self.assertRaises(RuntimeError, self.br.defer_flows_off)
+        self.assertEqual(0, self.br.deferred_bundles_committed)
+
+        # the flow modifications are kept and deferral stays on
+        self.send_msg.side_effect = self._send_msg
+        self.br.install_drop(in_port=2)
+        self.assertEqual([], self.sent)
+        self.br.defer_flows_off()
+        self._assert_bundle_sent([1, 2], self.sent)
+        self.br.install_drop(in_port=3)
+        self.assertEqual(5, len(self.sent))
+
+    def test_flows_queued_while_bundle_in_flight(self):
+        def other_thread():
+            self.br.install_drop(in_port=2)
+            self.br.dump_flows()
+
+        self.br.defer_flows_on()
+        self.br.install_drop(in_port=1)
+        threads = self._spawn_during_bundle(other_thread)
+        self.br.apply_deferred_flows()
+        threads[0].wait()
+        self._assert_bundle_sent([1], self.sent[:3])
+        self._assert_bundle_sent([2], self.sent[3:6])
+        self.assertIsInstance(self.sent[6],
+                              ofproto_v1_3_parser.OFPFlowStatsRequest)
+        self.assertEqual(2, self.br.deferred_bundles_committed)
+
+    def test_defer_flows_off_while_bundle_in_flight(self):
+        self.br.defer_flows_on()
+        self.br.install_drop(in_port=1)
+        threads = self._spawn_during_bundle(self.br.defer_flows_off)
+        self.br.apply_deferred_flows()
+        threads[0].wait()
+        self._assert_bundle_sent([1], self.sent)
+
+        # deferral is not turned back on
+        self.br.install_drop(in_port=2)
+        self.assertEqual(4, len(self.sent))
+        self.assertIsInstance(self.sent[3], ofproto_v1_3_parser.OFPFlowMod)
+
+
+class TestCleanupFlows(base.BaseTestCase):
+    def setUp(self):
+        super(TestCleanupFlows, self).setUp()
+        ovs_conf.register_ovs_agent_opts()
+        self.br = FakeSwitch()
+        self.generation = 0x1234 << ovs_lib.COOKIE_GENERATION_SHIFT
+        self.br.reserved_cookies = set([self.generation | 1,
+                                        self.generation | 2])
+        self.flows = []
+        self.dumped_tables = []
+        self.sent = []
+        self.send_msg = mock.patch.object(
+            ofswitch.ofctl_api, 'send_msg',
+            side_effect=self._send_msg).start()
+        mock.patch.object(ofswitch.eventlet, 'sleep').start()
+
+    def _matches(self, msg, table_id, cookie):
+        return (msg.table_id in (table_id, ofproto_v1_3.OFPTT_ALL) and
+                cookie & msg.cookie_mask == msg.cookie & msg.cookie_mask)
+
+    def _send_msg(self, app, msg, reply_cls=None, reply_multi=False):
+        self.sent.append(msg)
+        if isinstance(msg, ofproto_v1_3_parser.ONFBundleCtrlMsg):
+            return FakeReply(msg.type + 1)
+        if isinstance(msg, ofproto_v1_3_parser.ONFBundleAddMsg):
+            return
+        if isinstance(msg, ofproto_v1_3_parser.OFPTableStatsRequest):
+            tables = set(table_id for table_id, _cookie in self.flows)
+            return [mock.Mock(body=[
+                ofproto_v1_3_parser.OFPTableStats(
+                    t, len([f for f in self.flows if f[0] == t]), 0, 0)
+                for t in tables])]
+        matching = [f for f in self.flows if self._matches(msg, *f)]
+        if isinstance(msg, ofproto_v1_3_parser.OFPAggregateStatsRequest):
+            return mock.Mock(body=ofproto_v1_3_parser.OFPAggregateStats(
+                0, 0, len(matching)))
+        if isinstance(msg, ofproto_v1_3_parser.OFPFlowStatsRequest):
+            self.dumped_tables.append(msg.table_id)
+            return [mock.Mock(body=[mock.Mock(table_id=table_id,
+                                              cookie=cookie)
+                                    for table_id, cookie in matching])]
+        if msg.command == ofproto_v1_3.OFPFC_ADD:
+            return
+        self.assertEqual(ofproto_v1_3.OFPFC_DELETE, msg.command)
+        self.flows = [f for f in self.flows if f not in matching]
+
+    def test_cleanup_flows(self):
+        old_generation = 0xabcd << ovs_lib.COOKIE_GENERATION_SHIFT
+        self.flows = [(0, self.generation | 1), (0, self.generation | 2),
+                      (0, old_generation | 1), (1, self.generation | 2),
+                      (2, old_generation | 2), (2, 0),
+                      (3, ovs_lib.UINT64_BITMASK)]
+        self.br.cleanup_flows()
+        self.assertEqual([(0, self.generation | 1), (0, self.generation | 2),
+                          (1, self.generation | 2)], self.flows)
+        self.assertEqual([], self.dumped_tables)
+
+    def test_cleanup_flows_unreserved_cookie_of_generation(self):
+        self.flows = [(0, self.generation | 1), (0, self.generation | 3),
+                      (1, self.generation | 2), (1, self.generation | 3)]
+        self.br.cleanup_flows()
+        self.assertEqual([(0, self.generation | 1),
+                          (1, self.generation | 2)], self.flows)
+        self.assertEqual([0, 1], self.dumped_tables)
+
+    def test_cleanup_flows_nothing_stale(self):
+        self.flows = [(0, self.generation | 1), (4, self.generation | 2)]
+        with mock.patch.object(self.br, 'uninstall_flows') as uninstall:
+            self.br.cleanup_flows()
+        uninstall.assert_not_called()
+        self.assertEqual([], self.dumped_tables)
+
+    def _flow_mods(self):
+        return [msg for msg in self.sent
+                if isinstance(msg, (ofproto_v1_3_parser.OFPFlowMod,
+                                    ofproto_v1_3_parser.ONFBundleCtrlMsg))]
+
+    def test_cleanup_flows_during_deferred_iteration(self):
+        old_generation = 0xabcd << ovs_lib.COOKIE_GENERATION_SHIFT
+        self.flows = [(0, self.generation | 1), (0, old_generation | 1)]
+        self.br.defer_flows_on()
+        self.br.install_drop(in_port=1)
+        cleanup = eventlet.spawn(self.br.cleanup_flows)
+        greenthread.sleep(0)
+        # the cleanup waits for the deferred flows and does not commit them
+        self.assertEqual([], self.sent)
+
+        # flows installed with a cookie requested meanwhile are not stale
+        self.br.reserved_cookies.add(self.generation | 3)
+        self.flows.append((0, self.generation | 3))
+        self.br.defer_flows_off()
+        cleanup.wait()
+        self.assertEqual([(0, self.generation | 1), (0, self.generation | 3)],
+                         self.flows)
+        flow_mods = self._flow_mods()
+        self.assertEqual(ofproto_v1_3.ONF_BCT_OPEN_REQUEST,
+                         flow_mods[0].type)
+        self.assertEqual(ofproto_v1_3.ONF_BCT_COMMIT_REQUEST,
+                         flow_mods[1].type)
+        self.assertTrue(all(msg.command == ofproto_v1_3.OFPFC_DELETE
+                            for msg in flow_mods[2:]))
+
+    def test_cleanup_flows_queues_flow_mods_of_other_threads(self):
+        self.flows = [(0, self.generation | 1), (0, self.generation | 3),
+                      (1, self.generation | 3)]
+        threads = []
+
+        def send_msg(app, msg, reply_cls=None, reply_multi=False):
+            if (isinstance(msg, ofproto_v1_3_parser.OFPFlowStatsRequest) and
+                    not threads):
+                threads.append(eventlet.spawn(self.br.install_drop,
+                                              in_port=1))
+                greenthread.sleep(0)
+            return self._send_msg(app, msg, reply_cls, reply_multi)
+
+        self.send_msg.side_effect = send_msg
+        self.br.cleanup_flows()
+        threads[0].wait()
+        self.assertEqual([(0, self.generation | 1)], self.flows)
+        # the flow modification is sent once the table was cleaned up
+        tables = [getattr(msg, 'table_id', None) for msg in self._flow_mods()]
+        bundle = tables.index(None)
+        self.assertEqual([None] * 2, tables[bundle:bundle + 2])
+        self.assertEqual(set([0]), set(tables[:bundle]))
+        self.assertEqual(set([1]), set(tables[bundle + 2:]))
+        self.assertEqual(1, self.br.deferred_bundles_committed)
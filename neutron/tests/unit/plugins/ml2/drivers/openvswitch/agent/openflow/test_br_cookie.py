@@ -42,6 +42,15 @@ class TestBRCookieOpenflow(base.BaseTestCase):
         self.assertIn(default_cookie, self.br.reserved_cookies)
         self.assertIn(requested_cookie, self.br.reserved_cookies)
 
+    def test_request_cookie_same_generation(self):
+        requested_cookie = self.br.request_cookie()
+        self.assertEqual(
+            self.br.default_cookie & ovs_lib.COOKIE_GENERATION_MASK,
+            requested_cookie & ovs_lib.COOKIE_GENERATION_MASK)
+        self.assertEqual([], [
+            (c, m) for c, m in self.br.get_stale_cookie_masks()
+            if requested_cookie & m == c])
+
     def test_unset_cookie(self):
         requested_cookie = self.br.request_cookie()
         self.assertIn(requested_cookie, self.br.reserved_cookies)
@@ -15,6 +15,7 @@
 import sys
 import time
 
+import eventlet
 import mock
 from neutron_lib.agent import constants as agent_consts
 from neutron_lib import constants as n_const
@@ -1073,7 +1074,7 @@ class TestOvsNeutronAgent(object):
                                      port_info.get('updated', set()))
             if devices_added_updated:
                 device_added_updated.assert_called_once_with(
-                    devices_added_updated, False)
+                    devices_added_updated, False, mock.ANY)
             if port_info.get('removed', set()):
                 device_removed.assert_called_once_with(port_info['removed'])
             if skipped_devices:
@@ -1109,6 +1110,75 @@ class TestOvsNeutronAgent(object):
     def test_process_network_port_with_empty_port(self):
         self._test_process_network_ports({})
 
+    def test_process_network_ports_in_chunks_failure(self):
+        cfg.CONF.set_override('port_processing_chunk_size', 1, 'AGENT')
+        port_info = {'current': set(['tap0', 'tap1']),
+                     'added': set(['tap0', 'tap1'])}
+        with mock.patch.object(
+                self.agent.plugin_rpc,
+                'get_devices_details_list_and_failed_devices',
+                return_value={'devices': [], 'failed_devices': []}), \
+                mock.patch.object(self.agent,
+                                  'treat_devices_added_or_updated',
+                                  side_effect=RuntimeError), \
+                mock.patch.object(self.mod_agent.eventlet,
+                                  'spawn') as spawn:
+            self.assertRaises(RuntimeError,
+                              self.agent.process_network_ports,
+                              port_info, False)
+        # the details of the second chunk are no longer fetched
+        spawn.return_value.kill.assert_called_once_with()
+
+    def test_process_network_ports_in_chunks(self):
+        cfg.CONF.set_override('port_processing_chunk_size', 2, 'AGENT')
+        port_info = {'current': set(['tap0', 'tap1', 'tap2']),
+                     'added': set(['tap0', 'tap1']),
+                     'updated': set(['tap2'])}
+        details_calls = []
+        rpc_calls_while_treating = []
+
+        def get_details(context, devices, agent_id, host):
+            details_calls.append(devices)
+            return {'devices': devices, 'failed_devices': []}
+
+        def treat_devices(devices, provisioning_needed, details):
+            # the details of the next chunk are fetched meanwhile
+            eventlet.sleep(0)
+            rpc_calls_while_treating.append(len(details_calls))
+            self.assertEqual(devices, details['devices'])
+            return [], set(), [], set()
+
+        with mock.patch.object(
+                self.agent.plugin_rpc,
+                'get_devices_details_list_and_failed_devices',
+                side_effect=get_details), \
+                mock.patch.object(self.agent,
+                                  'treat_devices_added_or_updated',
+                                  side_effect=treat_devices) as treat, \
+                mock.patch.object(self.agent.sg_agent,
+                                  'setup_port_filters') as setup_filters, \
+                mock.patch.object(self.agent, '_bind_devices',
+                                  return_value=set()) as bind_devices:
+            failed_devices = self.agent.process_network_ports(port_info,
+                                                              False)
+
+        self.assertEqual({'added': set(), 'removed': set()}, failed_devices)
+        chunks = [c[0][0] for c in treat.call_args_list]
+        self.assertEqual(chunks, details_calls)
+        self.assertEqual([2, 1], [len(c) for c in chunks])
+        self.assertEqual(port_info['current'], chunks[0] | chunks[1])
+        self.assertEqual([2, 2], rpc_calls_while_treating)
+        setup_filters.assert_has_calls([
+            mock.call(port_info['added'] & chunk,
+                      port_info['updated'] & chunk) for chunk in chunks])
+        self.assertEqual(2, bind_devices.call_count)
+        port_stats = self.agent.get_port_stats(port_info, {})
+        self.assertEqual(
+            set(['details', 'wiring', 'firewall', 'binding']),
+            set(port_stats['regular']['stage_times']))
+        self.assertNotIn('stage_times',
+                         self.agent.get_port_stats(port_info, {})['regular'])
+
     def test_hybrid_plug_flag_based_on_firewall(self):
         cfg.CONF.set_default(
             'firewall_driver',
@@ -1808,7 +1878,8 @@ class TestOvsNeutronAgent(object):
                 mock_idl_monitor:
             self.agent.daemon_loop()
         mock_get_pm.assert_called_with(True,
-                                       constants.DEFAULT_OVSDBMON_RESPAWN)
+                                       constants.DEFAULT_OVSDBMON_RESPAWN,
+                                       idl_monitor=mock_idl_monitor)
         mock_loop.assert_called_once_with(polling_manager=mock.ANY)
         mock_idl_monitor.start_bridge_monitor.assert_called()
 
@@ -2090,6 +2161,8 @@ class TestOvsNeutronAgent(object):
                 mock.call(reply2, False),
                 mock.call(reply3, True)
             ])
+            # let the stale flows cleanup run in the background
+            eventlet.sleep(0)
             cleanup.assert_called_once_with()
             self.assertTrue(update_stale.called)
             # Verify the OVS restart we triggered in the loop
@@ -2388,27 +2461,89 @@ class TestOvsNeutronAgentOFCtl(TestOvsNeutronAgent,
 class TestOvsNeutronAgentOSKen(TestOvsNeutronAgent,
                              ovs_test_base.OVSOSKenTestBase):
     def test_cleanup_stale_flows(self):
-        uint64_max = (1 << 64) - 1
-        with mock.patch.object(self.agent.int_br,
-                               'dump_flows') as dump_flows,\
-                mock.patch.object(self.agent.int_br,
-                                  'uninstall_flows') as uninstall_flows:
-            self.agent.int_br.set_agent_uuid_stamp(1234)
-            dump_flows.return_value = [
-                # mock os_ken.ofproto.ofproto_v1_3_parser.OFPFlowStats
-                mock.Mock(cookie=1234, table_id=0),
-                mock.Mock(cookie=17185, table_id=2),
-                mock.Mock(cookie=9029, table_id=2),
-                mock.Mock(cookie=1234, table_id=3),
-            ]
-            self.agent.iter_num = 3
-            self.agent.cleanup_stale_flows()
-            expected = [mock.call(cookie=17185,
-                                  cookie_mask=uint64_max),
-                        mock.call(cookie=9029,
-                                  cookie_mask=uint64_max)]
-            uninstall_flows.assert_has_calls(expected, any_order=True)
-            self.assertEqual(len(expected), len(uninstall_flows.mock_calls))
+        bridges = [self.agent.int_br] + list(self.agent.phys_brs.values())
+        if self.agent.enable_tunneling:
+            bridges.append(self.agent.tun_br)
+        for bridge in bridges:
+            mock.patch.object(bridge, 'cleanup_flows').start()
+        self.agent.cleanup_stale_flows()
+        for bridge in bridges:
+            bridge.cleanup_flows.assert_called_once_with()
+
+    def test_stale_flows_cleanup_in_background(self):
+        with mock.patch.object(self.agent, 'cleanup_stale_flows',
+                               side_effect=[RuntimeError, None]) as cleanup:
+            self.assertFalse(self.agent._stale_flows_cleanup_failed())
+            self.agent._start_stale_flows_cleanup()
+            self.agent._stale_flows_cleanup.wait()
+            self.assertTrue(self.agent._stale_flows_cleanup_failed())
+            self.assertIsNone(self.agent._stale_flows_cleanup)
+            self.agent._start_stale_flows_cleanup()
+            self.agent._stale_flows_cleanup.wait()
+            self.assertFalse(self.agent._stale_flows_cleanup_failed())
+            self.assertEqual(2, cleanup.call_count)
+
+    def _test_deferred_flows(self, enabled, exception=None):
+        cfg.CONF.set_override('of_bundle_deferred_flows', enabled, 'OVS')
+        self.agent.phys_brs = {'physnet1': mock.Mock()}
+        bridges = [self.agent.int_br, self.agent.phys_brs['physnet1']]
+        with mock.patch.object(self.agent, 'int_br') as int_br:
+            bridges[0] = int_br
+            with self.agent._deferred_flows():
+                for bridge in bridges:
+                    bridge.defer_flows_off.assert_not_called()
+                self.agent._apply_deferred_flows()
+                if exception:
+                    raise exception
+        for bridge in bridges:
+            if enabled:
+                bridge.defer_flows_on.assert_called_once_with()
+                bridge.apply_deferred_flows.assert_called_once_with()
+                bridge.defer_flows_off.assert_called_once_with()
+            else:
+                bridge.defer_flows_on.assert_not_called()
+
+    def test_deferred_flows(self):
+        self._test_deferred_flows(True)
+
+    def test_deferred_flows_disabled(self):
+        self._test_deferred_flows(False)
+
+    def test_deferred_flows_exception(self):
+        self.assertRaises(ValueError, self._test_deferred_flows, True,
+                          exception=ValueError())
+
+    def test_deferred_flows_commit_failure(self):
+        cfg.CONF.set_override('of_bundle_deferred_flows', True, 'OVS')
+        phys_br = mock.Mock()
+        self.agent.phys_brs = {'physnet1': phys_br}
+        with mock.patch.object(self.agent, 'int_br') as int_br:
+            int_br.defer_flows_off.side_effect = RuntimeError
+            with testtools.ExpectedException(RuntimeError):
+                with self.agent._deferred_flows():
+                    pass
+        phys_br.defer_flows_off.assert_called_once_with()
+
+    def test_bind_devices_applies_deferred_flows(self):
+        self.agent.vlan_manager.mapping["net1"] = mock.Mock()
+        vif_port = mock.Mock()
+        vif_port.port_name = 'tap1'
+        port_details = [{'network_id': 'net1', 'vif_port': vif_port,
+                         'device': 'tap1', 'device_owner': 'network:dhcp',
+                         'admin_state_up': True}]
+        manager = mock.Mock()
+        manager.update_device_list.return_value = {
+            'failed_devices_up': [], 'failed_devices_down': []}
+        with mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                               manager.update_device_list), \
+                mock.patch.object(self.agent, '_apply_deferred_flows',
+                                  manager.apply_deferred_flows), \
+                mock.patch.object(self.agent, 'int_br') as int_br:
+            int_br.get_ports_attributes.return_value = [
+                {'name': 'tap1', 'tag': []}]
+            self.agent._bind_devices(port_details)
+        self.assertEqual(['apply_deferred_flows', 'update_device_list'],
+                         [c[0] for c in manager.mock_calls])
 
 
 class AncillaryBridgesTest(object):
@@ -3512,6 +3647,25 @@ class TestOvsDvrNeutronAgent(object):
                 pass
         self.assertTrue(all([x.called for x in reset_mocks]))
 
+    def _test_rpc_loop_resyncs_cache(self, fullsync, needs_resync,
+                                     expected_resyncs):
+        self.agent.fullsync = fullsync
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'remote_resource_cache') as rcache,\
+                mock.patch.object(self.agent, '_check_and_handle_signal',
+                                  side_effect=[True, False]):
+            rcache.needs_resync = needs_resync
+            try:
+                self.agent.rpc_loop(polling_manager=mock.Mock())
+            except TypeError:
+                pass
+        self.assertEqual(expected_resyncs, rcache.resync.call_count)
+
+    def test_rpc_loop_resyncs_cache_snapshot_once(self):
+        self._test_rpc_loop_resyncs_cache(False, True, 1)
+        self._test_rpc_loop_resyncs_cache(True, True, 1)
+        self._test_rpc_loop_resyncs_cache(False, False, 0)
+
     def test_rpc_loop_survives_error_in_check_canary_table(self):
         with mock.patch.object(self.agent.int_br,
                                'check_canary_table',
@@ -16,6 +16,7 @@
 
 import time
 
+import eventlet
 import mock
 from neutron_lib import constants as n_const
 from oslo_config import cfg
@@ -573,10 +574,13 @@ class TunnelTest(object):
                            'added': set([]),
                            'removed': set([])}
 
+        # The stale flows are cleaned in the background
         self.mock_int_bridge_expected += [
             mock.call.check_canary_table(),
-            mock.call.cleanup_flows(),
-            mock.call.check_canary_table()
+            mock.call.get_ports_snapshot(),
+            mock.call.check_canary_table(),
+            mock.call.get_ports_snapshot(),
+            mock.call.cleanup_flows()
         ]
         self.mock_tun_bridge_expected += [
             mock.call.cleanup_flows()
@@ -625,6 +629,7 @@ class TunnelTest(object):
                 n_agent.rpc_loop(interface_polling)
             except Exception:
                 pass
+            eventlet.sleep(0)
 
             # FIXME(salv-orlando): There should not be assertions on log
             # messages
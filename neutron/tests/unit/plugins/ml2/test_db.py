@@ -424,6 +424,31 @@ class Ml2DvrDBTestCase(testlib_api.SqlTestCase):
                                                      port_id_1)
         self.assertEqual(2, len(ports))
 
+    def test_get_distributed_port_bindings_by_host(self):
+        network_id = uuidutils.generate_uuid()
+        port_id_1 = uuidutils.generate_uuid()
+        port_id_2 = uuidutils.generate_uuid()
+        port_id_3 = uuidutils.generate_uuid()
+        self._setup_neutron_network(network_id,
+                                    [port_id_1, port_id_2, port_id_3])
+        router = self._setup_neutron_router()
+        self._setup_distributed_binding(
+            network_id, port_id_1, router.id, 'foo_host_id_1')
+        self._setup_distributed_binding(
+            network_id, port_id_1, router.id, 'foo_host_id_2')
+        self._setup_distributed_binding(
+            network_id, port_id_2, router.id, 'foo_host_id_1')
+        bindings = ml2_db.get_distributed_port_bindings_by_host(
+            self.ctx, [port_id_1, port_id_2, port_id_3], 'foo_host_id_1')
+        self.assertEqual({port_id_1, port_id_2}, set(bindings))
+        for port_id, binding in bindings.items():
+            self.assertEqual(port_id, binding.port_id)
+            self.assertEqual('foo_host_id_1', binding.host)
+
+    def test_get_distributed_port_bindings_by_host_no_ports(self):
+        self.assertEqual({}, ml2_db.get_distributed_port_bindings_by_host(
+            self.ctx, [], 'foo_host_id'))
+
     def test_distributed_port_binding_deleted_by_port_deletion(self):
         network_id = uuidutils.generate_uuid()
         network_obj.Network(self.ctx, id=network_id).create()
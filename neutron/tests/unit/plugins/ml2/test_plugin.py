@@ -710,6 +710,56 @@ class TestMl2DbOperationBoundsTenantRbac(TestMl2DbOperationBoundsTenant):
             self.make_port_in_shared_network, 'ports')
 
 
+class TestMl2BoundPortsContextsDbOperationBounds(
+        test_plugin.DbOperationBoundMixin, Ml2PluginV2TestCase):
+    """Assert a constant query count when fetching bound port contexts.
+
+    Agents request the details of all their devices at once, so the
+    ports, bindings, segments and networks of the devices have to be
+    fetched in bulk regardless of the number of devices requested.
+    """
+
+    host = 'host-ovs-no_filter'
+
+    def _make_bound_port(self, device_owner='compute:nova'):
+        net = self._make_network(self.fmt, 'net', True)
+        port = self._make_port(
+            self.fmt, net['network']['id'], device_owner=device_owner,
+            arg_list=(portbindings.HOST_ID,),
+            **{portbindings.HOST_ID: self.host})
+        return port['port']['id']
+
+    def _get_contexts_and_record_queries(self, devices):
+        self._recorded_statements = []
+        contexts = self.driver.get_bound_ports_contexts(
+            self.context, devices, self.host)
+        self.assertEqual(set(devices), set(contexts))
+        for device in devices:
+            self.assertIsNotNone(contexts[device])
+            self.assertIsNotNone(contexts[device].bottom_bound_segment)
+        self.assertNotEqual(0, len(self._recorded_statements))
+        return list(self._recorded_statements)
+
+    def test_bound_ports_contexts_queries_constant(self):
+        devices = [self._make_bound_port() for _i in range(2)]
+        before_queries = self._get_contexts_and_record_queries(devices)
+        devices += [self._make_bound_port() for _i in range(4)]
+        after_queries = self._get_contexts_and_record_queries(devices)
+        self.assertEqual(len(before_queries), len(after_queries),
+                         self._qry_fail_msg(before_queries, after_queries))
+
+    def test_bound_ports_contexts_partial_device_ids(self):
+        devices = [self._make_bound_port()[:11] for _i in range(3)]
+        self._get_contexts_and_record_queries(devices)
+
+    def test_bound_ports_contexts_unknown_device(self):
+        device = self._make_bound_port()
+        contexts = self.driver.get_bound_ports_contexts(
+            self.context, [device, 'unknown_device'], self.host)
+        self.assertIsNotNone(contexts[device])
+        self.assertIsNone(contexts['unknown_device'])
+
+
 class TestMl2RevivedAgentsBindPorts(Ml2PluginV2TestCase):
 
     _mechanism_drivers = ['openvswitch', 'logger']
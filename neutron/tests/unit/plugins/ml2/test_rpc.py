@@ -200,17 +200,85 @@ class RpcCallbacksTestCase(base.BaseTestCase):
             self.assertFalse(f.called)
             self.assertEqual([], res)
 
+    def test_get_devices_details_list_fetches_contexts_in_bulk(self):
+        devices = ['fake_device_1', 'fake_device_2', 'fake_device_3']
+        contexts = {}
+        for device in devices:
+            port_context = mock.Mock(host='fake_host')
+            port_context.current = {'id': device, 'admin_state_up': True,
+                                    'status': constants.PORT_STATUS_DOWN}
+            contexts[device] = port_context
+        contexts['fake_device_3'] = None
+        self.plugin.get_bound_ports_contexts.return_value = contexts
+        with mock.patch.object(self.callbacks, '_get_device_details',
+                               side_effect=lambda *a, **kw: {
+                                   'device': kw['device'],
+                                   'network_id': 'fake_net'}):
+            res = self.callbacks.get_devices_details_list(
+                'fake_context', devices=devices, host='fake_host',
+                agent_id='fake_agent_id')
+        self.assertEqual([{'device': 'fake_device_1',
+                           'network_id': 'fake_net'},
+                          {'device': 'fake_device_2',
+                           'network_id': 'fake_net'},
+                          {'device': 'fake_device_3'}], res)
+        self.plugin.get_bound_ports_contexts.assert_called_once_with(
+            'fake_context', devices, 'fake_host')
+        self.plugin.update_port_statuses.assert_called_once_with(
+            'fake_context',
+            {'fake_device_1': constants.PORT_STATUS_BUILD,
+             'fake_device_2': constants.PORT_STATUS_BUILD},
+            'fake_host')
+        self.assertFalse(self.plugin.get_bound_port_context.called)
+        self.assertFalse(self.plugin.update_port_status.called)
+
+    def test_get_devices_details_list_failure(self):
+        with mock.patch.object(self.callbacks, '_get_device_details',
+                               side_effect=RuntimeError('testdevice')):
+            self.assertRaises(RuntimeError,
+                              self.callbacks.get_devices_details_list,
+                              'fake_context', devices=[1, 2],
+                              host='fake_host')
+        self.assertFalse(self.plugin.update_port_statuses.called)
+
+    def test_get_devices_details_list_unbound_status_not_updated(self):
+        devices = ['fake_device_1', 'fake_device_2', 'fake_device_3']
+        contexts = {}
+        for device in devices:
+            port_context = mock.Mock(host='fake_host')
+            port_context.current = {'id': device, 'admin_state_up': True,
+                                    'status': constants.PORT_STATUS_DOWN}
+            contexts[device] = port_context
+        self.plugin.get_bound_ports_contexts.return_value = contexts
+        details = {
+            'fake_device_1': {'device': 'fake_device_1',
+                              'network_id': 'fake_net'},
+            'fake_device_2': {'device': 'fake_device_2'},
+            'fake_device_3': {'device': 'fake_device_3',
+                              n_const.NO_ACTIVE_BINDING: True}}
+        with mock.patch.object(self.callbacks, '_get_device_details',
+                               side_effect=lambda *a, **kw: details[
+                                   kw['device']]):
+            res = self.callbacks.get_devices_details_list(
+                'fake_context', devices=devices, host='fake_host',
+                agent_id='fake_agent_id')
+        self.assertEqual([details[device] for device in devices], res)
+        self.plugin.update_port_statuses.assert_called_once_with(
+            'fake_context', {'fake_device_1': constants.PORT_STATUS_BUILD},
+            'fake_host')
+
     def test_get_devices_details_list_and_failed_devices(self):
-        devices = [1, 2, 3, 4, 5]
+        devices = [{'device': v} for v in [1, 2, 3, 4, 5]]
         expected = {'devices': devices, 'failed_devices': []}
         callback = (
             self.callbacks.get_devices_details_list_and_failed_devices)
         self._test_get_devices_list(callback, devices, expected)
 
     def test_get_devices_details_list_and_failed_devices_failures(self):
-        devices = [1, Exception('testdevice'), 3,
-                   Exception('testdevice'), 5]
-        expected = {'devices': [1, 3, 5], 'failed_devices': [2, 4]}
+        devices = [{'device': 1}, Exception('testdevice'), {'device': 3},
+                   Exception('testdevice'), {'device': 5}]
+        expected = {'devices': [{'device': 1}, {'device': 3}, {'device': 5}],
+                    'failed_devices': [2, 4]}
         callback = (
             self.callbacks.get_devices_details_list_and_failed_devices)
         self._test_get_devices_list(callback, devices, expected)
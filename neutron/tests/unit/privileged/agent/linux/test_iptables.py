@@ -0,0 +1,91 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import errno
+
+import mock
+
+from neutron import privileged
+from neutron.privileged.agent.linux import iptables as priv_iptables
+from neutron.tests import base
+
+
+class RestoreIptablesTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(RestoreIptablesTestCase, self).setUp()
+        self.addCleanup(privileged.default.set_client_mode, True)
+        privileged.default.set_client_mode(False)
+        self.os = mock.patch.object(priv_iptables, 'os').start()
+        self.os.open.return_value = 42
+        self.setns = mock.patch.object(priv_iptables.netns, 'setns').start()
+        self.run_restore = mock.patch.object(
+            priv_iptables, '_run_restore').start()
+
+    def test_restore_iptables(self):
+        self.run_restore.side_effect = [(0, '', ''), (1, '', 'error')]
+        results = priv_iptables.restore_iptables(
+            [('ns1', 4, True, None, 'rules1'),
+             (None, 6, True, '10', 'rules2')])
+
+        self.assertEqual([(0, '', ''), (1, '', 'error')], results)
+        self.os.open.assert_called_once_with('/proc/thread-self/ns/net',
+                                             self.os.O_RDONLY)
+        self.os.close.assert_called_once_with(42)
+        self.setns.assert_has_calls([mock.call('ns1', flags=0),
+                                     mock.call(42)])
+        self.assertEqual(2, self.setns.call_count)
+        self.run_restore.assert_has_calls([
+            mock.call(['iptables-restore', '-n'], 'rules1'),
+            mock.call(['ip6tables-restore', '-n', '-w', '10', '-W',
+                       str(priv_iptables.XLOCK_WAIT_INTERVAL)], 'rules2')])
+
+    def test_restore_iptables_namespace_not_found(self):
+        self.setns.side_effect = [OSError(errno.ENOENT, 'not found'), None]
+        self.run_restore.return_value = (0, '', '')
+        results = priv_iptables.restore_iptables(
+            [('ns1', 4, True, None, 'rules1'),
+             (None, 4, False, None, 'rules2')])
+
+        self.assertEqual(1, results[0][0])
+        self.assertEqual((0, '', ''), results[1])
+        self.run_restore.assert_called_once_with(
+            ['iptables-restore'], 'rules2')
+        self.setns.assert_called_with(42)
+
+    def _test_restore_iptables_invalid(self, restore):
+        self.assertRaises(ValueError, priv_iptables.restore_iptables,
+                          [('ns1', 4, True, None, 'rules1'), restore])
+        self.run_restore.assert_not_called()
+        self.setns.assert_not_called()
+
+    def test_restore_iptables_invalid_ip_version(self):
+        self._test_restore_iptables_invalid(('ns1', 5, True, None, ''))
+
+    def test_restore_iptables_invalid_wait(self):
+        self._test_restore_iptables_invalid(
+            ('ns1', 4, True, '10 -M /tmp/modprobe', ''))
+        self._test_restore_iptables_invalid(('ns1', 4, True, 0, ''))
+
+    def test_restore_iptables_invalid_namespace(self):
+        for namespace in ('../../proc/1/ns/net', '..', 'ns 1',
+                          'a' * 256, 42):
+            self._test_restore_iptables_invalid((namespace, 4, True, None,
+                                                 ''))
+
+    def test_get_restore_args(self):
+        self.assertEqual(['iptables-restore'],
+                         priv_iptables.get_restore_args(4))
+        self.assertEqual(
+            ['ip6tables-restore', '-n', '-w', '5', '-W',
+             str(priv_iptables.XLOCK_WAIT_INTERVAL)],
+            priv_iptables.get_restore_args(6, noflush=True, wait_seconds=5))
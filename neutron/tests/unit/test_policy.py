@@ -516,6 +516,34 @@ class NeutronPolicyTestCase(base.BaseTestCase):
                 policy.enforce(self.context, action, target)
         self.assertEqual(1, getter.call_count)
 
+    def test_tenant_id_check_uses_request_resource_cache(self):
+        plugin = directory.get_plugin()
+        with mock.patch.object(plugin, 'get_network',
+                               return_value={'tenant_id': 'fake'}) as getter:
+            action = "create_port:mac"
+            for network_id in ('net1', 'net2', 'net1'):
+                target = {'network_id': network_id}
+                policy.enforce(self.context, action, target)
+            self.assertTrue(policy.check(self.context, action,
+                                         {'network_id': 'net2'}))
+        self.assertEqual(2, getter.call_count)
+        resource_cache = policy.get_request_resource_cache(self.context)
+        self.assertEqual(2, resource_cache.hits)
+        self.assertEqual(2, resource_cache.misses)
+
+    def test_tenant_id_check_request_resource_cache_per_context(self):
+        plugin = directory.get_plugin()
+        other_context = context.Context('fake', 'fake', roles=['user'])
+        with mock.patch.object(plugin, 'get_network',
+                               return_value={'tenant_id': 'fake'}):
+            for ctx in (self.context, other_context):
+                policy.enforce(ctx, "create_port:mac",
+                               {'network_id': 'whatever'})
+        for ctx in (self.context, other_context):
+            resource_cache = policy.get_request_resource_cache(ctx)
+            self.assertEqual(0, resource_cache.hits)
+            self.assertEqual(1, resource_cache.misses)
+
     def _test_enforce_tenant_id_raises(self, bad_rule):
         self._set_rules(admin_or_owner=bad_rule)
         # Trigger a policy with rule admin_or_owner
@@ -622,3 +650,120 @@ class NeutronPolicyTestCase(base.BaseTestCase):
         result = policy.enforce(self.context, action, target)
         mock_get_plugin.assert_called_with('registered_plugin_name')
         self.assertTrue(result)
+
+    def test_check_list(self):
+        action = "get_network"
+        targets = [{'shared': True, 'tenant_id': 'somebody_else'},
+                   {'shared': False, 'tenant_id': 'fake'},
+                   {'shared': False, 'tenant_id': 'somebody_else'}]
+        result = policy.check_list(self.context, action, targets)
+        expected = [True, True, False]
+        self.assertEqual(expected, result)
+        self.assertEqual(
+            [policy.check(self.context, action, t) for t in targets],
+            result)
+
+    def test_check_list_admin(self):
+        admin_context = context.get_admin_context()
+        result = policy.check_list(admin_context, "get_network",
+                                   [{'tenant_id': 'somebody_else'}] * 2)
+        expected = [True, True]
+        self.assertEqual(expected, result)
+
+    def test_check_list_non_existent_action(self):
+        self._set_rules(default='!')
+        self.fakepolicyinit()
+        action = "example:idonotexist"
+        targets = [{'tenant_id': 'fake'}]
+        self.assertEqual([False],
+                         policy.check_list(self.context, action, targets))
+        self.assertEqual([True],
+                         policy.check_list(self.context, action, targets,
+                                           might_not_exist=True))
+
+    def test_check_list_attribute_based(self):
+        targets = [{'tenant_id': 'fake'},
+                   {'tenant_id': 'fake', 'shared': True},
+                   {'tenant_id': 'somebody_else'}]
+        result = policy.check_list(self.context, "create_network", targets)
+        expected = [True, False, False]
+        self.assertEqual(expected, result)
+
+    def test_check_list_parent_resource(self):
+        plugin = directory.get_plugin()
+        with mock.patch.object(plugin, 'get_network',
+                               return_value={'tenant_id': 'fake'}) as getter:
+            targets = [{'network_id': 'whatever'} for i in range(3)]
+            result = policy.check_list(self.context, "create_port:mac",
+                                       targets)
+        expected = [True, True, True]
+        self.assertEqual(expected, result)
+        self.assertEqual(1, getter.call_count)
+        resource_cache = policy.get_request_resource_cache(self.context)
+        self.assertEqual(2, resource_cache.hits)
+        self.assertEqual(1, resource_cache.misses)
+
+    def test_check_list_loads_and_compiles_rules_once(self):
+        targets = [{'tenant_id': 'fake'}, {'tenant_id': 'somebody_else'}]
+        policy.init()
+        with mock.patch.object(policy._ENFORCER, 'load_rules') as load,\
+                mock.patch.object(policy, '_compile_check',
+                                  wraps=policy._compile_check) as compile:
+            result = policy.check_list(self.context, "get_port",
+                                       targets * 50)
+            expected = [True, False] * 50
+            self.assertEqual(expected, result)
+            load.assert_called_once_with()
+            self.assertTrue(compile.called)
+            compile.reset_mock()
+            policy.check_list(self.context, "get_port", targets)
+            self.assertFalse(compile.called)
+
+    def test_check_list_role_compiled_to_constant(self):
+        advsvc_context = context.Context('', 'user', roles=['advsvc'])
+        policy.init()
+        compiled = policy._get_compiled_rule(
+            policy._build_match_rule("get_port", {}, None),
+            advsvc_context.to_policy_values())
+        self.assertIs(True, compiled)
+        self.assertEqual(
+            [True], policy.check_list(advsvc_context, "get_port",
+                                      [{'tenant_id': 'somebody_else'}]))
+
+    def test_check_list_rules_changed(self):
+        targets = [{'tenant_id': 'fake'}]
+        self.assertEqual([True],
+                         policy.check_list(self.context, "get_port", targets))
+        self._set_rules(admin_or_owner="rule:context_is_admin")
+        policy._ENFORCER.set_rules(self.rules)
+        self.assertEqual([False],
+                         policy.check_list(self.context, "get_port", targets))
+
+
+class RequestResourceCacheTestCase(base.BaseTestCase):
+
+    def test_get(self):
+        resource_cache = policy.RequestResourceCache()
+        fetch = mock.Mock(side_effect=['res1', 'res2'])
+        self.assertEqual('res1', resource_cache.get('key1', fetch))
+        self.assertEqual('res1', resource_cache.get('key1', fetch))
+        self.assertEqual('res2', resource_cache.get('key2', fetch))
+        self.assertEqual(2, fetch.call_count)
+        self.assertEqual(1, resource_cache.hits)
+        self.assertEqual(2, resource_cache.misses)
+
+    def test_get_fetch_failure_not_cached(self):
+        resource_cache = policy.RequestResourceCache()
+        fetch = mock.Mock(side_effect=[db_exc.RetryRequest(None), 'res'])
+        self.assertRaises(db_exc.RetryRequest,
+                          resource_cache.get, 'key', fetch)
+        self.assertEqual('res', resource_cache.get('key', fetch))
+        self.assertEqual(0, resource_cache.hits)
+        self.assertEqual(2, resource_cache.misses)
+
+    def test_get_request_resource_cache(self):
+        ctx = context.Context('fake', 'fake')
+        resource_cache = policy.get_request_resource_cache(ctx)
+        self.assertIs(resource_cache, policy.get_request_resource_cache(ctx))
+        self.assertIsNot(resource_cache, policy.get_request_resource_cache(
+            context.Context('fake', 'fake')))
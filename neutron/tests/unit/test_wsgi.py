@@ -16,11 +16,13 @@
 import os
 import socket
 import ssl
+import uuid
 
 import mock
 from neutron_lib.db import api as db_api
 from neutron_lib import exceptions as exception
 from oslo_config import cfg
+from oslo_serialization import jsonutils
 from six.moves import urllib
 import testtools
 import webob
@@ -542,6 +544,35 @@ class JSONDictSerializerTest(base.BaseTestCase):
         self.assertEqual(expected_json, result)
 
 
+class IterEncodeBodyTest(base.BaseTestCase):
+
+    def test_iter_encode_body(self):
+        data = {'ports': [{'id': str(i), 'name': u'\u7f51'} for i in
+                          range(100)],
+                'ports_links': [{'rel': 'next', 'href': 'url'}],
+                'count': 100}
+        chunks = list(wsgi.iter_encode_body(data, chunk_size=256))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertIsInstance(chunk, bytes)
+        self.assertEqual(data, jsonutils.loads(b''.join(chunks)))
+
+    def test_iter_encode_body_empty_list(self):
+        data = {'ports': []}
+        chunks = list(wsgi.iter_encode_body(data))
+        self.assertEqual([b'{"ports": []}'], chunks)
+
+    def test_iter_encode_body_not_dict(self):
+        chunks = list(wsgi.iter_encode_body([1, 2]))
+        self.assertEqual([b'[1, 2]'], chunks)
+
+    def test_iter_encode_body_sanitizes_values(self):
+        data = {'ports': [{'id': uuid.UUID(int=0)}]}
+        chunks = list(wsgi.iter_encode_body(data))
+        self.assertEqual({'ports': [{'id': str(uuid.UUID(int=0))}]},
+                         jsonutils.loads(b''.join(chunks)))
+
+
 class TextDeserializerTest(base.BaseTestCase):
 
     def test_dispatch_default(self):
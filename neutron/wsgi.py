@@ -49,6 +49,9 @@ wsgi_config.register_socket_opts()
 
 LOG = logging.getLogger(__name__)
 
+# Approximate size in characters of the chunks of streamed JSON bodies
+JSON_CHUNK_SIZE = 65536
+
 
 def encode_body(body):
     """Encode unicode body.
@@ -58,6 +61,53 @@ def encode_body(body):
     return encodeutils.to_utf8(body)
 
 
+def _json_sanitizer(obj):
+    return six.text_type(obj)
+
+
+def _iter_json(data):
+    if not isinstance(data, dict):
+        yield jsonutils.dumps(data, default=_json_sanitizer)
+        return
+    yield '{'
+    for index, (key, value) in enumerate(data.items()):
+        if index:
+            yield ', '
+        yield jsonutils.dumps(key) + ': '
+        if isinstance(value, (list, tuple)):
+            yield '['
+            for item_index, item in enumerate(value):
+                if item_index:
+                    yield ', '
+                yield jsonutils.dumps(item, default=_json_sanitizer)
+            yield ']'
+        else:
+            yield jsonutils.dumps(value, default=_json_sanitizer)
+    yield '}'
+
+
+def iter_encode_body(data, chunk_size=JSON_CHUNK_SIZE):
+    """Serialize a dict into encoded JSON chunks.
+
+    The elements of the list values of the dict are serialized one at a time,
+    so the JSON document of a large collection is never built as a single
+    string. It is meant to be used as the app_iter of a response, which is
+    then sent with chunked transfer encoding. The data itself is expected to
+    be fully loaded already; only its serialization is incremental.
+    """
+    chunk = []
+    length = 0
+    for piece in _iter_json(data):
+        chunk.append(piece)
+        length += len(piece)
+        if length >= chunk_size:
+            yield encode_body(''.join(chunk))
+            chunk = []
+            length = 0
+    if chunk:
+        yield encode_body(''.join(chunk))
+
+
 class WorkerService(neutron_worker.BaseWorker):
     """Wraps a worker to be handled by ProcessLauncher"""
     def __init__(self, service, application, disable_ssl=False,
@@ -312,9 +362,7 @@ class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
     def default(self, data):
-        def sanitizer(obj):
-            return six.text_type(obj)
-        return encode_body(jsonutils.dumps(data, default=sanitizer))
+        return encode_body(jsonutils.dumps(data, default=_json_sanitizer))
 
 
 class ResponseHeaderSerializer(ActionDispatcher):
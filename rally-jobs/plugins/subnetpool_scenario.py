@@ -0,0 +1,59 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from rally.common import validation
+from rally.task import atomic
+from rally_openstack import consts
+from rally_openstack import scenario
+from rally_openstack.scenarios.neutron import utils
+
+
+"""Scenarios for subnet pools."""
+
+
+@validation.add("required_services", services=[consts.Service.NEUTRON])
+@validation.add("required_platform", platform="openstack", users=True)
+@scenario.configure(context={"cleanup@openstack": ["neutron"]},
+                    name="NeutronSubnetPools.create_subnets_from_pool")
+class SubnetPoolAllocation(utils.NeutronScenario):
+
+    def run(self, prefix="10.0.0.0/8", prefixlen=28, subnet_count=10000):
+        """Allocate subnets one by one from a single subnet pool.
+
+        The default subnet_count is meant for local benchmarks, the gate
+        task uses a smaller count.
+
+        :param prefix: prefix of the subnet pool
+        :param prefixlen: default prefix length of the allocated subnets
+        :param subnet_count: number of subnets to allocate
+        """
+        net = self._create_network({})
+        subnetpool = self._create_subnetpool(
+            {'name': self.generate_random_name(),
+             'prefixes': [prefix],
+             'default_prefixlen': prefixlen})
+        for _i in range(subnet_count):
+            self._create_subnet_from_pool(net, subnetpool)
+
+    @atomic.action_timer("neutron.create_subnetpool")
+    def _create_subnetpool(self, subnetpool_args):
+        return self.clients("neutron").create_subnetpool(
+            {'subnetpool': subnetpool_args})
+
+    @atomic.optional_action_timer("neutron.create_subnet_from_pool")
+    def _create_subnet_from_pool(self, net, subnetpool):
+        return self.clients("neutron").create_subnet(
+            {'subnet': {'name': self.generate_random_name(),
+                        'network_id': net['network']['id'],
+                        'subnetpool_id': subnetpool['subnetpool']['id'],
+                        'ip_version': 4}})
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Time the detection of the changed fields of a port pushed to the agent
+resource cache.
+
+The fields compared directly, as done by RemoteResourceCache, are timed
+against the previous comparison of the to_dict() of both objects, for a
+port with one binding and one fixed IP that only differs in its
+revision_number.
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import netaddr
+
+from neutron.agent import resource_cache
+from neutron.objects import ports
+
+PORT_ID = 'ca9e3f8e-4b53-4a8f-9a52-fe5e0d8e5c7b'
+NETWORK_ID = '5b2f6c2e-21b0-4d39-8b8a-0d6d8a2f6b4c'
+
+
+def make_port(revision_number):
+    port = ports.Port(
+        id=PORT_ID, network_id=NETWORK_ID,
+        mac_address=netaddr.EUI('fa:16:3e:ec:c7:d9'),
+        admin_state_up=True, revision_number=revision_number,
+        security_group_ids={'4e2f8f4c-6b5d-4c4d-9a36-2c7d8e1b5c8e'},
+        allowed_address_pairs=[], device_owner='compute:nova',
+        fixed_ips=[ports.IPAllocation(
+            port_id=PORT_ID, network_id=NETWORK_ID,
+            subnet_id='0ee1d6e9-8d6b-4a1d-8a5a-7c5b6c3c5e4a',
+            ip_address=netaddr.IPAddress('10.0.0.5'))],
+        bindings=[ports.PortBinding(port_id=PORT_ID, host='host1',
+                                    status='ACTIVE', profile={'a': 'b'})])
+    port.obj_reset_changes()
+    return port
+
+
+def to_dict_changed_fields(old, new):
+    new = new.to_dict()
+    changed = set(new)
+    for k, v in old.to_dict().items():
+        if v == new.get(k):
+            changed.discard(k)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--number', type=int, default=10000,
+                        help='Number of diffs per run (default: 10000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Number of runs, the best one is reported '
+                             '(default: 3)')
+    args = parser.parse_args()
+
+    old = make_port(1)
+    new = make_port(2)
+    for name, func in (('to_dict', to_dict_changed_fields),
+                       ('fields', resource_cache._get_changed_fields)):
+        best = min(timeit.repeat(lambda: func(old, new),
+                                 number=args.number, repeat=args.repeat))
+        print('%-8s %8.1f us per diff' % (name, best * 1e6 / args.number))
+
+
+if __name__ == '__main__':
+    main()